@@ -0,0 +1,424 @@
+"""Time the hot paths of the editor on synthetic annotated images.
+
+Usage::
+
+    python scripts/benchmark.py -o results.json
+    python scripts/benchmark.py --scenario small --scenario medium
+    python scripts/benchmark.py --baseline results.json
+
+Every scenario generates an image with polygon annotations, then loads it
+into an offscreen canvas and times loading, painting at several zooms,
+panning, erasing and saving. Each scenario runs in its own process so the
+memory peaks of one do not hide those of the next. With ``--baseline`` the
+results are compared to an earlier run and the exit status is 1 if a step
+got slower than ``--threshold`` allows.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+RESULTS_VERSION = 1
+# name: (image edge in pixels, number of objects)
+SCENARIOS = {
+    "small": (1000, 10_000),
+    "medium": (5000, 25_000),
+    "large": (20000, 50_000),
+}
+# edge up to which images are written as PNG and decoded by Qt in full,
+# larger ones are tiled TIFFs read by region
+PNG_MAX_EDGE = 8000
+VIEW_SIZE = (1280, 800)
+ZOOMS = (0.25, 1.0, 4.0)
+PAN_STEPS = 30
+HOVER_SAMPLES = 200
+ERASE_CLICKS = 20
+# slower steps are not reported as regressions below this many seconds
+MIN_REGRESSION_SECONDS = 0.002
+
+
+def _rss_mb() -> float | None:
+    """Current resident memory, None where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _memory() -> dict:
+    return {"rss_mb": _rss_mb(), "peak_rss_mb": _peak_rss_mb()}
+
+
+def synthetic_objects(edge: int, count: int, seed: int = 0):
+    """Star shaped polygons on a jittered grid, so they rarely overlap."""
+    from widgets.polygons import PolygonStore
+
+    rng = np.random.default_rng(seed)
+    columns = math.ceil(math.sqrt(count))
+    cell = edge / columns
+    store = PolygonStore()
+    for i in range(count):
+        row, column = divmod(i, columns)
+        radius = cell * rng.uniform(0.15, 0.4)
+        centre = (np.array([column, row]) + 0.5 + rng.uniform(-0.1, 0.1, 2)) * cell
+        vertices = int(rng.integers(16, 64))
+        angles = np.sort(rng.uniform(0, 2 * np.pi, vertices))
+        radii = radius * rng.uniform(0.7, 1.0, vertices)
+        ring = (
+            centre + np.column_stack((np.cos(angles), np.sin(angles))) * radii[:, None]
+        )
+        store.append([np.clip(ring, 0, edge - 1)])
+    return store
+
+
+def _image_tiles(edge: int, tile: int):
+    for y0 in range(0, edge, tile):
+        for x0 in range(0, edge, tile):
+            y, x = np.mgrid[y0 : y0 + tile, x0 : x0 + tile]
+            yield (((x // 32 + y // 32) % 2) * 60 + (x * 3 + y * 5) % 128).astype(
+                np.uint8
+            )
+
+
+def generate(data_dir: Path, name: str, edge: int, count: int) -> Path:
+    """Write the image and annotation of a scenario, reusing earlier ones."""
+    from widgets.annotations import labels_path, save_annotation
+    from widgets.raster import rasterize
+
+    suffix = ".png" if edge <= PNG_MAX_EDGE else ".tif"
+    path = data_dir / f"{name}_{edge}px_{count}objects{suffix}"
+    if path.exists() and labels_path(path).exists():
+        return path
+
+    if suffix == ".png":
+        from widgets.image_source import to_qimage
+
+        image = np.concatenate(list(_image_tiles(edge, edge)))
+        to_qimage(image).save(str(path))
+    else:
+        import tifffile
+
+        tifffile.imwrite(
+            path,
+            _image_tiles(edge, 512),
+            shape=(edge, edge),
+            dtype=np.uint8,
+            tile=(512, 512),
+            compression="zlib",
+            bigtiff=True,
+        )
+    objects = synthetic_objects(edge, count)
+    save_annotation(path, rasterize(objects, (edge, edge)), objects)
+    return path
+
+
+class _Timer:
+    """Records the duration and memory of named steps."""
+
+    def __init__(self):
+        self.steps: dict[str, dict] = {}
+
+    def once(self, name: str, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.steps[name] = {"seconds": time.perf_counter() - start, **_memory()}
+        return result
+
+    def repeated(self, name: str, durations: list[float]):
+        self.steps[name] = {
+            "seconds": statistics.median(durations),
+            "max_seconds": max(durations),
+            "samples": len(durations),
+            **_memory(),
+        }
+
+
+def run_scenario(path: Path) -> dict:
+    """Load one generated image into an offscreen canvas and time its hot paths."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    from PySide6.QtCore import QEvent, QPoint, QPointF, Qt, QThreadPool
+    from PySide6.QtGui import QMouseEvent
+    from PySide6.QtWidgets import QApplication
+
+    from widgets.annotations import (
+        labels_path,
+        load_labels,
+        load_objects,
+        save_annotation,
+    )
+    from widgets.canvas import Canvas, Tool
+    from widgets.contours import trace_labels
+    from widgets.image_source import open_image_source
+    from widgets.polygons import PolygonStore
+
+    app = QApplication.instance() or QApplication([])
+    timer = _Timer()
+    pool = QThreadPool.globalInstance()
+
+    def settle():
+        """Let background tile reads and idle tile rendering finish."""
+        while True:
+            pool.waitForDone()
+            app.processEvents()
+            canvas.grab()
+            if not canvas.layer.pending and not pool.activeThreadCount():
+                return
+
+    def mouse(kind, pos: QPoint, button=Qt.MouseButton.LeftButton):
+        buttons = (
+            button
+            if kind != QEvent.Type.MouseButtonRelease
+            else Qt.MouseButton.NoButton
+        )
+        return QMouseEvent(
+            kind,
+            QPointF(pos),
+            QPointF(pos),
+            button,
+            buttons,
+            Qt.KeyboardModifier.NoModifier,
+        )
+
+    source = timer.once("open_image", open_image_source, path)
+    objects = timer.once("load_polygons", load_objects, path)
+    labels = load_labels(path)
+    # generate() wrote both, missing ones mean a broken data directory
+    assert objects is not None and labels is not None, f"no annotation of {path}"
+    objects_count, vertex_count = len(objects), objects.vertex_count
+    timer.once(
+        "trace_labels",
+        lambda labels: PolygonStore.from_rings(
+            rings for _, rings in trace_labels(labels)
+        ),
+        labels,
+    )
+    del labels
+
+    canvas = Canvas()
+    canvas.resize(*VIEW_SIZE)
+    canvas.show()
+    timer.once("load_canvas", canvas.load_image, str(path), objects, source)
+    timer.once("paint_fit", canvas.grab)
+    timer.once("settle_fit", settle)
+
+    centre = QPointF(VIEW_SIZE[0] / 2, VIEW_SIZE[1] / 2)
+    image_centre = QPointF(source.width / 2, source.height / 2)
+    for zoom in ZOOMS:
+        canvas.zoom = zoom
+        canvas.offset = (centre - image_centre * zoom).toPoint()
+        canvas.layer.clear()
+        timer.once(f"paint_zoom_{zoom}", canvas.grab)
+        timer.once(f"settle_zoom_{zoom}", settle)
+        durations = []
+        for _ in range(10):
+            start = time.perf_counter()
+            canvas.grab()
+            durations.append(time.perf_counter() - start)
+        timer.repeated(f"repaint_zoom_{zoom}", durations)
+
+    # panning at zoom 1 by dragging with the hand tool
+    canvas.zoom = 1.0
+    canvas.offset = (centre - image_centre).toPoint()
+    canvas.grab()
+    settle()
+    canvas.tool = Tool.HAND
+    position = centre.toPoint()
+    canvas.mousePressEvent(mouse(QEvent.Type.MouseButtonPress, position))
+    durations = []
+    for _ in range(PAN_STEPS):
+        position += QPoint(13, 7)
+        start = time.perf_counter()
+        canvas.mouseMoveEvent(mouse(QEvent.Type.MouseMove, position))
+        canvas.grab()
+        durations.append(time.perf_counter() - start)
+    canvas.mouseReleaseEvent(mouse(QEvent.Type.MouseButtonRelease, position))
+    timer.repeated("pan", durations)
+    settle()
+
+    # eraser hover hit-testing and clicks on visible objects
+    canvas.tool = Tool.ERASER
+    rng = np.random.default_rng(1)
+    ids = canvas.objects.ids()
+    visible = [
+        oid
+        for oid in ids.tolist()
+        if canvas.rect().contains(
+            canvas.screen_coords(
+                QPointF(*canvas.objects.vertices(oid).mean(axis=0).tolist())
+            )
+        )
+    ]
+    if not visible:
+        visible = ids.tolist()
+    targets = rng.choice(visible, min(len(visible), HOVER_SAMPLES), replace=False)
+    centres = [
+        canvas.screen_coords(
+            QPointF(*canvas.objects.vertices(oid).mean(axis=0).tolist())
+        )
+        for oid in targets.tolist()
+    ]
+    durations = []
+    for pos in centres:
+        start = time.perf_counter()
+        canvas.mouseMoveEvent(
+            mouse(QEvent.Type.MouseMove, pos, Qt.MouseButton.NoButton)
+        )
+        durations.append(time.perf_counter() - start)
+    timer.repeated("hover", durations)
+
+    durations = []
+    for pos in centres[:ERASE_CLICKS]:
+        start = time.perf_counter()
+        canvas.mousePressEvent(mouse(QEvent.Type.MouseButtonPress, pos))
+        canvas.grab()
+        durations.append(time.perf_counter() - start)
+    timer.repeated("erase", durations)
+
+    # saving as the editor does, the first export rasterizes all objects;
+    # written next to a copy so the generated annotation stays as it is
+    labels = timer.once("export_labels_first", canvas.export_labels)
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp) / path.name
+        timer.once("save_annotation", save_annotation, target, labels, canvas.objects)
+        labels_mb = labels_path(target).stat().st_size / 2**20
+    canvas.mousePressEvent(mouse(QEvent.Type.MouseButtonPress, centres[-1]))
+    timer.once("export_labels_after_erase", canvas.export_labels)
+
+    canvas.close()
+    return {
+        "image": {
+            "width": source.width,
+            "height": source.height,
+            "format": path.suffix,
+        },
+        "objects": objects_count,
+        "vertices": vertex_count,
+        "labels_mb": labels_mb,
+        "steps": timer.steps,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Print the change of every step against a baseline, return the regressions."""
+    regressions = []
+    print(f"{'scenario':<10} {'step':<28} {'baseline':>10} {'now':>10} {'ratio':>7}")
+    for name, scenario in results["scenarios"].items():
+        old_scenario = baseline.get("scenarios", {}).get(name)
+        if old_scenario is None:
+            continue
+        for step, values in scenario["steps"].items():
+            old = old_scenario["steps"].get(step)
+            if old is None:
+                continue
+            before, now = old["seconds"], values["seconds"]
+            ratio = now / before if before > 0 else math.inf
+            slower = ratio > threshold and now - before > MIN_REGRESSION_SECONDS
+            mark = "  !" if slower else ""
+            print(
+                f"{name:<10} {step:<28} {before * 1e3:>8.1f}ms {now * 1e3:>8.1f}ms"
+                f" {ratio:>6.2f}x{mark}"
+            )
+            if slower:
+                regressions.append(f"{name}/{step}")
+        before, now = old_scenario["peak_rss_mb"], scenario["peak_rss_mb"]
+        print(f"{name:<10} {'peak memory':<28} {before:>8.0f}MB {now:>8.0f}MB")
+    return regressions
+
+
+def _report(results: dict):
+    for name, scenario in results["scenarios"].items():
+        image = scenario["image"]
+        print(
+            f"{name}: {image['width']}x{image['height']}{image['format']},"
+            f" {scenario['objects']} objects, {scenario['vertices']} vertices,"
+            f" peak {scenario['peak_rss_mb']:.0f} MB"
+        )
+        for step, values in scenario["steps"].items():
+            extra = (
+                f" max {values['max_seconds'] * 1e3:.1f}ms"
+                if "max_seconds" in values
+                else ""
+            )
+            print(f"  {step:<28} {values['seconds'] * 1e3:>9.1f}ms{extra}")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=(__doc__ or "").split("\n")[0])
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="scenario to run, may be repeated, all by default",
+    )
+    parser.add_argument("-o", "--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="JSON results to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="slowdown ratio reported as a regression",
+    )
+    parser.add_argument(
+        "--data",
+        type=Path,
+        help="folder for the generated images, kept and reused between runs",
+    )
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    names = args.scenario or list(SCENARIOS)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data or Path(tmp)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        results = {
+            "version": RESULTS_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scenarios": {},
+        }
+        for name in names:
+            path = generate(data_dir, name, *SCENARIOS[name])
+            # a fresh process per scenario, so its memory peak is its own
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                results["scenarios"][name] = pool.submit(run_scenario, path).result()
+
+    _report(results)
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"slower than the baseline: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
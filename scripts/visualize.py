@@ -1,42 +1,156 @@
+"""Render annotation overlays without a display.
+
+Usage::
+
+    python scripts/visualize.py DIR -o overlays/
+    python scripts/visualize.py DIR --sheet sheet.png
+    python scripts/visualize.py image.png -o overlays/
+
+Label maps are blended onto their images with a colour lookup table in the
+palette of the editor, object boundaries are drawn at full opacity.
+"""
+
+import argparse
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.patches import Polygon
+from skimage.io import imread, imsave
+from skimage.transform import resize
+from skimage.util import img_as_ubyte
 
-COLORS = ["red", "green", "blue", "yellow", "magenta"]
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
 
+from widgets.annotations import find_annotated, load_labels
+from widgets.palette import COLORS, FILL_ALPHA
 
-def visualize(npy_path: str):
-    data = np.load(npy_path, allow_pickle=True).item()
-    image_path = data["image_path"]
-    objects = data["objects"]
+THUMB_SIZE = 256
+SHEET_COLUMNS = 8
 
-    img = plt.imread(image_path)
 
-    plt.figure(figsize=(img.shape[1] / 100, img.shape[0] / 100), dpi=100)
-    plt.imshow(img)
+def color_lut(count: int) -> np.ndarray:
+    """RGB colour of labels ``0..count``, label n gets ``COLORS[(n - 1) % 5]``."""
+    palette = np.array(COLORS, dtype=np.uint8)
+    lut = palette[(np.arange(count + 1) - 1) % len(palette)]
+    lut[0] = 0
+    return lut
 
-    for i, polygon_points in enumerate(objects):
-        color = COLORS[i % len(COLORS)]
-        polygon = Polygon(
-            polygon_points,
-            fill=True,
-            facecolor=color,
-            alpha=0.3,
-            edgecolor=color,
-            linewidth=2,
-        )
-        plt.gca().add_patch(polygon)
 
-    plt.axis("off")
-    plt.tight_layout(pad=0)
-    plt.show()
+def boundaries(labels: np.ndarray) -> np.ndarray:
+    """Object pixels with a 4-neighbour of a different label."""
+    edge = np.zeros(labels.shape, dtype=bool)
+    vertical = labels[1:] != labels[:-1]
+    horizontal = labels[:, 1:] != labels[:, :-1]
+    edge[1:] |= vertical
+    edge[:-1] |= vertical
+    edge[:, 1:] |= horizontal
+    edge[:, :-1] |= horizontal
+    return edge & (labels != 0)
 
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python visualize.py <path_to_npy>")
-        sys.exit(1)
+def to_rgb(image: np.ndarray) -> np.ndarray:
+    image = img_as_ubyte(image)
+    if image.ndim == 2:
+        return np.repeat(image[..., None], 3, axis=2)
+    return image[..., :3]
+
+
+def overlay(image: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """Blend ``labels`` onto an RGB ``image`` like the canvas draws objects."""
+    labels = np.asarray(labels)
+    colors = color_lut(int(labels.max()))[labels]
+
+    out = image.astype(np.uint16)
+    inside = labels != 0
+    out[inside] = (
+        out[inside] * (255 - FILL_ALPHA) + colors[inside].astype(np.uint16) * FILL_ALPHA
+    ) // 255
+    out = out.astype(np.uint8)
+
+    edge = boundaries(labels)
+    out[edge] = colors[edge]
+    return out
+
+
+def thumbnail(image: np.ndarray, size: int) -> np.ndarray:
+    height, width = image.shape[:2]
+    scale = min(1.0, size / max(height, width))
+    shape = (max(1, round(height * scale)), max(1, round(width * scale)), 3)
+    return img_as_ubyte(resize(image, shape, anti_aliasing=scale < 1))
+
+
+def render(job: tuple[Path, Path, Path | None, int | None]) -> np.ndarray | None:
+    """Render one image, write the overlay and return a thumbnail if asked for.
 
-    visualize(sys.argv[1])
+    Images without an annotation are skipped and give None.
+    """
+    path, root, out_dir, thumb_size = job
+    labels = load_labels(path)
+    if labels is None:
+        print(f"No annotation for {path}, skipped", file=sys.stderr)
+        return None
+    if path.suffix == ".npy":
+        # label map without an image
+        image = np.zeros((*labels.shape, 3), dtype=np.uint8)
+    else:
+        image = to_rgb(imread(path))
+    result = overlay(image, labels)
+
+    if out_dir is not None:
+        target = out_dir / path.relative_to(root).with_suffix(".png")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        imsave(target, result, check_contrast=False)
+    return thumbnail(result, thumb_size) if thumb_size else None
+
+
+def contact_sheet(thumbs: list[np.ndarray], size: int, columns: int) -> np.ndarray:
+    """Mosaic of thumbnails, each centred in a ``size`` square cell."""
+    rows = -(-len(thumbs) // columns)
+    sheet = np.zeros((rows * size, columns * size, 3), dtype=np.uint8)
+    for i, thumb in enumerate(thumbs):
+        row, col = divmod(i, columns)
+        h, w = thumb.shape[:2]
+        y = row * size + (size - h) // 2
+        x = col * size + (size - w) // 2
+        sheet[y : y + h, x : x + w] = thumb
+    return sheet
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=(__doc__ or "").split("\n")[0])
+    parser.add_argument("path", type=Path, help="annotated image or folder")
+    parser.add_argument("-o", "--output", type=Path, help="folder for overlay PNGs")
+    parser.add_argument("--sheet", type=Path, help="write a contact sheet to this file")
+    parser.add_argument("--thumb-size", type=int, default=THUMB_SIZE)
+    parser.add_argument("--columns", type=int, default=SHEET_COLUMNS)
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    if args.output is None and args.sheet is None:
+        parser.error("nothing to do, pass --output and/or --sheet")
+
+    if args.path.is_dir():
+        root, paths = args.path, find_annotated(args.path)
+    else:
+        root, paths = args.path.parent, [args.path]
+    if args.output is not None and args.output.resolve() == root.resolve():
+        parser.error("overlays would overwrite the images, use another folder")
+
+    thumb_size = args.thumb_size if args.sheet else None
+    jobs = [(path, root, args.output, thumb_size) for path in paths]
+    if args.workers == 1 or len(jobs) <= 1:
+        results = list(map(render, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(render, jobs, chunksize=8))
+
+    thumbs = [thumb for thumb in results if thumb is not None]
+    if args.sheet is not None and thumbs:
+        sheet = contact_sheet(thumbs, args.thumb_size, args.columns)
+        imsave(args.sheet, sheet, check_contrast=False)
+
+
+if __name__ == "__main__":
+    main()
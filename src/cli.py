@@ -0,0 +1,341 @@
+"""Headless conversion and export of annotated image folders.
+
+Usage::
+
+    python src/cli.py export DIR --format coco -o annotations.json
+    python src/cli.py export DIR --format polygons -o polygons.jsonl
+    python src/cli.py export DIR --format png -o labels/
+    python src/cli.py upgrade DIR
+
+Images are processed on a process pool and results are written as they
+arrive, a single image has its objects traced on the pool instead. Nothing
+here creates a QApplication.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from collections.abc import Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from scipy.ndimage import find_objects
+
+from widgets.annotations import (
+    MmapMode,
+    find_annotated,
+    labels_path,
+    load_labels,
+    load_objects,
+    load_painted,
+    load_polygons,
+    save_annotation,
+)
+from widgets.contours import trace_labels
+from widgets.polygons import PolygonStore
+
+FORMATS = ("coco", "polygons", "png")
+# images sent to a worker at once
+CHUNK_SIZE = 16
+
+# pool label maps are traced on while a single image is processed here
+_trace_pool: Executor | None = None
+
+
+def rle_counts(mask: np.ndarray, origin: tuple[int, int], shape: tuple[int, int]):
+    """Column-major run lengths of a crop mask placed at ``origin`` in ``shape``.
+
+    Only the crop is scanned, the runs are laid out in full-image order as
+    COCO expects.
+    """
+    height, width = shape
+    row, col = origin
+    h = mask.shape[0]
+    local = np.flatnonzero(mask.T)
+    pixels = (col + local // h) * height + row + local % h
+
+    breaks = np.flatnonzero(np.diff(pixels) != 1) + 1
+    starts = pixels[np.concatenate(([0], breaks))]
+    stops = pixels[np.concatenate((breaks - 1, [len(pixels) - 1]))] + 1
+
+    counts = np.empty(2 * len(starts) + 1, dtype=np.int64)
+    counts[0] = starts[0]
+    counts[1:-1:2] = stops - starts
+    counts[2:-1:2] = starts[1:] - stops[:-1]
+    counts[-1] = height * width - stops[-1]
+    return counts
+
+
+def rle_string(counts: np.ndarray) -> str:
+    """Compressed COCO RLE string, the encoding used by pycocotools."""
+    chars = []
+    counts = counts.tolist()
+    for i, x in enumerate(counts):
+        if i > 2:
+            x -= counts[i - 2]
+        more = True
+        while more:
+            c = x & 0x1F
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            chars.append(chr(c + 48))
+    return "".join(chars)
+
+
+def _coco_annotations(image_id: int, labels: np.ndarray) -> list[str]:
+    """COCO annotations of one label map, serialized without their id."""
+    shape = labels.shape
+    annotations = []
+    for index, slices in enumerate(find_objects(labels)):
+        if slices is None:
+            continue
+        rows, cols = slices
+        mask = labels[slices] == index + 1
+        counts = rle_counts(mask, (rows.start, cols.start), shape)
+        body = {
+            "image_id": image_id,
+            "category_id": 1,
+            "iscrowd": 0,
+            "area": int(np.count_nonzero(mask)),
+            "bbox": [
+                cols.start,
+                rows.start,
+                cols.stop - cols.start,
+                rows.stop - rows.start,
+            ],
+            "segmentation": {"size": list(shape), "counts": rle_string(counts)},
+        }
+        annotations.append(json.dumps(body, separators=(",", ":"))[1:-1])
+    return annotations
+
+
+def _labels(path: Path, mmap_mode: MmapMode | None = "r") -> np.ndarray:
+    """Label map of an image listed by :func:`find_annotated`."""
+    labels = load_labels(path, mmap_mode)
+    if labels is None:
+        raise FileNotFoundError(f"{labels_path(path)} no longer exists")
+    return labels
+
+
+def _export_coco(job: tuple[int, Path, Path]) -> tuple[str, list[str]]:
+    image_id, path, root = job
+    labels = _labels(path)
+    height, width = labels.shape
+    image = {
+        "id": image_id,
+        "file_name": path.relative_to(root).as_posix(),
+        "height": height,
+        "width": width,
+    }
+    return json.dumps(image, separators=(",", ":")), _coco_annotations(image_id, labels)
+
+
+def _export_polygons(job: tuple[int, Path, Path]) -> str:
+    _, path, root = job
+    labels = _labels(path)
+    objects = load_objects(path, _trace_pool)
+    painted = load_painted(path)
+    if painted is not None:
+        # brush labels have no stored polygons
+        objects = objects or PolygonStore()
+        for _, traced in trace_labels(painted, _trace_pool):
+            objects.append(traced)
+    rings = (
+        []
+        if objects is None
+        else [
+            # rounded in float64, float32 values print with spurious digits
+            [ring.astype(np.float64).round(2).tolist() for ring in objects.rings(oid)]
+            for oid in objects
+        ]
+    )
+    line = {
+        "file_name": path.relative_to(root).as_posix(),
+        "height": labels.shape[0],
+        "width": labels.shape[1],
+        "objects": rings,
+    }
+    return json.dumps(line, separators=(",", ":"))
+
+
+def _export_png(job: tuple[int, Path, Path, Path]) -> str:
+    from skimage.io import imsave
+
+    _, path, root, out_dir = job
+    labels = np.asarray(_labels(path), dtype=np.uint16)
+    target = out_dir / path.relative_to(root).with_suffix(".png")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    imsave(target, labels, check_contrast=False)
+    return str(target)
+
+
+def _upgrade(job: tuple[int, Path, Path]) -> str:
+    """Rewrite a legacy label map and store its polygons, return what was done."""
+    _, path, _ = job
+    try:
+        np.load(labels_path(path), mmap_mode="r", allow_pickle=False)
+        legacy = False
+    except ValueError:
+        legacy = True
+    if not legacy and load_polygons(path) is not None:
+        return "current"
+
+    labels = np.asarray(_labels(path, mmap_mode=None))
+    # label n has to be the n-th object, close any gaps in the numbering
+    values = np.unique(labels)
+    values = values[values != 0]
+    lut = np.zeros(int(values[-1]) + 1 if len(values) else 1, dtype=np.uint16)
+    lut[values] = np.arange(1, len(values) + 1)
+    labels = lut[labels]
+
+    objects = PolygonStore.from_rings(
+        rings for _, rings in trace_labels(labels, _trace_pool)
+    )
+    save_annotation(path, labels, objects)
+    return "upgraded"
+
+
+def _run(worker, jobs: list, workers: int | None) -> Iterator:
+    """Map ``worker`` over ``jobs`` on a process pool, yielding results in order."""
+    global _trace_pool
+    if workers == 1 or not jobs:
+        yield from map(worker, jobs)
+        return
+    if len(jobs) == 1:
+        # one image leaves the other cores to its objects
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as _trace_pool:
+                yield worker(jobs[0])
+        finally:
+            _trace_pool = None
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(worker, jobs, chunksize=CHUNK_SIZE)
+
+
+def _progress(done: int, total: int, quiet: bool):
+    if not quiet and (done == total or done % 100 == 0):
+        print(f"\r{done}/{total}", end="\n" if done == total else "", file=sys.stderr)
+
+
+def export(
+    root: Path,
+    fmt: str,
+    output: Path,
+    workers: int | None = None,
+    quiet: bool = False,
+):
+    """Export all annotations under ``root``.
+
+    Parameters
+    ----------
+    root : Path
+        Folder searched recursively for label maps.
+    fmt : str
+        ``"coco"`` writes one COCO JSON file with RLE masks, ``"polygons"``
+        writes JSON Lines with the polygon rings of every image and
+        ``"png"`` writes 16-bit label images into the ``output`` folder.
+    output : Path
+        Output file, or folder for ``"png"``.
+    workers : int | None
+        Number of processes, all cores if None.
+    quiet : bool
+        Do not report progress on stderr.
+    """
+    paths = find_annotated(root)
+    total = len(paths)
+
+    if fmt == "png":
+        if output.resolve() == root.resolve():
+            raise ValueError(
+                "png labels would overwrite the images, use another folder"
+            )
+        jobs = [(i, path, root, output) for i, path in enumerate(paths, 1)]
+        for done, _ in enumerate(_run(_export_png, jobs, workers), 1):
+            _progress(done, total, quiet)
+        return
+
+    jobs = [(i, path, root) for i, path in enumerate(paths, 1)]
+    with open(output, "w", encoding="utf-8") as f:
+        if fmt == "polygons":
+            for done, line in enumerate(_run(_export_polygons, jobs, workers), 1):
+                f.write(line + "\n")
+                _progress(done, total, quiet)
+            return
+
+        # annotations are streamed, the small image records follow at the end
+        f.write('{"categories":[{"id":1,"name":"object"}],"annotations":[')
+        images = []
+        annotation_id = 0
+        for done, (image, annotations) in enumerate(
+            _run(_export_coco, jobs, workers), 1
+        ):
+            images.append(image)
+            for body in annotations:
+                annotation_id += 1
+                separator = "," if annotation_id > 1 else ""
+                f.write(f'{separator}\n{{"id":{annotation_id},{body}}}')
+            _progress(done, total, quiet)
+        f.write('\n],"images":[\n')
+        f.write(",\n".join(images))
+        f.write("\n]}\n")
+
+
+def upgrade(root: Path, workers: int | None = None, quiet: bool = False):
+    """Convert label maps under ``root`` to the current format.
+
+    Pickled label maps are rewritten as plain arrays and missing or stale
+    polygon files are regenerated, so the editor opens them without
+    tracing.
+    """
+    jobs = [(i, path, root) for i, path in enumerate(find_annotated(root), 1)]
+    upgraded = 0
+    for done, status in enumerate(_run(_upgrade, jobs, workers), 1):
+        upgraded += status == "upgraded"
+        _progress(done, len(jobs), quiet)
+    if not quiet:
+        print(f"{upgraded} of {len(jobs)} annotations upgraded", file=sys.stderr)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="marek", description=(__doc__ or "").split("\n")[0]
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="processes, all cores by default",
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="no progress output")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="export annotations")
+    export_parser.add_argument("root", type=Path, help="folder with annotated images")
+    export_parser.add_argument("-f", "--format", choices=FORMATS, default="coco")
+    export_parser.add_argument(
+        "-o", "--output", type=Path, required=True, help="output file, folder for png"
+    )
+
+    upgrade_parser = commands.add_parser(
+        "upgrade", help="rewrite annotations in the current format"
+    )
+    upgrade_parser.add_argument("root", type=Path, help="folder with annotated images")
+
+    args = parser.parse_args(argv)
+    workers = args.workers or os.cpu_count()
+    if args.command == "export":
+        export(args.root, args.format, args.output, workers, args.quiet)
+    else:
+        upgrade(args.root, workers, args.quiet)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
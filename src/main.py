@@ -1,16 +1,38 @@
 import logging
+import os
 import sys
 
+# first, so startup timing sees every import
+from widgets.startup import startup_timer  # isort: skip
+
+from PySide6.QtCore import QSettings, Qt, QTimer
+from PySide6.QtGui import QKeySequence, QShortcut
 from PySide6.QtWidgets import (
     QApplication,
+    QDockWidget,
     QFileDialog,
     QMainWindow,
+    QMessageBox,
 )
 
+from widgets.annotations import load_objects, load_painted
 from widgets.bottombar import BottomBar
 from widgets.canvas import Canvas
+from widgets.filmstrip import Filmstrip, SessionModel, scan_folder
+from widgets.image_source import image_size
+from widgets.journal import JOURNAL_SUFFIX, Journal, journal_path
+from widgets.objects_map import OBJECTS_BUDGET_BYTES, ObjectsMap
+from widgets.paint import LabelPaint
+from widgets.polygons import PolygonStore
+from widgets.prefetch import PREFETCH_BUDGET_BYTES, PREFETCH_DEPTH, Prefetcher
+from widgets.profiling import CAPTURE_SHORTCUT, profiler
+from widgets.saving import Saver
+from widgets.thumbnails import ThumbnailCache
 from widgets.toolbar import ToolBar
 
+# seconds between background saves of edited images
+AUTOSAVE_INTERVAL_S = 300
+
 
 def exception_hook(exc_type, exc_value, exc_traceback):
     logging.error("Unhandled exception:", exc_info=(exc_type, exc_value, exc_traceback))
@@ -20,10 +42,15 @@ def exception_hook(exc_type, exc_value, exc_traceback):
 sys.excepthook = exception_hook
 
 
+def int_setting(settings: QSettings, key: str, default: int) -> int:
+    """Integer setting, Qt converts the strings some backends store."""
+    value = settings.value(key, default, type=int)
+    return value if isinstance(value, int) else default
+
+
 class MainWindow(QMainWindow):
-    imagesPaths: list[str] = []
+    images_paths: list[str] = []
     currImgIdx: int = 0
-    objects_map: dict[str, list] = {}
 
     def __init__(self):
         super().__init__()
@@ -33,17 +60,90 @@ class MainWindow(QMainWindow):
         self.canvas = Canvas()
         self.setCentralWidget(self.canvas)
 
+        settings = QSettings("MAReK", "MAReK")
+        self.prefetcher = Prefetcher(
+            depth=int_setting(settings, "prefetch/depth", PREFETCH_DEPTH),
+            budget_bytes=int_setting(
+                settings, "prefetch/budget_mb", PREFETCH_BUDGET_BYTES >> 20
+            )
+            << 20,
+            parent=self,
+        )
+
+        self.objects_map = ObjectsMap(
+            budget_bytes=int_setting(
+                settings, "session/objects_budget_mb", OBJECTS_BUDGET_BYTES >> 20
+            )
+            << 20,
+            parent=self,
+        )
+
+        self.saver = Saver(self)
+        # images edited since they were last saved
+        self.dirty: set[str] = set()
+        self.journals: dict[str, Journal] = {}
+        # brush label maps of images painted on since they were last saved
+        self.paintings: dict[str, LabelPaint] = {}
+        # saves dirty images in the background, which compacts their journals
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.setInterval(
+            int_setting(settings, "journal/autosave_s", AUTOSAVE_INTERVAL_S) * 1000
+        )
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.autosave_timer.start()
+
+        self.thumbnails = ThumbnailCache(parent=self)
+        self.session_model = SessionModel(self.thumbnails, self)
+        self.filmstrip = Filmstrip(self.thumbnails.size)
+        self.filmstrip.setModel(self.session_model)
+        self.filmstrip.image_selected.connect(self.show_image)
+        self.filmstrip_dock = QDockWidget("Images", self)
+        self.filmstrip_dock.setWidget(self.filmstrip)
+        self.filmstrip_dock.setAllowedAreas(
+            Qt.DockWidgetArea.TopDockWidgetArea | Qt.DockWidgetArea.BottomDockWidgetArea
+        )
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.filmstrip_dock)
+        self.filmstrip_dock.hide()
+        # the canvas shrinks without the window being resized
+        self.filmstrip_dock.visibilityChanged.connect(
+            lambda: QTimer.singleShot(0, self._position_floating_panels)
+        )
+
         self.toolbar = ToolBar(self.canvas)
         self.bottom_bar = BottomBar(self.canvas)
 
         self.bottom_bar.open_image_clicked.connect(self.open_images)
+        self.bottom_bar.open_folder_clicked.connect(self.open_folder)
+        QShortcut(QKeySequence.StandardKey.Open, self).activated.connect(
+            self.open_images
+        )
+        QShortcut(QKeySequence("Ctrl+Shift+O"), self).activated.connect(
+            self.open_folder
+        )
         self.toolbar.hand.connect(self.canvas.set_tool_hand)
         self.toolbar.pen.connect(self.canvas.set_tool_pen)
         self.toolbar.eraser.connect(self.canvas.set_tool_eraser)
-        self.toolbar.save.connect(self.canvas.save)
+        self.toolbar.segment.connect(self.canvas.set_tool_segment)
+        self.toolbar.brush.connect(self.canvas.set_tool_brush)
+        self.toolbar.vertex.connect(self.canvas.set_tool_vertex)
+        self.toolbar.save.connect(self.save_current)
+        self.toolbar.save_all.connect(self.save_all)
+        self.saver.progress.connect(self.bottom_bar.update_save_progress)
+        self.objects_map.usage_changed.connect(self.bottom_bar.update_memory)
+        self.saver.failed.connect(self._on_save_failed)
+        self.saver.saved.connect(self._on_saved)
+        self.saver.saved.connect(self.session_model.set_annotated)
+        QShortcut(QKeySequence.StandardKey.Save, self).activated.connect(
+            self.save_current
+        )
+        QShortcut(QKeySequence("Ctrl+Shift+S"), self).activated.connect(self.save_all)
         self.bottom_bar.nextImage.connect(self.next_image)
         self.bottom_bar.prevImage.connect(self.prev_image)
         self.canvas.objects_updated.connect(self.update_objects_map)
+        if profiler is not None:
+            QShortcut(QKeySequence(CAPTURE_SHORTCUT), self).activated.connect(
+                profiler.capture
+            )
 
         self.toolbar.show()
         self.bottom_bar.show()
@@ -55,23 +155,88 @@ class MainWindow(QMainWindow):
             self,
             "Open Image",
             "",
-            "Images (*.png *.jpg *.jpeg *.bmp)",
+            "Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff)",
         )
-        self.images_paths = file_paths
-        self.currImgIdx = 0
         if file_paths:
-            self._load_image_with_objects(file_paths[self.currImgIdx])
-            self.bottom_bar.update_counter(self.currImgIdx, len(self.images_paths))
+            self._open_session(file_paths)
+
+    def open_folder(self):
+        """Open every image of a folder as a session."""
+        folder = QFileDialog.getExistingDirectory(self, "Open Folder")
+        if not folder:
+            return
+        paths, annotated = scan_folder(folder)
+        if not paths:
+            QMessageBox.information(self, "Open Folder", f"No images in {folder}")
+            return
+        self._open_session(paths, annotated)
+
+    def _open_session(self, paths: list[str], annotated: set[str] | None = None):
+        self.images_paths = paths
+        self.session_model.set_paths(paths, annotated)
+        self.filmstrip_dock.show()
+        self._recover_journals(paths)
+        self.show_image(0)
+
+    def _journal(self, path: str) -> Journal:
+        journal = self.journals.get(path)
+        if journal is None:
+            journal = self.journals[path] = Journal(path)
+        return journal
+
+    def _recover_journals(self, paths: list[str]):
+        """Replay edits journaled but never saved, e.g. before a crash."""
+        journal_names: set[str] = set()
+        for folder in {os.path.dirname(path) for path in paths}:
+            try:
+                journal_names.update(
+                    os.path.join(folder, name)
+                    for name in os.listdir(folder or ".")
+                    if name.endswith(JOURNAL_SUFFIX)
+                )
+            except OSError:
+                continue
+
+        recovered = 0
+        for path in paths:
+            if path in self.objects_map or str(journal_path(path)) not in journal_names:
+                continue
+            journal = self._journal(path)
+            if not journal.pending:
+                continue
+            objects = load_objects(path) or PolygonStore()
+            journal.replay(objects)
+            size = image_size(path)
+            if size is not None:
+                width, height = size
+                labels = journal.replay_painted(load_painted(path), (height, width))
+                if labels is not None:
+                    self.paintings[path] = LabelPaint((height, width), labels)
+            self.objects_map[path] = objects
+            self.dirty.add(path)
+            recovered += 1
+
+        if recovered:
+            QMessageBox.information(
+                self,
+                "Recovered edits",
+                f"Restored unsaved edits of {recovered} image(s).",
+            )
+
+    def show_image(self, index: int):
+        """Show the image at ``index`` of the session."""
+        self.currImgIdx = index
+        self._load_image_with_objects(self.images_paths[index])
+        self.bottom_bar.update_counter(index, len(self.images_paths))
+        self.filmstrip.set_current(index)
 
     def next_image(self):
-        self.currImgIdx = (self.currImgIdx + 1) % len(self.images_paths)
-        self._load_image_with_objects(self.images_paths[self.currImgIdx])
-        self.bottom_bar.update_counter(self.currImgIdx, len(self.images_paths))
+        if self.images_paths:
+            self.show_image((self.currImgIdx + 1) % len(self.images_paths))
 
     def prev_image(self):
-        self.currImgIdx = (self.currImgIdx - 1) % len(self.images_paths)
-        self._load_image_with_objects(self.images_paths[self.currImgIdx])
-        self.bottom_bar.update_counter(self.currImgIdx, len(self.images_paths))
+        if self.images_paths:
+            self.show_image((self.currImgIdx - 1) % len(self.images_paths))
 
     def _load_image_with_objects(self, file_path: str):
         """Load image with annotations.
@@ -82,14 +247,80 @@ class MainWindow(QMainWindow):
             Path to the image.
 
         """
+        previous = self.canvas.journal
+        if previous is not None and previous is not self.journals.get(file_path):
+            # reopened on the next edit, so only the shown image holds a file
+            previous.close()
+
         objects = self.objects_map.get(file_path)
-        self.canvas.load_image(file_path, objects)
+        painted = self.paintings.get(file_path)
+        cached = self.prefetcher.get(file_path)
+        if cached is None:
+            self.canvas.load_image(file_path, objects, painted=painted)
+        else:
+            if objects is None and cached.objects:
+                objects = cached.objects.copy()
+            self.canvas.load_image(file_path, objects, cached.source, painted)
+        self.canvas.journal = self._journal(file_path)
+
+        self.prefetcher.prefetch(self.images_paths, self.currImgIdx)
 
     def update_objects_map(self):
         """Store current canvas objects for the current image."""
         current_path = self.images_paths[self.currImgIdx]
-        if self.canvas.objects:
-            self.objects_map[current_path] = self.canvas.objects
+        self.objects_map[current_path] = self.canvas.objects
+        if self.canvas.painted is not None:
+            self.paintings[current_path] = self.canvas.painted
+        self.dirty.add(current_path)
+
+    def save_current(self):
+        """Save the annotation of the image shown on the canvas in the background."""
+        path = self.canvas.image_path
+        if not path:
+            return
+        if self.saver.save(
+            path,
+            self.canvas.objects,
+            self.canvas.image_shape,
+            self.canvas.export_labels(),
+            self._journal(path).seq,
+            self.canvas.export_painted(),
+        ):
+            self.dirty.discard(path)
+
+    def save_all(self):
+        """Save every image edited since its last save, in parallel."""
+        for path in sorted(self.dirty):
+            objects = self.objects_map.get(path)
+            if objects is None:
+                continue
+            shape = labels = painted = None
+            if path == self.canvas.image_path:
+                shape = self.canvas.image_shape
+                labels = self.canvas.export_labels()
+                painted = self.canvas.export_painted()
+            elif self.paintings.get(path):
+                painted = self.paintings[path].export()
+            if self.saver.save(
+                path, objects, shape, labels, self._journal(path).seq, painted
+            ):
+                self.dirty.discard(path)
+
+    def autosave(self):
+        if self.dirty and not self.saver.busy:
+            self.save_all()
+
+    def _on_saved(self, path: str):
+        journal = self.journals.get(path)
+        if journal is not None:
+            journal.compact()
+        if path not in self.dirty and path != self.canvas.image_path:
+            # the saved label map holds it now
+            self.paintings.pop(path, None)
+
+    def _on_save_failed(self, path: str, error: str):
+        self.dirty.add(path)
+        QMessageBox.warning(self, "Save failed", f"Could not save {path}:\n{error}")
 
     def _position_floating_panels(self):
         """Position floating panels on the canvas."""
@@ -121,6 +352,9 @@ class MainWindow(QMainWindow):
         self._position_floating_panels()
 
 
+if startup_timer is not None:
+    startup_timer.mark("imports done")
+
 app = QApplication()
 
 # stylesheet_path = Path(__file__).parent.parent / "assets" / "styles.qss"
@@ -130,6 +364,17 @@ app = QApplication()
 window = MainWindow()
 window.show()
 
+if startup_timer is not None:
+    startup_timer.mark("window shown")
+
+    def _report_startup():
+        startup_timer.mark("event loop idle")
+        startup_timer.uninstall()
+        startup_timer.report()
+
+    # runs once the first events, including the initial paint, are processed
+    QTimer.singleShot(0, _report_startup)
+
 
 if __name__ == "__main__":
     _ = app.exec()
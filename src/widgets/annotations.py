@@ -0,0 +1,244 @@
+import os
+import pickle
+import tempfile
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Literal
+
+import numpy as np
+
+from .contours import trace_labels
+from .polygons import PolygonStore
+
+FORMAT_VERSION = 1
+POLYGONS_SUFFIX = ".polygons.npz"
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+# how np.load maps a label map into memory
+MmapMode = Literal["r+", "r", "w+", "c"]
+
+
+def labels_path(image_path: str | Path) -> Path:
+    """Label map stored next to the image."""
+    return Path(image_path).with_suffix(".npy")
+
+
+def polygons_path(image_path: str | Path) -> Path:
+    """Polygon vertices stored next to the image."""
+    return Path(image_path).with_suffix(POLYGONS_SUFFIX)
+
+
+def find_annotated(root: Path) -> list[Path]:
+    """Annotated images under ``root``, sorted.
+
+    A label map without a matching image is returned as the ``.npy`` path
+    itself, all annotation paths derive from it the same way.
+    """
+    found = []
+    for npy in sorted(root.rglob("*.npy")):
+        for suffix in IMAGE_SUFFIXES:
+            image = npy.with_suffix(suffix)
+            if image.exists():
+                found.append(image)
+                break
+        else:
+            found.append(npy)
+    return found
+
+
+@contextmanager
+def atomic_write(path: Path):
+    """Open a temporary file next to ``path`` and move it over ``path`` on success.
+
+    A crash or error while writing leaves the previous file untouched.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file private, keep the permissions of the file it replaces
+        mode = path.stat().st_mode & 0o777 if path.exists() else 0o644
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _labels_stamp(path: Path) -> tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_labels(
+    image_path: str | Path, mmap_mode: MmapMode | None = "r"
+) -> np.ndarray | None:
+    """Load the label map of an image.
+
+    Label maps are plain uint16 ``.npy`` arrays, opened memory-mapped by
+    default. Files written by older versions hold a pickled
+    ``{"labels": ...}`` dict and are unpickled only in that case.
+
+    Parameters
+    ----------
+    image_path : str | Path
+        Path to the image.
+    mmap_mode : MmapMode | None
+        Passed to ``np.load``, None reads the whole array into memory.
+
+    Returns
+    -------
+    np.ndarray | None
+        The label map, or None if the image has no annotation.
+    """
+    path = labels_path(image_path)
+    if not path.exists():
+        return None
+
+    try:
+        return np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+    except ValueError:
+        # legacy format, an object array wrapping a dict
+        data = np.load(path, allow_pickle=True)
+        if isinstance(data, np.ndarray) and data.dtype == object:
+            data = data.item()
+        labels = data["labels"] if isinstance(data, dict) else data
+        return np.asarray(labels)
+
+
+def save_labels(image_path: str | Path, labels: np.ndarray):
+    with atomic_write(labels_path(image_path)) as f:
+        np.save(f, labels, allow_pickle=False)
+
+
+def save_polygons(
+    image_path: str | Path,
+    objects: PolygonStore,
+    journal_seq: int = 0,
+    painted: int = 0,
+):
+    """Store polygon vertices so reopening does not have to re-trace the label map.
+
+    The file records the size and modification time of the label map it was
+    written with and is ignored once the label map changes. ``journal_seq``
+    is the last edit journal record included in ``objects``, ``painted`` the
+    number of labels after those of ``objects`` that were painted and have
+    no polygons.
+    """
+    size, mtime = _labels_stamp(labels_path(image_path))
+    vertices, ring_ends, ring_counts = objects.to_arrays()
+    with atomic_write(polygons_path(image_path)) as f:
+        np.savez_compressed(
+            f,
+            version=np.int32(FORMAT_VERSION),
+            labels_stamp=np.array([size, mtime], dtype=np.int64),
+            vertices=vertices,
+            ring_ends=ring_ends,
+            ring_counts=ring_counts,
+            journal_seq=np.int64(journal_seq),
+            painted=np.int64(painted),
+        )
+
+
+def load_polygons(image_path: str | Path) -> PolygonStore | None:
+    """Polygons saved with the current label map, None if missing or stale."""
+    path = polygons_path(image_path)
+    labels = labels_path(image_path)
+    if not (path.exists() and labels.exists()):
+        return None
+
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["version"]) > FORMAT_VERSION:
+            return None
+        if tuple(data["labels_stamp"].tolist()) != _labels_stamp(labels):
+            return None
+        return PolygonStore.from_arrays(
+            data["vertices"], data["ring_ends"], data["ring_counts"]
+        )
+
+
+def load_journal_seq(image_path: str | Path) -> int:
+    """Last edit journal record included in the saved annotation, 0 if none."""
+    path = polygons_path(image_path)
+    if not path.exists():
+        return 0
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            return int(data["journal_seq"]) if "journal_seq" in data else 0
+    except (OSError, ValueError) as e:
+        print(f"Error reading {path}: {e}")
+        return 0
+
+
+def load_painted(image_path: str | Path) -> np.ndarray | None:
+    """Painted labels of the current label map, None if nothing was painted.
+
+    They are the labels after the ones of the stored polygons, shifted to
+    start at 1.
+    """
+    path = polygons_path(image_path)
+    labels = labels_path(image_path)
+    if not (path.exists() and labels.exists()):
+        return None
+
+    with np.load(path, allow_pickle=False) as data:
+        if "painted" not in data or int(data["painted"]) == 0:
+            return None
+        if tuple(data["labels_stamp"].tolist()) != _labels_stamp(labels):
+            return None
+        count = len(data["ring_counts"])
+    labels = load_labels(image_path)
+    if labels is None:
+        return None
+    painted = np.zeros(labels.shape, dtype=np.uint16)
+    np.subtract(labels, count, out=painted, where=labels > count)
+    return painted
+
+
+def save_annotation(
+    image_path: str | Path,
+    labels: np.ndarray,
+    objects: PolygonStore,
+    journal_seq: int = 0,
+    painted: int = 0,
+):
+    save_labels(image_path, labels)
+    save_polygons(image_path, objects, journal_seq, painted)
+
+
+def load_objects(
+    image_path: str | Path, executor: Executor | None = None
+) -> PolygonStore | None:
+    """Load objects of an image.
+
+    Stored polygons are used when they match the label map, otherwise the
+    label map is traced.
+
+    Parameters
+    ----------
+    image_path : str | Path
+        Path to the image.
+    executor : Executor | None
+        Process pool a large label map is traced on, see :func:`trace_labels`.
+
+    Returns
+    -------
+    PolygonStore | None
+        Objects of the image, or None if it has no annotation.
+    """
+    try:
+        objects = load_polygons(image_path)
+        if objects is None:
+            labels = load_labels(image_path)
+            if labels is None:
+                return None
+            objects = PolygonStore.from_rings(
+                rings for _, rings in trace_labels(labels, executor)
+            )
+        return objects if objects else None
+    except (pickle.UnpicklingError, OSError, ValueError, KeyError) as e:
+        print(f"Error loading objects from {labels_path(image_path)}: {e}")
+        return None
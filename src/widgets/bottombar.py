@@ -1,8 +1,10 @@
-from PySide6.QtCore import QSize, Qt, Signal
+from PySide6.QtCore import QSize, Qt, QTimer, Signal
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import (
+    QApplication,
     QHBoxLayout,
     QLabel,
+    QProgressBar,
     QPushButton,
     QWidget,
 )
@@ -17,6 +19,7 @@ class BottomBar(QWidget):
     """Floating bottom bar with image navigation and counter."""
 
     open_image_clicked = Signal()
+    open_folder_clicked = Signal()
     nextImage = Signal()
     prevImage = Signal()
 
@@ -58,7 +61,10 @@ class BottomBar(QWidget):
         openButton.setMinimumHeight(45)
         openButton.setMaximumWidth(60)
         openButton.setMaximumHeight(45)
-        openButton.clicked.connect(self.open_image_clicked.emit)
+        openButton.setToolTip(
+            "Open images (Ctrl+O)\nShift+click to open a folder (Ctrl+Shift+O)"
+        )
+        openButton.clicked.connect(self._on_open_clicked)
         layout.addWidget(openButton)
 
         layout.addSpacing(10)
@@ -75,14 +81,63 @@ class BottomBar(QWidget):
         nextButton.clicked.connect(self.nextImage.emit)
         layout.addWidget(nextButton)
 
+        self.memoryLabel = QLabel()
+        self.memoryLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.memoryLabel.setMinimumWidth(70)
+        self.update_memory(0, 0)
+        layout.addWidget(self.memoryLabel)
+
+        self.saveProgress = QProgressBar()
+        self.saveProgress.setMaximumWidth(140)
+        self.saveProgress.setFormat("Saving %v/%m")
+        # keep the bar's width constant so it stays centered on the canvas
+        policy = self.saveProgress.sizePolicy()
+        policy.setRetainSizeWhenHidden(True)
+        self.saveProgress.setSizePolicy(policy)
+        self.saveProgress.hide()
+        layout.addWidget(self.saveProgress)
+
         self.setLayout(layout)
         self.setMinimumHeight(50)
         self.setMaximumHeight(50)
         self.adjustSize()
 
+    def _on_open_clicked(self):
+        if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier:
+            self.open_folder_clicked.emit()
+        else:
+            self.open_image_clicked.emit()
+
     def update_counter(self, current: int, total: int):
         """Update the image counter display."""
         if total == 0:
             self.counterLabel.setText("No images loaded")
         else:
             self.counterLabel.setText(f"Image {current + 1} of {total}")
+
+    def update_memory(self, nbytes: int, spilled: int):
+        """Show memory used by the objects of edited images."""
+        self.memoryLabel.setText(f"{nbytes / 2**20:.1f} MB")
+        self.memoryLabel.setToolTip(
+            f"Objects of edited images: {nbytes / 2**20:.1f} MB in memory, "
+            f"{spilled} images moved to disk"
+        )
+
+    def update_save_progress(self, done: int, total: int):
+        """Show progress of running saves, hide the bar shortly after they finish."""
+        if total == 0:
+            return
+
+        self.saveProgress.setMaximum(total)
+        self.saveProgress.setValue(done)
+        if done < total:
+            self.saveProgress.setFormat("Saving %v/%m")
+            self.saveProgress.show()
+        else:
+            self.saveProgress.setFormat("Saved")
+            self.saveProgress.show()
+            QTimer.singleShot(1500, self._hide_save_progress)
+
+    def _hide_save_progress(self):
+        if self.saveProgress.value() >= self.saveProgress.maximum():
+            self.saveProgress.hide()
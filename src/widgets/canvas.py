@@ -1,30 +1,70 @@
 import math
 from enum import StrEnum
-from pathlib import Path
 
 import numpy as np
-from skimage.draw import polygon as draw_polygon
-from skimage.measure import find_contours
-from PySide6.QtCore import QPoint, QPointF, Signal
-from PySide6.QtGui import QBrush, QColor, QImage, QPainter, QPainterPath, QPen, Qt
-from PySide6.QtWidgets import QWidget
+
+from PySide6.QtCore import QPoint, QPointF, QRect, QRectF, QSizeF, QTimer, Signal
+from PySide6.QtGui import (
+    QBrush,
+    QColor,
+    QFont,
+    QImage,
+    QPainter,
+    QPainterPath,
+    QPen,
+    QTransform,
+    Qt,
+)
+from PySide6.QtWidgets import QMessageBox, QWidget
 from PySide6.QtGui import QPalette
 
+from . import palette
+from .annotations import load_objects, load_painted
+from .journal import Journal
+from .layer import TiledLayer
+from .lod import LevelOfDetail, lod_band
+from .paint import OVERLAY_TILE_SIZE, LabelPaint
+from .paths import array_to_path
+from .polygons import PolygonStore
+from .profiling import profiled, profiler
+from .raster import LabelRaster
+from .segment import Segmenter
+from .simplify import StrokeSimplifier
+from .spatial import GridIndex, OutlineHit, OutlineIndex
+from .image_source import ImageSource, QImageSource, open_image_source
+from .pyramid import ImagePyramid, SourcePyramid
+
 CLOSE_THRESHOLD = 30
+# screen pixels between recorded pen samples
 MIN_POINT_DISTANCE = 2
-COLORS = [
-    QColor(255, 0, 0),
-    QColor(0, 255, 0),
-    QColor(0, 0, 255),
-    QColor(255, 255, 0),
-    QColor(255, 0, 255),
-]
+# screen pixels a drawn outline may deviate from the pointer path, mouse
+# positions are whole screen pixels so this has to exceed one
+STROKE_TOLERANCE = 2.0
+# bounds of the stroke tolerance in image pixels
+MIN_STROKE_TOLERANCE = 0.5
+MAX_STROKE_TOLERANCE = 1.0
+# screen pixels around a new stroke segment that get repainted
+STROKE_REPAINT_MARGIN = 4
+# radius of the label brush in screen pixels, zooming in paints finer
+BRUSH_RADIUS_PX = 8
+# screen pixels within which a vertex or edge is picked for editing
+VERTEX_PICK_PX = 8
+# half edge of the square marking the picked vertex, in screen pixels
+VERTEX_HANDLE_PX = 4
+# screen pixels the pointer has to move for a segmentation box instead of a click
+BOX_DRAG_THRESHOLD = 6
+# milliseconds between refreshes of the profiling overlay
+PROFILE_REFRESH_MS = 500
+COLORS = [QColor(*rgb) for rgb in palette.COLORS]
 
 
 class Tool(StrEnum):
     HAND = "hand"
     PEN = "pen"
     ERASER = "eraser"
+    SEGMENT = "segment"
+    BRUSH = "brush"
+    VERTEX = "vertex"
 
 
 class Canvas(QWidget):
@@ -32,91 +72,152 @@ class Canvas(QWidget):
 
     def __init__(self):
         super().__init__()
-        self.image = None
+        self.source: ImageSource | None = None
         self.image_path = None
         self.zoom = 1.0
         self.offset = QPoint(0, 0)
         self.drawing = False
-        self.current_points: list[QPoint] = []
-        self.objects: list[list[QPoint]] = []
+        self.current_points = StrokeSimplifier()
+        # last pen sample, the simplified stroke may have dropped it
+        self._last_sample = QPointF()
+        self.objects = PolygonStore()
         self.pan_start = QPoint(0, 0)
         self.tool: Tool = Tool.HAND
-        # cache for scaled image
-        self.scaled_image_cache = None
-        self.cached_zoom = 1.0
+        self.pyramid: ImagePyramid | SourcePyramid | None = None
+        self._paths: dict[int, QPainterPath] = {}
+        self.index = GridIndex()
+        self.hovered: int | None = None
+        # label map of the objects, built on first save and then kept up to date
+        self.raster: LabelRaster | None = None
+        # objects painted with the brush, created on first use
+        self.painted: LabelPaint | None = None
+        # label under the brush while it is pressed, 0 erases
+        self._brush_label: int | None = None
+        self._brush_last = QPointF()
+        # object painted last, fills continue it
+        self._fill_label: int | None = None
+        # painted pixels changed since the last journaled brush edit
+        self._paint_rect: tuple[int, int, int, int] | None = None
+        # outlines of the objects, built when vertex editing starts
+        self.outlines: OutlineIndex | None = None
+        # vertex or edge under the pointer, and the vertex being dragged
+        self._vertex_hit: OutlineHit | None = None
+        self._vertex_drag: OutlineHit | None = None
+        # bounds of the dragged object before the drag
+        self._drag_bounds: np.ndarray | None = None
+        # edit journal of the current image, set by the owner after loading
+        self.journal: Journal | None = None
+        # bumped on every object change
+        self._revision = 0
+        self._panning = False
+        self.layer = TiledLayer(
+            self._render_layer,
+            self.palette().color(QPalette.ColorRole.Window),
+            parent=self,
+        )
+        self.layer.updated.connect(self.update)
+        self.segmenter = Segmenter(self)
+        self.segmenter.preview.connect(self._on_segment_preview)
+        self.segmenter.finished.connect(self._on_segment_finished)
+        # image-space start of a segmentation click or box, while pressed
+        self._segment_start: QPointF | None = None
+        self._segment_box: QRectF | None = None
+        # coarse outline shown until the refined one arrives
+        self._segment_preview: QPainterPath | None = None
+        self.lod = LevelOfDetail()
+        self._palette_rgb = np.array(palette.COLORS)
+
+        self._pens = []
+        # wide strokes are costly on the thousands of outlines seen zoomed out
+        self._thin_pens = []
+        self._brushes = []
+        for base_color in COLORS:
+            pen = QPen(base_color, 2, Qt.PenStyle.SolidLine)
+            pen.setCosmetic(True)
+            self._pens.append(pen)
+            thin_pen = QPen(pen)
+            thin_pen.setWidth(1)
+            self._thin_pens.append(thin_pen)
+
+            fill_color = QColor(base_color)
+            fill_color.setAlpha(palette.FILL_ALPHA)
+            self._brushes.append(QBrush(fill_color))
 
         self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
         self.setMouseTracking(True)
 
-    def load_image(self, file_path, objects: list[list[QPoint]] | None = None):
+        if profiler is not None:
+            # keeps the overlay current while nothing else repaints
+            self._profile_timer = QTimer(self)
+            self._profile_timer.timeout.connect(
+                lambda: self.update(self._profile_rect())
+            )
+            self._profile_timer.start(PROFILE_REFRESH_MS)
+
+    @profiled("load")
+    def load_image(
+        self,
+        file_path,
+        objects: PolygonStore | None = None,
+        image: QImage | ImageSource | None = None,
+        painted: LabelPaint | None = None,
+    ):
         self.image_path = file_path
-        self.image = QImage(file_path)
+        if image is None:
+            image = open_image_source(file_path)
+        elif isinstance(image, QImage):
+            image = QImageSource(image)
+        self.source = image
         self.zoom = 1.0
         self.offset = QPoint(0, 0)
-        self.scaled_image_cache = self.image.copy()
-        self.cached_zoom = self.zoom
+        if self.source.image is not None:
+            self.pyramid = ImagePyramid(self.source.image)
+        else:
+            # decoded by region, the full resolution never is in memory
+            self.pyramid = SourcePyramid(self.source)
+            self.pyramid.tile_ready.connect(self._refresh_tile)
+        self.pyramid.level_ready.connect(self._refresh_layer)
 
         if objects is None:
-            objects = self._load_objects_from_npy(file_path)
-
-        self.objects = objects if objects else []
-        self.current_points = []
+            objects = load_objects(file_path)
+
+        self.objects = objects if objects is not None else PolygonStore()
+        self.current_points.clear()
+        self._paths.clear()
+        self.hovered = None
+        self.segmenter.cancel()
+        self._segment_start = None
+        self._segment_box = None
+        self._segment_preview = None
+        self.raster = None
+        if painted is None:
+            labels = load_painted(file_path)
+            if labels is not None:
+                painted = LabelPaint(labels.shape, labels)
+        self.painted = painted
+        self._brush_label = None
+        self._fill_label = None
+        self._paint_rect = None
+        self.journal = None
+        self._revision += 1
+        self.layer.clear()
+        self.index.clear()
+        for oid in self.objects:
+            self.index.insert(oid, self.objects.bounds(oid))
+        self.outlines = None
+        self._vertex_hit = None
+        self._vertex_drag = None
         self.fit_to_window()
         self.update()
 
-    def _load_objects_from_npy(self, file_path: str) -> list[list[QPoint]] | None:
-        """Load objects from .npy file if it exists.
-
-        Parameters
-        ----------
-        file_path : str
-            Path to the image file.
-
-        Returns
-        -------
-        list[list[QPoint]] | None
-            List of polygons loaded from .npy file, or None if file doesn't exist.
-        """
-        from pathlib import Path
-
-        import numpy as np
-
-        npy_path = Path(file_path).with_suffix(".npy")
-        if not npy_path.exists():
-            return None
-
-        try:
-            data = np.load(npy_path, allow_pickle=True)
-            if isinstance(data, np.ndarray) and data.dtype == object:
-                data = data.item()
-            labels = data["labels"] if isinstance(data, dict) else data
-            objects = []
-
-            for label_num in np.unique(labels):
-                if label_num == 0:
-                    continue
-
-                mask = (labels == label_num).astype(float)
-                contours = find_contours(mask, 0.5)
-
-                if contours:
-                    contour = contours[0]
-                    qpoints = [QPoint(int(y), int(x)) for x, y in contour]
-                    if len(qpoints) >= 3:
-                        objects.append(qpoints)
-            return objects if objects else None
-        except Exception as e:
-            print(f"Error loading objects from {npy_path}: {e}")
-            return None
-
     def fit_to_window(self):
-        if not self.image:
+        if not self.source:
             return
 
         window_width = self.width()
         window_height = self.height()
-        img_width = self.image.width()
-        img_height = self.image.height()
+        img_width = self.source.width
+        img_height = self.source.height
 
         if window_width > 0 and window_height > 0:
             zoom_x = window_width / img_width
@@ -125,99 +226,462 @@ class Canvas(QWidget):
             self.center_image()
 
     def center_image(self):
-        if not self.image:
+        if not self.source:
             return
 
-        img_width = int(self.image.width() * self.zoom)
-        img_height = int(self.image.height() * self.zoom)
+        img_width = int(self.source.width * self.zoom)
+        img_height = int(self.source.height * self.zoom)
 
         x = (self.width() - img_width) // 2
         y = (self.height() - img_height) // 2
 
         self.offset = QPoint(x, y)
 
+    @profiled("frame")
     def paintEvent(self, event):
         painter = QPainter(self)
-        painter.fillRect(self.rect(), self.palette().color(QPalette.ColorRole.Window))
 
-        if not self.image:
+        painter.fillRect(event.rect(), self.palette().color(QPalette.ColorRole.Window))
+        if not self.source:
             return
 
-        if self.cached_zoom != self.zoom:
-            mode = (
-                Qt.TransformationMode.FastTransformation
-                if self.drawing
-                else Qt.TransformationMode.SmoothTransformation
-            )
-            self.scaled_image_cache = self.image.scaledToWidth(
-                int(self.image.width() * self.zoom),
-                mode,
-            )
-            self.cached_zoom = self.zoom
-
-        if not self.scaled_image_cache:
-            return
+        # image and finished objects come from the tiled layer, only the
+        # damaged part of it is copied to the screen
+        self.layer.paint(
+            painter,
+            QRectF(event.rect()),
+            self.zoom,
+            QPointF(self.offset),
+            self.devicePixelRatioF(),
+            QSizeF(self.source.width * self.zoom, self.source.height * self.zoom),
+            fast=self.drawing or self._panning,
+        )
 
-        painter.drawImage(self.offset.x(), self.offset.y(), self.scaled_image_cache)
+        painter.setTransform(self._image_transform())
 
-        for i, obj in enumerate(self.objects):
-            base_color = COLORS[i % len(COLORS)]
+        if self.hovered is not None:
+            pen = QPen(Qt.GlobalColor.white, 3, Qt.PenStyle.SolidLine)
+            pen.setCosmetic(True)
+            painter.setPen(pen)
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawPath(self._object_path(self.hovered))
 
-            painter.setPen(QPen(base_color, 2, Qt.PenStyle.SolidLine))
+        if self._vertex_hit is not None:
+            self._draw_vertex_hit(painter, self._vertex_hit)
 
-            fill_color = QColor(base_color)
-            fill_color.setAlpha(100)
-            painter.setBrush(QBrush(fill_color))
+        if len(self.current_points) >= 2:
+            painter.setPen(self._pens[self.objects.next_id % len(COLORS)])
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawPath(array_to_path(self.current_points.array, closed=False))
 
-            self._draw_polygon(painter, obj, closed=True)
+        if self._segment_box is not None or self._segment_preview is not None:
+            pen = QPen(Qt.GlobalColor.white, 2, Qt.PenStyle.DashLine)
+            pen.setCosmetic(True)
+            painter.setPen(pen)
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            if self._segment_box is not None:
+                painter.drawRect(self._segment_box)
+            if self._segment_preview is not None:
+                painter.drawPath(self._segment_preview)
+
+        if profiler is not None:
+            self._draw_profile(painter, profiler.summary())
+
+    def _draw_vertex_hit(self, painter: QPainter, hit: OutlineHit):
+        """Highlight the edges at the picked vertex or edge, with a handle on it."""
+        before, after, _ = self._vertex_neighbours(hit.oid, hit.index)
+        points = self.objects.vertices(hit.oid)
+        line = points[
+            [before, hit.index, after] if hit.on_vertex else [hit.index, after]
+        ]
+        pen = QPen(Qt.GlobalColor.white, 2, Qt.PenStyle.SolidLine)
+        pen.setCosmetic(True)
+        painter.setPen(pen)
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        painter.drawPath(array_to_path(line, closed=False))
+
+        # the handle keeps its size on screen
+        centre = self._image_transform().map(QPointF(hit.x, hit.y))
+        size = VERTEX_HANDLE_PX
+        painter.save()
+        painter.resetTransform()
+        painter.setPen(QPen(Qt.GlobalColor.black, 1))
+        if hit.on_vertex:
+            painter.setBrush(Qt.GlobalColor.white)
+        painter.drawRect(
+            QRectF(centre.x() - size, centre.y() - size, 2 * size, 2 * size)
+        )
+        painter.restore()
+
+    def _profile_rect(self, lines: int | None = None) -> QRect:
+        if lines is None:
+            lines = len(profiler.summary()) if profiler is not None else 0
+        return QRect(10, 10, 240, 16 * (lines + 1))
+
+    def _draw_profile(self, painter: QPainter, summary: list[str]):
+        """Frame rate and median / 95th percentile times of the profiled sections."""
+        rect = self._profile_rect(len(summary))
+        painter.resetTransform()
+        painter.fillRect(rect, QColor(0, 0, 0, 160))
+        painter.setPen(Qt.GlobalColor.white)
+        painter.setFont(QFont("monospace", 8))
+        painter.drawText(
+            rect.adjusted(8, 8, -8, -8),
+            Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop,
+            "\n".join(summary),
+        )
 
-        if self.current_points:
-            color = COLORS[len(self.objects) % len(COLORS)]
-            painter.setPen(QPen(color, 2, Qt.PenStyle.SolidLine))
+    def _image_transform(self, offset: QPointF | None = None) -> QTransform:
+        # paths are cached in image coordinates, zoom and offset go to the painter
+        if offset is None:
+            offset = QPointF(self.offset)
+        return QTransform(self.zoom, 0, 0, self.zoom, offset.x(), offset.y())
+
+    def _render_layer(
+        self,
+        painter: QPainter,
+        origin: QPointF,
+        width: float,
+        height: float,
+        smooth: bool,
+    ):
+        """Draw the image and all finished objects for a tile of the layer."""
+        offset = -origin
+        self._draw_image(painter, offset, width, height, smooth)
+        self._draw_objects(painter, offset, width, height)
+        self._draw_painted(painter, offset, width, height)
+
+    @profiled("paint.objects")
+    def _draw_objects(
+        self, painter: QPainter, offset: QPointF, width: float, height: float
+    ):
+        """Draw the finished objects in an area at a detail fitting the zoom.
+
+        Outlines are exact from zoom 1 on; zoomed out they come simplified
+        and batched by colour, and objects of a few screen pixels become
+        filled rectangles.
+        """
+        self.lod.update(self.objects, self._revision)
+        top_left = -offset / self.zoom
+        view = (
+            top_left.x(),
+            top_left.y(),
+            top_left.x() + width / self.zoom,
+            top_left.y() + height / self.zoom,
+        )
+        large, small = self.lod.visible(view, self.zoom)
+
+        painter.setTransform(self._image_transform(offset))
+        band = lod_band(self.zoom)
+        if band == 0:
+            for oid in self.lod.ids[large].tolist():
+                painter.setPen(self._pens[oid % len(COLORS)])
+                painter.setBrush(self._brushes[oid % len(COLORS)])
+                painter.drawPath(self._object_path(oid))
+        else:
+            paths, collapsed = self.lod.band_paths(band, large, len(COLORS))
+            for color, path in paths:
+                painter.setPen(self._thin_pens[color])
+                painter.setBrush(self._brushes[color])
+                painter.drawPath(path)
+            small = np.concatenate((small, collapsed))
+
+        if len(small):
+            dpr = painter.device().devicePixelRatio()
+            image = self.lod.small_image(
+                small,
+                self._palette_rgb,
+                self.zoom,
+                (offset.x(), offset.y()),
+                (math.ceil(width * dpr), math.ceil(height * dpr)),
+                dpr,
+            )
+            painter.resetTransform()
+            painter.drawImage(0, 0, image)
+
+    def _draw_painted(
+        self, painter: QPainter, offset: QPointF, width: float, height: float
+    ):
+        """Draw the cached overlay tiles of the painted labels in an area."""
+        if not self.painted:
+            return
+        top_left = -offset / self.zoom
+        tiles = self.painted.tiles_in(
+            top_left.x(),
+            top_left.y(),
+            top_left.x() + width / self.zoom,
+            top_left.y() + height / self.zoom,
+        )
+        painter.setTransform(self._image_transform(offset))
+        # labels are pixels, they are not blurred when zoomed in
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, False)
+        for tx, ty in tiles:
+            image = self.painted.overlay((tx, ty))
+            if image is not None:
+                painter.drawImage(
+                    QPointF(tx * OVERLAY_TILE_SIZE, ty * OVERLAY_TILE_SIZE), image
+                )
+
+    def _refresh_layer(self):
+        self.layer.refresh()
+        self.update()
 
-            self._draw_polygon(painter, self.current_points, closed=False)
+    def _refresh_tile(self, x0: float, y0: float, x1: float, y1: float):
+        self.layer.refresh(QRectF(QPointF(x0, y0), QPointF(x1, y1)))
+        self.update()
 
-    def _draw_polygon(self, painter, points, closed=True):
-        if len(points) < 2:
+    @profiled("paint.image")
+    def _draw_image(
+        self,
+        painter: QPainter,
+        offset: QPointF,
+        width: float,
+        height: float,
+        smooth: bool,
+    ):
+        """Draw the pyramid tiles in an area from the level closest to the zoom."""
+        if not self.pyramid:
             return
 
-        screen_points = [self.screen_coords(p) for p in points]
-
-        if closed and len(screen_points) >= 3:
-            path = self._create_path(screen_points, closed=True)
-            painter.drawPath(path)
-        else:
-            path = self._create_path(screen_points, closed=False)
-            painter.setBrush(Qt.BrushStyle.NoBrush)
-            painter.drawPath(path)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, smooth)
+
+        top_left = -offset / self.zoom
+        bottom_right = top_left + QPointF(width, height) / self.zoom
+        level = self.pyramid.level_for_zoom(self.zoom)
+
+        for tx, ty in self.pyramid.tiles_in(
+            level,
+            top_left.x(),
+            top_left.y(),
+            bottom_right.x() + 1,
+            bottom_right.y() + 1,
+        ):
+            tile = self.pyramid.tile(level, tx, ty)
+            if tile is None:
+                continue
+            x0, y0, x1, y1 = self.pyramid.tile_rect(level, tx, ty)
+            # snap both edges so neighbouring tiles share them and no seams appear
+            left = round(x0 * self.zoom + offset.x())
+            top = round(y0 * self.zoom + offset.y())
+            right = round(x1 * self.zoom + offset.x())
+            bottom = round(y1 * self.zoom + offset.y())
+            painter.drawImage(
+                QRect(left, top, right - left, bottom - top),
+                tile,
+            )
 
-    def _create_path(self, points, closed=False):
-        path = QPainterPath()
-        if len(points) < 2:
-            return path
+    def _object_path(self, oid: int) -> QPainterPath:
+        """Image-space path of an object, built once and cached until it changes."""
+        path = self._paths.get(oid)
+        if path is None:
+            path = array_to_path(
+                self.objects.vertices(oid), self.objects.ring_ends(oid)
+            )
+            self._paths[oid] = path
+        return path
 
-        path.moveTo(QPointF(points[0].x(), points[0].y()))
+    def objects_at(self, image_point) -> list[int]:
+        """Ids of objects containing an image-space point, topmost last."""
+        point = QPointF(image_point)
+        return [
+            oid
+            for oid in self.index.query_point(point.x(), point.y())
+            if self._object_path(oid).contains(point)
+        ]
+
+    def _add_object(self, rings) -> int:
+        oid = self.objects.append(rings)
+        bounds = self.objects.bounds(oid).tolist()
+        if self.journal is not None:
+            self.journal.append_add(
+                self.objects.vertices(oid), self.objects.ring_ends(oid)
+            )
+        self.index.insert(oid, bounds)
+        if self.outlines is not None:
+            self.outlines.insert(
+                oid, self.objects.vertices(oid), self.objects.ring_ends(oid)
+            )
+        self._revision += 1
+        self.layer.invalidate(QRectF(QPointF(*bounds[:2]), QPointF(*bounds[2:])))
+        if self.raster is not None:
+            if LabelRaster.supports(self.objects):
+                self.raster.add(oid)
+            else:
+                self.raster = None
+        return oid
+
+    def _remove_object(self, oid: int):
+        bounds = self.objects.bounds(oid).copy()
+        if self.journal is not None:
+            rank = int(np.searchsorted(self.objects.ids(), oid))
+            self.journal.append_erase(rank)
+        self.objects.remove(oid)
+        self.index.remove(oid)
+        self._paths.pop(oid, None)
+        if self.raster is not None:
+            self.raster.remove(oid, bounds, self.index.query_rect(*bounds))
+        if self.outlines is not None:
+            self.outlines.remove(oid)
+        self._revision += 1
+        self.layer.invalidate(QRectF(QPointF(*bounds[:2]), QPointF(*bounds[2:])))
+        if self.hovered == oid:
+            self.hovered = None
+        if self._vertex_hit is not None and self._vertex_hit.oid == oid:
+            self._vertex_hit = None
+
+    def _reshape_object(
+        self, oid: int, vertices: np.ndarray, ring_ends: np.ndarray, rect: QRectF
+    ):
+        """Give an object new vertices in place and render the area that changed."""
+        self.objects.replace(oid, np.split(vertices, ring_ends[:-1]))
+        self.index.insert(oid, self.objects.bounds(oid).tolist())
+        self._paths.pop(oid, None)
+        self.lod.changed(oid)
+        self._revision += 1
+        self.layer.invalidate(rect)
+        self.update(self._screen_rect(rect, VERTEX_HANDLE_PX + STROKE_REPAINT_MARGIN))
+
+    def _finish_reshape(self, oid: int, old_bounds: np.ndarray):
+        """Journal a reshaped object and update what derives from its outline."""
+        vertices = self.objects.vertices(oid)
+        ring_ends = self.objects.ring_ends(oid)
+        if self.journal is not None:
+            rank = int(np.searchsorted(self.objects.ids(), oid))
+            self.journal.append_replace(rank, vertices, ring_ends)
+        if self.outlines is not None:
+            self.outlines.insert(oid, vertices, ring_ends)
+        if self.raster is not None:
+            bounds = self.objects.bounds(oid)
+            region = np.concatenate(
+                (
+                    np.minimum(old_bounds[:2], bounds[:2]),
+                    np.maximum(old_bounds[2:], bounds[2:]),
+                )
+            )
+            overlapping = [
+                o for o in self.index.query_rect(*region.tolist()) if o != oid
+            ]
+            self.raster.remove(oid, region, overlapping)
+            self.raster.add(oid)
+        self.objects_updated.emit()
+
+    def _vertex_neighbours(self, oid: int, index: int) -> tuple[int, int, int]:
+        """Vertices before and after a vertex within its ring, and the ring length."""
+        ends = self.objects.ring_ends(oid)
+        ring = int(np.searchsorted(ends, index, side="right"))
+        start = int(ends[ring - 1]) if ring else 0
+        length = int(ends[ring]) - start
+        return (
+            start + (index - start - 1) % length,
+            start + (index - start + 1) % length,
+            length,
+        )
 
-        for p in points[1:]:
-            path.lineTo(QPointF(p.x(), p.y()))
+    def _ensure_outlines(self) -> OutlineIndex:
+        if self.outlines is None:
+            self.outlines = OutlineIndex()
+            self.outlines.build(self.objects)
+        return self.outlines
+
+    def _hit_rect(self, hit: OutlineHit) -> QRectF:
+        """Image area of the edges highlighted for a hit."""
+        before, after, _ = self._vertex_neighbours(hit.oid, hit.index)
+        return _points_rect(
+            self.objects.vertices(hit.oid)[[before, hit.index, after]], (hit.x, hit.y)
+        )
 
-        if closed:
-            path.closeSubpath()
+    def _update_vertex_hover(self, screen_point):
+        outlines = self._ensure_outlines()
+        point = self._stroke_coords(screen_point)
+        hit = outlines.nearest(
+            self.objects, point.x(), point.y(), VERTEX_PICK_PX / self.zoom
+        )
+        if hit != self._vertex_hit:
+            margin = VERTEX_HANDLE_PX + STROKE_REPAINT_MARGIN
+            for changed in (self._vertex_hit, hit):
+                if changed is not None:
+                    self.update(self._screen_rect(self._hit_rect(changed), margin))
+            self._vertex_hit = hit
+
+    def _start_vertex_drag(self, screen_point):
+        """Pick the vertex under the pointer, or insert one on the edge under it."""
+        self._update_vertex_hover(screen_point)
+        hit = self._vertex_hit
+        if hit is None:
+            return
+        self._drag_bounds = self.objects.bounds(hit.oid).copy()
+        if not hit.on_vertex:
+            ends = self.objects.ring_ends(hit.oid)
+            index = hit.index + 1
+            self._reshape_object(
+                hit.oid,
+                np.insert(
+                    self.objects.vertices(hit.oid), index, (hit.x, hit.y), axis=0
+                ),
+                ends + (ends > hit.index),
+                self._hit_rect(hit),
+            )
+            hit = OutlineHit(hit.oid, index, True, hit.x, hit.y)
+        self._vertex_hit = self._vertex_drag = hit
+        self.drawing = True
 
-        return path
+    def _drag_vertex(self, screen_point):
+        drag = self._vertex_drag
+        if drag is None:
+            return
+        point = self._stroke_coords(screen_point)
+        before, after, _ = self._vertex_neighbours(drag.oid, drag.index)
+        vertices = self.objects.vertices(drag.oid).copy()
+        rect = _points_rect(
+            vertices[[before, drag.index, after]], (point.x(), point.y())
+        )
+        vertices[drag.index] = (point.x(), point.y())
+        self._reshape_object(
+            drag.oid, vertices, self.objects.ring_ends(drag.oid).copy(), rect
+        )
+        self._vertex_hit = self._vertex_drag = OutlineHit(
+            drag.oid, drag.index, True, point.x(), point.y()
+        )
 
-    def _polygon_contains(self, polygon, point):
-        path = QPainterPath()
-        path.addPolygon([QPointF(p.x(), p.y()) for p in polygon])
-        return path.contains(QPointF(point.x(), point.y()))
+    def _delete_vertex(self, screen_point):
+        """Remove the vertex under the pointer, rings keep at least three."""
+        self._update_vertex_hover(screen_point)
+        hit = self._vertex_hit
+        if hit is None or not hit.on_vertex:
+            return
+        _, _, length = self._vertex_neighbours(hit.oid, hit.index)
+        if length <= 3:
+            return
+        bounds = self.objects.bounds(hit.oid).copy()
+        ends = self.objects.ring_ends(hit.oid)
+        self._reshape_object(
+            hit.oid,
+            np.delete(self.objects.vertices(hit.oid), hit.index, axis=0),
+            ends - (ends > hit.index),
+            self._hit_rect(hit),
+        )
+        self._vertex_hit = None
+        self._finish_reshape(hit.oid, bounds)
+
+    def _screen_rect(self, rect: QRectF, margin: int) -> QRect:
+        """Widget area showing an image rectangle, grown by ``margin`` pixels."""
+        return (
+            QRect(
+                self.screen_coords(rect.topLeft()),
+                self.screen_coords(rect.bottomRight()),
+            )
+            .normalized()
+            .adjusted(-margin, -margin, margin, margin)
+        )
 
     def screen_coords(self, image_point):
         x = int(image_point.x() * self.zoom + self.offset.x())
         y = int(image_point.y() * self.zoom + self.offset.y())
         return QPoint(x, y)
 
+    @profiled("mouse")
     def wheelEvent(self, event):
-        if not self.image:
+        if not self.source:
             return
 
         global_pos = event.globalPosition()
@@ -239,33 +703,61 @@ class Canvas(QWidget):
 
         self.update()
 
+    @profiled("mouse")
     def mousePressEvent(self, event):
-        if not self.image:
+        if not self.source:
             return
 
         if event.button() == Qt.MouseButton.LeftButton:
             match self.tool:
                 case Tool.HAND:
                     self.pan_start = event.pos()
+                    self._panning = True
                 case Tool.PEN:
-                    click_pos = self.image_coords(event.pos())
                     self.drawing = True
-                    self.current_points.append(click_pos)
-                    self.update()
+                    if not len(self.current_points):
+                        self.current_points.tolerance = min(
+                            max(STROKE_TOLERANCE / self.zoom, MIN_STROKE_TOLERANCE),
+                            MAX_STROKE_TOLERANCE,
+                        )
+                    self._append_stroke_point(self._stroke_coords(event.pos()))
                 case Tool.ERASER:
                     click_pos = self.image_coords(event.pos())
-                    self.objects = [
-                        obj
-                        for obj in self.objects
-                        if not self._polygon_contains(obj, click_pos)
-                    ]
+                    for oid in self.objects_at(click_pos):
+                        self._remove_object(oid)
+                    if self.painted:
+                        label = self.painted.label_at(click_pos.x(), click_pos.y())
+                        if label:
+                            self._painted_changed(self.painted.erase(label))
+                            self._journal_paint()
                     self.objects_updated.emit()
                     self.update()
+                case Tool.SEGMENT:
+                    self._segment_start = self._stroke_coords(event.pos())
+                case Tool.VERTEX:
+                    self._start_vertex_drag(event.pos())
+                case Tool.BRUSH:
+                    if event.modifiers() & Qt.KeyboardModifier.ShiftModifier:
+                        self._fill(self._stroke_coords(event.pos()))
+                    else:
+                        self._start_brush(self._stroke_coords(event.pos()), False)
+        elif event.button() == Qt.MouseButton.RightButton:
+            match self.tool:
+                case Tool.BRUSH:
+                    self._start_brush(self._stroke_coords(event.pos()), True)
+                case Tool.VERTEX:
+                    self._delete_vertex(event.pos())
 
+    @profiled("mouse")
     def mouseMoveEvent(self, event):
-        if not self.image:
+        if not self.source:
             return
 
+        self._update_hover(event.pos())
+
+        if self._brush_label is not None:
+            self._brush_to(self._stroke_coords(event.pos()))
+
         if event.buttons() & Qt.MouseButton.LeftButton:
             match self.tool:
                 case Tool.HAND:
@@ -275,54 +767,252 @@ class Canvas(QWidget):
                     self.update()
                 case Tool.PEN:
                     if self.drawing:
-                        new_point = self.image_coords(event.pos())
-
-                        if self.current_points:
-                            last = self.current_points[-1]
+                        new_point = self._stroke_coords(event.pos())
+                        if not len(self.current_points):
+                            self._append_stroke_point(new_point)
+                        else:
+                            # sample in screen space, denser when zoomed in
                             dist = math.hypot(
-                                new_point.x() - last.x(), new_point.y() - last.y()
+                                new_point.x() - self._last_sample.x(),
+                                new_point.y() - self._last_sample.y(),
                             )
-                            if dist >= MIN_POINT_DISTANCE:
-                                self.current_points.append(new_point)
-                                self.update()
+                            if dist * self.zoom >= MIN_POINT_DISTANCE:
+                                self._append_stroke_point(new_point)
+                case Tool.VERTEX:
+                    if self._vertex_drag is not None:
+                        self._drag_vertex(event.pos())
+                case Tool.SEGMENT:
+                    if self._segment_start is not None:
+                        end = self._stroke_coords(event.pos())
+                        distance = math.hypot(
+                            end.x() - self._segment_start.x(),
+                            end.y() - self._segment_start.y(),
+                        )
+                        if distance * self.zoom >= BOX_DRAG_THRESHOLD:
+                            self._segment_box = QRectF(
+                                self._segment_start, end
+                            ).normalized()
                         else:
-                            self.current_points.append(new_point)
-                            self.update()
+                            self._segment_box = None
+                        self.update()
+
+    def _ensure_painted(self) -> LabelPaint | None:
+        shape = self.image_shape
+        if self.painted is None and shape is not None:
+            self.painted = LabelPaint(shape)
+        return self.painted
+
+    def _start_brush(self, point: QPointF, erase: bool):
+        """Start painting the object under the brush, a new one, or erasing."""
+        painted = self._ensure_painted()
+        if painted is None:
+            return
+        if erase:
+            label = 0
+        else:
+            label = painted.label_at(point.x(), point.y()) or painted.new_label()
+            if label is None:
+                QMessageBox.warning(
+                    self,
+                    "Brush",
+                    "All labels of this image are used, erase objects to paint more.",
+                )
+                return
+            self._fill_label = label
+        self._brush_label = label
+        self.drawing = True
+        self._brush_last = point
+        self._brush_to(point)
+
+    def _brush_to(self, point: QPointF):
+        if self.painted is None or self._brush_label is None:
+            return
+        radius = max(BRUSH_RADIUS_PX / self.zoom, 0.5)
+        last = self._brush_last
+        self._brush_last = point
+        self._painted_changed(
+            self.painted.stroke(
+                (last.x(), last.y()), (point.x(), point.y()), radius, self._brush_label
+            )
+        )
+
+    def _fill(self, point: QPointF):
+        """Fill the enclosed area under the point with the object painted last."""
+        painted = self._ensure_painted()
+        if painted is None:
+            return
+        label = self._fill_label or painted.new_label()
+        if label is None:
+            return
+        rect = painted.fill(point.x(), point.y(), label)
+        if rect is not None:
+            self._fill_label = label
+            self._painted_changed(rect)
+            self._journal_paint()
+            self.objects_updated.emit()
+
+    def _painted_changed(self, rect: tuple[int, int, int, int] | None):
+        """Render the layer tiles under changed labels again and repaint them."""
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+        if self._paint_rect is not None:
+            px0, py0, px1, py1 = self._paint_rect
+            self._paint_rect = (min(x0, px0), min(y0, py0), max(x1, px1), max(y1, py1))
+        else:
+            self._paint_rect = rect
+        self.layer.invalidate(QRectF(x0, y0, x1 - x0, y1 - y0))
+        margin = STROKE_REPAINT_MARGIN
+        self.update(
+            QRect(
+                self.screen_coords(QPointF(x0, y0)), self.screen_coords(QPointF(x1, y1))
+            )
+            .normalized()
+            .adjusted(-margin, -margin, margin, margin)
+        )
+
+    def _journal_paint(self):
+        """Journal the painted labels changed since the last brush edit."""
+        rect, self._paint_rect = self._paint_rect, None
+        if rect is None or self.journal is None or self.painted is None:
+            return
+        x0, y0, x1, y1 = rect
+        self.journal.append_paint(rect, self.painted.labels[y0:y1, x0:x1])
+
+    def _append_stroke_point(self, point):
+        """Add a point to the stroke and repaint only the edges it changes."""
+        # the simplifier may move the last vertex, repaint the edge it left too
+        before = self.current_points.array[-2:].copy()
+        self.current_points.append(point.x(), point.y())
+        self._last_sample = point
+
+        corners = np.concatenate((before, self.current_points.array[-2:]))
+        xmin, ymin = corners.min(axis=0).tolist()
+        xmax, ymax = corners.max(axis=0).tolist()
+        top_left = self.screen_coords(QPointF(xmin, ymin))
+        bottom_right = self.screen_coords(QPointF(xmax, ymax))
+        margin = STROKE_REPAINT_MARGIN
+        self.update(
+            QRect(top_left, bottom_right)
+            .normalized()
+            .adjusted(-margin, -margin, margin, margin)
+        )
+
+    def _stroke_coords(self, screen_point) -> QPointF:
+        """Sub-pixel image coordinates of a pen sample, clamped to the image."""
+        x = (screen_point.x() - self.offset.x()) / self.zoom
+        y = (screen_point.y() - self.offset.y()) / self.zoom
+        if self.source is None:
+            return QPointF(x, y)
+        return QPointF(
+            max(0.0, min(x, float(self.source.width))),
+            max(0.0, min(y, float(self.source.height))),
+        )
+
+    def _update_hover(self, screen_point):
+        hovered = None
+        if self.tool == Tool.ERASER:
+            hits = self.objects_at(self.image_coords(screen_point))
+            hovered = hits[-1] if hits else None
+
+        if hovered != self.hovered:
+            self.hovered = hovered
+            self.update()
+
+        if self.tool == Tool.VERTEX:
+            if self._vertex_drag is None:
+                self._update_vertex_hover(screen_point)
+        elif self._vertex_hit is not None:
+            self.update()
+            self._vertex_hit = None
 
+    @profiled("mouse")
     def mouseReleaseEvent(self, event):
-        if not self.image:
+        if not self.source:
+            return
+
+        if self._brush_label is not None:
+            self._brush_label = None
+            self._journal_paint()
+            self.drawing = False
+            self.objects_updated.emit()
+            self.update()
+            return
+
+        if self._vertex_drag is not None:
+            assert self._drag_bounds is not None
+            oid = self._vertex_drag.oid
+            self._vertex_drag = None
+            self.drawing = False
+            self._finish_reshape(oid, self._drag_bounds)
+            self.update()
             return
 
         if event.button() == Qt.MouseButton.LeftButton:
             self.drawing = False
+            self._panning = False
+
+            if self.tool == Tool.SEGMENT and self._segment_start is not None:
+                self._start_segment()
 
             if len(self.current_points) >= 3:
-                start = self.screen_coords(self.current_points[0])
+                start = self.screen_coords(
+                    QPointF(*self.current_points.array[0].tolist())
+                )
                 end = event.pos()
                 distance = math.hypot(end.x() - start.x(), end.y() - start.y())
 
                 if distance <= CLOSE_THRESHOLD:
-                    self.objects.append(self.current_points)
-                    self.objects_updated.emit()
-                    self.current_points = []
+                    ring = self.current_points.finish(closed=True)
+                    # simplifying a back-and-forth stroke can leave a line
+                    if len(ring) >= 3:
+                        self._add_object([ring])
+                        self.objects_updated.emit()
+                    self.current_points.clear()
 
             self.update()
 
+    def _start_segment(self):
+        """Segment inside the dragged box, or around the pressed point."""
+        source, start, box = self.source, self._segment_start, self._segment_box
+        self._segment_start = None
+        self._segment_box = None
+        self._segment_preview = None
+        if source is None:
+            return
+        if box is not None:
+            self.segmenter.start(
+                source, box=(box.left(), box.top(), box.right(), box.bottom())
+            )
+        elif start is not None:
+            self.segmenter.start(source, seed=(start.x(), start.y()), zoom=self.zoom)
+
+    def _on_segment_preview(self, ring: np.ndarray):
+        self._segment_preview = array_to_path(ring)
+        self.update()
+
+    def _on_segment_finished(self, ring: np.ndarray | None):
+        self._segment_preview = None
+        if ring is not None:
+            self._add_object([ring])
+            self.objects_updated.emit()
+        self.update()
+
     def image_coords(self, screen_point):
-        if not self.image:
+        if not self.source:
             return QPoint(0, 0)
 
         x = int((screen_point.x() - self.offset.x()) / self.zoom)
         y = int((screen_point.y() - self.offset.y()) / self.zoom)
 
         return QPoint(
-            max(0, min(x, self.image.width() - 1)),
-            max(0, min(y, self.image.height() - 1)),
+            max(0, min(x, self.source.width - 1)),
+            max(0, min(y, self.source.height - 1)),
         )
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        if self.image:
+        if self.source:
             self.fit_to_window()
 
     def set_tool_hand(self):
@@ -334,19 +1024,48 @@ class Canvas(QWidget):
     def set_tool_eraser(self):
         self.tool = Tool.ERASER
 
-    def save(self):
-        if not (self.image_path and self.image) or not self.objects:
-            return
+    def set_tool_vertex(self):
+        self.tool = Tool.VERTEX
+        self._ensure_outlines()
+
+    def set_tool_brush(self):
+        self.tool = Tool.BRUSH
+
+    def set_tool_segment(self):
+        self.tool = Tool.SEGMENT
+        self.segmenter.warm_up()
+
+    @property
+    def image_shape(self) -> tuple[int, int] | None:
+        """Shape of the label map for the current image."""
+        if not self.source:
+            return None
+        return self.source.height, self.source.width
+
+    def export_labels(self):
+        """Label map of the current objects, numbered ``1..N`` in object order.
 
-        labels = np.zeros((self.image.height(), self.image.width()), dtype=np.uint16)
+        The first call rasterizes all objects, later calls reuse the label map
+        maintained by object additions and removals.
+        """
+        shape = self.image_shape
+        if shape is None:
+            return None
+        if not LabelRaster.supports(self.objects):
+            return None
+        if self.raster is None:
+            self.raster = LabelRaster(self.objects, shape)
+        return self.raster.export()
+
+    def export_painted(self) -> np.ndarray | None:
+        """Copy of the painted label map, None if nothing was painted."""
+        if not self.painted:
+            return None
+        return self.painted.export()
 
-        for label_num, obj in enumerate(self.objects, start=1):
-            if len(obj) >= 3:
-                rows = [p.y() for p in obj]
-                cols = [p.x() for p in obj]
-                rr, cc = draw_polygon(rows, cols, labels.shape)
-                labels[rr, cc] = label_num
 
-        save_path = Path(self.image_path).with_suffix(".npy")
-        data = {"labels": labels}
-        np.save(save_path, np.array(data, dtype=object), allow_pickle=True)
+def _points_rect(points: np.ndarray, extra: tuple[float, float]) -> QRectF:
+    """Bounding rectangle of some vertices and one more point."""
+    corners = np.vstack((points, extra))
+    (x0, y0), (x1, y1) = corners.min(axis=0).tolist(), corners.max(axis=0).tolist()
+    return QRectF(QPointF(x0, y0), QPointF(x1, y1))
@@ -0,0 +1,76 @@
+from concurrent.futures import Executor
+
+import numpy as np
+
+from .profiling import profiled
+
+# label maps with fewer objects are traced in the calling process, sending
+# the crops to a pool costs more than it saves
+PARALLEL_MIN_OBJECTS = 2000
+# objects traced per task, keeps pickling and scheduling overhead low
+BATCH_SIZE = 512
+
+
+def _trace_batch(
+    batch: list[tuple[int, np.ndarray, int, int]],
+) -> list[tuple[int, list[np.ndarray]]]:
+    from skimage.measure import find_contours
+
+    results = []
+    for label, crop, row, col in batch:
+        mask = np.pad(crop == label, 1).astype(np.float32)
+        rings = []
+        for contour in find_contours(mask, 0.5):
+            if len(contour) < 3:
+                continue
+            # (row, col) in the padded crop -> (x, y) in the image
+            ring = np.empty_like(contour)
+            ring[:, 0] = contour[:, 1] + (col - 1)
+            ring[:, 1] = contour[:, 0] + (row - 1)
+            rings.append(ring)
+        if rings:
+            results.append((label, rings))
+    return results
+
+
+@profiled("contours")
+def trace_labels(
+    labels: np.ndarray, executor: Executor | None = None
+) -> list[tuple[int, list[np.ndarray]]]:
+    """Trace the outlines of every object in a label map.
+
+    Every label is traced on its own bounding-box crop, so the total cost
+    scales with the area of the objects instead of image area times object
+    count. All contours of an object are kept, which covers holes and
+    objects split into several parts.
+
+    Parameters
+    ----------
+    labels : np.ndarray
+        2D integer label map, 0 is background.
+    executor : Executor | None
+        Process pool the crops are traced on in batches once there are
+        :data:`PARALLEL_MIN_OBJECTS` of them, the calling process if ``None``.
+        Tracing holds the GIL, so a thread pool gains nothing.
+
+    Returns
+    -------
+    list[tuple[int, list[np.ndarray]]]
+        ``(label, rings)`` for each label in ascending order, every ring is an
+        ``(N, 2)`` array of ``(x, y)`` image coordinates.
+    """
+    # scipy and skimage take long to import, load them on first use
+    from scipy.ndimage import find_objects
+
+    jobs = []
+    for index, slices in enumerate(find_objects(labels)):
+        if slices is None:
+            continue
+        rows, cols = slices
+        jobs.append((index + 1, labels[slices], rows.start, cols.start))
+
+    if executor is None or len(jobs) < PARALLEL_MIN_OBJECTS:
+        return _trace_batch(jobs)
+
+    batches = [jobs[i : i + BATCH_SIZE] for i in range(0, len(jobs), BATCH_SIZE)]
+    return [result for batch in executor.map(_trace_batch, batches) for result in batch]
@@ -0,0 +1,160 @@
+import os
+from pathlib import Path
+
+from PySide6.QtCore import (
+    QAbstractListModel,
+    QModelIndex,
+    QPersistentModelIndex,
+    QSize,
+    Qt,
+    Signal,
+)
+from PySide6.QtGui import QColor, QPainter, QPixmap
+from PySide6.QtWidgets import QListView, QStyledItemDelegate
+
+from .annotations import IMAGE_SUFFIXES, labels_path
+from .thumbnails import ThumbnailCache
+
+ANNOTATED_ROLE = Qt.ItemDataRole.UserRole + 1
+# diameter of the marker drawn on annotated images
+MARKER_SIZE = 10
+MARKER_COLOR = QColor(0, 200, 0)
+# parent of the top-level rows, the default of model methods
+_ROOT = QModelIndex()
+
+
+def scan_folder(folder: str | Path) -> tuple[list[str], set[str]]:
+    """Images of a folder, sorted by name, and those with an annotation.
+
+    The folder is listed once, nothing is stat'ed per image, so this stays
+    fast for folders with tens of thousands of images.
+    """
+    names = os.listdir(folder)
+    stems = {name[:-4] for name in names if name.endswith(".npy")}
+    images = sorted(
+        (name for name in names if name.lower().endswith(IMAGE_SUFFIXES)),
+        key=str.lower,
+    )
+    # same stem as the label map, see annotations.labels_path
+    annotated = {
+        os.path.join(folder, name)
+        for name in images
+        if os.path.splitext(name)[0] in stems
+    }
+    return [os.path.join(folder, name) for name in images], annotated
+
+
+class SessionModel(QAbstractListModel):
+    """Images of a session with lazily loaded thumbnails."""
+
+    def __init__(self, thumbnails: ThumbnailCache, parent=None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+        self.thumbnails.thumbnail_ready.connect(self._on_thumbnail_ready)
+        self.paths: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._annotated: set[str] = set()
+        self._placeholder = QPixmap(thumbnails.size, thumbnails.size)
+        self._placeholder.fill(QColor(128, 128, 128, 60))
+
+    def set_paths(self, paths: list[str], annotated: set[str] | None = None):
+        """Replace the images, ``annotated`` is looked up on disk if None."""
+        self.beginResetModel()
+        self.thumbnails.clear_pending()
+        self.paths = list(paths)
+        self._rows = {path: row for row, path in enumerate(self.paths)}
+        if annotated is None:
+            annotated = {path for path in self.paths if labels_path(path).exists()}
+        self._annotated = annotated
+        self.endResetModel()
+
+    def set_annotated(self, path: str, annotated: bool = True):
+        row = self._rows.get(path)
+        if row is None:
+            return
+        if annotated:
+            self._annotated.add(path)
+        else:
+            self._annotated.discard(path)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [ANNOTATED_ROLE])
+
+    def rowCount(self, parent: QModelIndex | QPersistentModelIndex = _ROOT) -> int:
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(
+        self,
+        index: QModelIndex | QPersistentModelIndex,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ):
+        if not index.isValid():
+            return None
+        path = self.paths[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return os.path.basename(path)
+        if role == Qt.ItemDataRole.DecorationRole:
+            # only called for visible items, so only those get decoded
+            pixmap = self.thumbnails.get(path)
+            return pixmap if pixmap is not None else self._placeholder
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return path
+        if role == ANNOTATED_ROLE:
+            return path in self._annotated
+        return None
+
+    def _on_thumbnail_ready(self, path: str):
+        row = self._rows.get(path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class _ItemDelegate(QStyledItemDelegate):
+    def paint(self, painter, option, index):
+        super().paint(painter, option, index)
+        if not index.data(ANNOTATED_ROLE):
+            return
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(MARKER_COLOR)
+        rect = option.rect
+        painter.drawEllipse(
+            rect.right() - MARKER_SIZE - 4, rect.top() + 4, MARKER_SIZE, MARKER_SIZE
+        )
+        painter.restore()
+
+
+class Filmstrip(QListView):
+    """Horizontal strip of image thumbnails, annotated images are marked."""
+
+    image_selected = Signal(int)
+
+    def __init__(self, thumbnail_size: int, parent=None):
+        super().__init__(parent)
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setFlow(QListView.Flow.LeftToRight)
+        self.setWrapping(False)
+        self.setMovement(QListView.Movement.Static)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        # fixed item sizes and batched layout keep huge folders cheap to lay out
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(512)
+        self.setHorizontalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.setSelectionMode(QListView.SelectionMode.SingleSelection)
+        self.setTextElideMode(Qt.TextElideMode.ElideMiddle)
+        self.setIconSize(QSize(thumbnail_size, thumbnail_size))
+        self.setGridSize(QSize(thumbnail_size + 16, thumbnail_size + 28))
+        self.setItemDelegate(_ItemDelegate(self))
+        self.setFixedHeight(
+            self.gridSize().height()
+            + self.horizontalScrollBar().sizeHint().height()
+            + 6
+        )
+        self.clicked.connect(lambda index: self.image_selected.emit(index.row()))
+
+    def set_current(self, row: int):
+        index = self.model().index(row, 0)
+        self.setCurrentIndex(index)
+        self.scrollTo(index, QListView.ScrollHint.PositionAtCenter)
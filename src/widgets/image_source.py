@@ -0,0 +1,359 @@
+import math
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from PySide6.QtCore import QRect, Qt
+from PySide6.QtGui import QImage, QImageReader
+
+TIFF_SUFFIXES = (".tif", ".tiff")
+# decoded TIFF tiles and strips kept per image
+SEGMENT_CACHE_BYTES = 64 * 1024 * 1024
+# percentiles of the pixel values mapped to black and white
+WINDOW_PERCENTILES = (0.5, 99.5)
+# largest side of the overview the contrast window is picked from
+WINDOW_SAMPLE_SIZE = 512
+
+
+def contrast_window(
+    sample: np.ndarray, percentiles: tuple[float, float] = WINDOW_PERCENTILES
+) -> tuple[float, float]:
+    """Pixel values shown as black and white, from a sample of the image.
+
+    8-bit data is shown as is, anything else is stretched between two
+    percentiles of the sample.
+    """
+    if sample.dtype == np.uint8 or sample.size == 0:
+        return 0.0, 255.0
+    low, high = np.percentile(sample, percentiles).tolist()
+    if high <= low:
+        high = low + 1.0
+    return float(low), float(high)
+
+
+def window_lut(dtype: np.dtype, window: tuple[float, float]) -> np.ndarray | None:
+    """uint8 lookup table applying ``window`` to every value of a small integer type."""
+    dtype = np.dtype(dtype)
+    if dtype.kind not in "ui" or dtype.itemsize > 2:
+        return None
+    info = np.iinfo(dtype)
+    values = np.arange(info.min, info.max + 1, dtype=np.float32)
+    low, high = window
+    return np.clip((values - low) * (255.0 / (high - low)), 0, 255).astype(np.uint8)
+
+
+def apply_window(
+    array: np.ndarray, window: tuple[float, float], lut: np.ndarray | None = None
+) -> np.ndarray:
+    """Map raw pixel values to uint8 for display.
+
+    Parameters
+    ----------
+    array : np.ndarray
+        Raw pixels of any numeric type.
+    window : tuple[float, float]
+        Values shown as black and white.
+    lut : np.ndarray | None
+        Table from :func:`window_lut` for the type of ``array``, which
+        replaces the arithmetic by a single lookup.
+    """
+    if array.dtype == np.uint8 and window == (0.0, 255.0):
+        return array
+    if lut is not None:
+        if array.dtype.kind == "i":
+            array = array.astype(np.int64) - np.iinfo(array.dtype).min
+        return lut[array]
+    low, high = window
+    scaled = (array.astype(np.float32) - low) * (255.0 / (high - low))
+    return np.clip(scaled, 0, 255).astype(np.uint8)
+
+
+def to_qimage(array: np.ndarray) -> QImage:
+    """QImage owning a copy of a uint8 grayscale, RGB or RGBA array."""
+    array = np.ascontiguousarray(array)
+    height, width = array.shape[:2]
+    channels = 1 if array.ndim == 2 else array.shape[2]
+    if channels == 2:
+        # gray with alpha, the alpha is not shown
+        array = np.ascontiguousarray(array[..., 0])
+        channels = 1
+    formats = {
+        1: QImage.Format.Format_Grayscale8,
+        3: QImage.Format.Format_RGB888,
+        4: QImage.Format.Format_RGBA8888,
+    }
+    if channels not in formats:
+        array = np.ascontiguousarray(array[..., :3])
+        channels = 3
+    image = QImage(array.data, width, height, width * channels, formats[channels])
+    # the QImage only borrows the array
+    return image.copy()
+
+
+class ImageSource(ABC):
+    """Pixels of an image, read one region at a time.
+
+    Sources report their size up front and decode only the regions asked
+    for, subsampled by an integer step, so showing a zoomed out view of a
+    huge file never holds the full resolution in memory.
+    """
+
+    width = 0
+    height = 0
+    # in-memory image of sources Qt decoded as a whole, None otherwise
+    image: QImage | None = None
+
+    def __bool__(self) -> bool:
+        return self.width > 0 and self.height > 0
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the source."""
+        return 0
+
+    @abstractmethod
+    def read(self, x0: int, y0: int, x1: int, y1: int, step: int = 1) -> np.ndarray:
+        """Raw pixels of a region, every ``step``-th row and column."""
+
+    @abstractmethod
+    def region(self, x0: int, y0: int, x1: int, y1: int, step: int = 1) -> QImage:
+        """Region ready for display, see :meth:`read`."""
+
+    def overview(self, size: int) -> QImage:
+        """Whole image subsampled to at most ``size`` pixels per side."""
+        step = max(1, math.ceil(max(self.width, self.height) / size))
+        return self.region(0, 0, self.width, self.height, step)
+
+    def close(self):
+        """Release the file behind the source."""
+
+
+class QImageSource(ImageSource):
+    """Source over an image Qt decoded in full, for PNG, JPEG and BMP."""
+
+    def __init__(self, image: QImage):
+        self.image = self._image = image
+        self.width = image.width()
+        self.height = image.height()
+
+    @property
+    def nbytes(self) -> int:
+        return self._image.sizeInBytes()
+
+    def read(self, x0: int, y0: int, x1: int, y1: int, step: int = 1) -> np.ndarray:
+        region = self.region(x0, y0, x1, y1, step).convertToFormat(
+            QImage.Format.Format_RGBA8888
+        )
+        array = np.frombuffer(region.constBits(), np.uint8)
+        array = array.reshape(region.height(), region.bytesPerLine())
+        return array[:, : region.width() * 4].reshape(region.height(), -1, 4).copy()
+
+    def region(self, x0: int, y0: int, x1: int, y1: int, step: int = 1) -> QImage:
+        image = self._image.copy(QRect(x0, y0, x1 - x0, y1 - y0))
+        if step > 1:
+            image = image.scaled(
+                math.ceil((x1 - x0) / step), math.ceil((y1 - y0) / step)
+            )
+        return image
+
+
+class _TiffLevel:
+    """One resolution of a TIFF image, read by memory map or by segment."""
+
+    def __init__(self, page, lock: threading.Lock, cache_bytes: int):
+        self.page = page
+        _, _, self.height, self.width, self.samples = page.shaped
+        self._lock = lock
+        self._memmap = None
+        if page.is_memmappable:
+            self._memmap = page.asarray(out="memmap")
+        else:
+            # tiles, or strips the width of the image
+            self.chunk_height, self.chunk_width = page.chunks[:2]
+            self.columns = page.chunked[1] if page.is_tiled else 1
+            self._cache: OrderedDict[int, np.ndarray] = OrderedDict()
+            self._cache_bytes = 0
+            self.cache_bytes = cache_bytes
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self._memmap is not None else self._cache_bytes
+
+    def read(self, x0: int, y0: int, x1: int, y1: int, step: int) -> np.ndarray:
+        if self._memmap is not None:
+            return np.array(self._memmap[y0:y1:step, x0:x1:step])
+
+        rows = np.arange(y0, y1, step)
+        columns = np.arange(x0, x1, step)
+        shape = (len(rows), len(columns))
+        if self.samples > 1:
+            shape += (self.samples,)
+        out = np.zeros(shape, dtype=self.page.dtype)
+
+        for row in range(y0 // self.chunk_height, (y1 - 1) // self.chunk_height + 1):
+            top = row * self.chunk_height
+            inside_rows = (rows >= top) & (rows < top + self.chunk_height)
+            if not inside_rows.any():
+                continue
+            for column in range(
+                x0 // self.chunk_width, (x1 - 1) // self.chunk_width + 1
+            ):
+                left = column * self.chunk_width
+                inside_columns = (columns >= left) & (columns < left + self.chunk_width)
+                if not inside_columns.any():
+                    continue
+                segment = self._segment(row * self.columns + column)
+                out[np.ix_(inside_rows, inside_columns)] = segment[
+                    np.ix_(rows[inside_rows] - top, columns[inside_columns] - left)
+                ]
+        return out
+
+    def _segment(self, index: int) -> np.ndarray:
+        """Decoded tile or strip, ``(height, width[, samples])``."""
+        with self._lock:
+            segment = self._cache.get(index)
+            if segment is not None:
+                self._cache.move_to_end(index)
+                return segment
+            handle = self.page.parent.filehandle
+            handle.seek(self.page.dataoffsets[index])
+            data = handle.read(self.page.databytecounts[index])
+
+        decoded, _, _ = self.page.decode(data, index, jpegtables=self.page.jpegtables)
+        if decoded is None:
+            # empty segments of sparse files
+            decoded = np.zeros(self.page.chunks, dtype=self.page.dtype)
+        segment = decoded.reshape(decoded.shape[1:])
+        if self.samples == 1:
+            segment = segment[..., 0]
+
+        with self._lock:
+            self._cache[index] = segment
+            self._cache_bytes += segment.nbytes
+            while self._cache_bytes > self.cache_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= evicted.nbytes
+        return segment
+
+
+class TiffSource(ImageSource):
+    """Source reading regions of a TIFF without decoding the whole file.
+
+    Uncompressed images are memory mapped. Tiled and striped ones decode
+    only the segments a region touches, and pyramidal files (OME-TIFF,
+    SubIFDs) read subsampled regions from their reduced resolutions. Pixels
+    of any integer or float type are mapped to 8 bits through a contrast
+    window picked from an overview of the image.
+
+    Parameters
+    ----------
+    path : str | Path
+        TIFF file, only its first image is shown.
+    """
+
+    def __init__(self, path: str | Path, cache_bytes: int = SEGMENT_CACHE_BYTES):
+        import tifffile
+
+        self._tiff = tifffile.TiffFile(path)
+        series = self._tiff.series[0]
+        lock = threading.Lock()
+        self._levels = [
+            _TiffLevel(level.keyframe, lock, cache_bytes)
+            for level in series.levels
+            if level.keyframe.shaped[:2] == (1, 1)
+        ]
+        if not self._levels:
+            self._tiff.close()
+            raise ValueError(f"unsupported TIFF layout {series.axes} in {path}")
+
+        self.width = self._levels[0].width
+        self.height = self._levels[0].height
+        self.dtype = self._levels[0].page.dtype
+
+        # power of two subsampling, the same as the top of an image pyramid,
+        # kept because it is the costliest region of a file without levels
+        self._overview_step = 1
+        size = max(self.width, self.height)
+        while size > WINDOW_SAMPLE_SIZE:
+            size = (size + 1) // 2
+            self._overview_step *= 2
+        self._overview: np.ndarray | None = None
+        self._overview = self.read(0, 0, self.width, self.height, self._overview_step)
+        self.window = contrast_window(self._overview)
+        self._lut = window_lut(self.dtype, self.window)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self._levels)
+
+    def read(self, x0: int, y0: int, x1: int, y1: int, step: int = 1) -> np.ndarray:
+        whole = (x0, y0, x1, y1) == (0, 0, self.width, self.height)
+        if whole and step == self._overview_step and self._overview is not None:
+            return self._overview
+        # the coarsest stored resolution that still has every requested pixel,
+        # which pyramid tiles always line up with
+        level = self._levels[0]
+        factor = 1
+        for candidate in self._levels[1:]:
+            candidate_factor = self.width // candidate.width
+            if candidate_factor > step or step % candidate_factor:
+                break
+            if x0 % candidate_factor or y0 % candidate_factor:
+                break
+            level, factor = candidate, candidate_factor
+        return level.read(
+            x0 // factor,
+            y0 // factor,
+            min(math.ceil(x1 / factor), level.width),
+            min(math.ceil(y1 / factor), level.height),
+            step // factor,
+        )
+
+    def region(self, x0: int, y0: int, x1: int, y1: int, step: int = 1) -> QImage:
+        pixels = self.read(x0, y0, x1, y1, step)
+        return to_qimage(apply_window(pixels, self.window, self._lut))
+
+    def overview(self, size: int) -> QImage:
+        if size > WINDOW_SAMPLE_SIZE or self._overview is None:
+            return super().overview(size)
+        # scaled from the overview read on opening
+        image = to_qimage(apply_window(self._overview, self.window, self._lut))
+        return image.scaled(
+            size,
+            size,
+            Qt.AspectRatioMode.KeepAspectRatio,
+            Qt.TransformationMode.SmoothTransformation,
+        )
+
+    def close(self):
+        self._tiff.close()
+
+
+def open_image_source(path: str | Path) -> ImageSource:
+    """Source for an image file, TIFFs are read by region."""
+    if str(path).lower().endswith(TIFF_SUFFIXES):
+        try:
+            return TiffSource(path)
+        # a file without any image series raises IndexError
+        except (OSError, ValueError, IndexError) as e:
+            print(f"Error reading TIFF {path}, decoding it in full: {e}")
+    return QImageSource(QImage(str(path)))
+
+
+def image_size(path: str | Path) -> tuple[int, int] | None:
+    """``(width, height)`` of an image file without decoding its pixels."""
+    if str(path).lower().endswith(TIFF_SUFFIXES):
+        try:
+            import tifffile
+
+            with tifffile.TiffFile(path) as tiff:
+                _, _, height, width, _ = tiff.series[0].levels[0].keyframe.shaped
+            return width, height
+        except (OSError, ValueError, IndexError) as e:
+            print(f"Error reading TIFF {path}: {e}")
+    size = QImageReader(str(path)).size()
+    if not size.isValid():
+        return None
+    return size.width(), size.height()
@@ -0,0 +1,241 @@
+import os
+import struct
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+
+from .annotations import atomic_write, load_journal_seq
+from .polygons import VERTEX_DTYPE, PolygonStore
+
+JOURNAL_SUFFIX = ".journal"
+_MAGIC = b"MRKJ"
+# version 2 added OP_REPLACE, version 3 OP_PAINT
+_VERSION = 3
+_HEADER = struct.Struct("<4sI")
+# payload length, crc32 of everything after it, sequence number, operation
+_RECORD = struct.Struct("<IIQB")
+_COUNTS = struct.Struct("<II")
+_RANK = struct.Struct("<I")
+# x0, y0, x1, y1 of a painted region
+_RECT = struct.Struct("<IIII")
+
+OP_ADD = 1
+OP_ERASE = 2
+OP_REPLACE = 3
+OP_PAINT = 4
+
+
+def journal_path(image_path: str | Path) -> Path:
+    """Edit journal stored next to the image."""
+    return Path(image_path).with_suffix(JOURNAL_SUFFIX)
+
+
+def _read_records(path: Path) -> Iterator[tuple[int, int, bytes, bytes]]:
+    """``(seq, op, payload, raw)`` of each record up to the first broken one."""
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return
+    if len(data) < _HEADER.size:
+        return
+    magic, version = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version > _VERSION:
+        return
+
+    pos = _HEADER.size
+    while pos + _RECORD.size <= len(data):
+        length, crc, seq, op = _RECORD.unpack_from(data, pos)
+        end = pos + _RECORD.size + length
+        # a crash while appending leaves a truncated last record
+        if end > len(data) or zlib.crc32(data[pos + 8 : end]) != crc:
+            return
+        yield seq, op, data[pos + _RECORD.size : end], data[pos:end]
+        pos = end
+
+
+def _pack_rings(vertices: np.ndarray, ring_ends: np.ndarray) -> bytes:
+    vertices = np.ascontiguousarray(vertices, dtype=VERTEX_DTYPE)
+    ring_ends = np.ascontiguousarray(ring_ends, dtype=np.int32)
+    return (
+        _COUNTS.pack(len(ring_ends), len(vertices))
+        + ring_ends.tobytes()
+        + vertices.tobytes()
+    )
+
+
+def _unpack_rings(payload: bytes, offset: int = 0) -> list[np.ndarray]:
+    ring_count, vertex_count = _COUNTS.unpack_from(payload, offset)
+    offset += _COUNTS.size
+    ring_ends = np.frombuffer(payload, np.int32, ring_count, offset)
+    offset += ring_ends.nbytes
+    vertices = np.frombuffer(payload, VERTEX_DTYPE, vertex_count * 2, offset).reshape(
+        -1, 2
+    )
+    starts = np.concatenate(([0], ring_ends[:-1]))
+    return [vertices[s:e] for s, e in zip(starts.tolist(), ring_ends.tolist())]
+
+
+class Journal:
+    """Append-only log of the objects added and erased on one image.
+
+    Every edit is appended as a small checksummed record, so making it
+    durable costs the size of the edit and not of the image. Records carry
+    increasing sequence numbers and saved annotations remember the last one
+    they include; :meth:`replay` applies the newer ones on top of the saved
+    objects and :meth:`compact` drops the older ones after a save.
+
+    Erased and reshaped objects are recorded by their rank among the live
+    objects, which stays valid when a store is copied or reloaded in the
+    same order. Brush edits are recorded as the compressed labels of the
+    region they changed and replayed by :meth:`replay_painted`.
+
+    Parameters
+    ----------
+    image_path : str | Path
+        Image the journal belongs to.
+    """
+
+    def __init__(self, image_path: str | Path):
+        self.image_path = Path(image_path)
+        self.path = journal_path(image_path)
+        self._fd: int | None = None
+
+        self.saved_seq = load_journal_seq(image_path)
+        self.seq = self.saved_seq
+        # end of the last intact record, anything after it is cut off on append
+        self._valid_size = 0
+        for seq, _, _, raw in _read_records(self.path):
+            self.seq = max(self.seq, seq)
+            self._valid_size = self._valid_size or _HEADER.size
+            self._valid_size += len(raw)
+
+    @property
+    def pending(self) -> bool:
+        """Whether the journal holds edits newer than the saved annotation."""
+        return self.seq > self.saved_seq
+
+    def append_add(self, vertices: np.ndarray, ring_ends: np.ndarray):
+        self._append(OP_ADD, _pack_rings(vertices, ring_ends))
+
+    def append_erase(self, rank: int):
+        self._append(OP_ERASE, _RANK.pack(rank))
+
+    def append_replace(self, rank: int, vertices: np.ndarray, ring_ends: np.ndarray):
+        self._append(OP_REPLACE, _RANK.pack(rank) + _pack_rings(vertices, ring_ends))
+
+    def append_paint(self, rect: tuple[int, int, int, int], labels: np.ndarray):
+        """Record the painted labels of ``rect``, ``labels`` is that region."""
+        pixels = np.ascontiguousarray(labels, dtype="<u2").tobytes()
+        self._append(OP_PAINT, _RECT.pack(*rect) + zlib.compress(pixels, 1))
+
+    def replay(self, objects: PolygonStore) -> int:
+        """Apply edits newer than the saved annotation to ``objects``.
+
+        Returns
+        -------
+        int
+            Number of edits applied.
+        """
+        applied = 0
+        for seq, op, payload in self._pending_records():
+            if op == OP_ADD:
+                objects.append(_unpack_rings(payload))
+            elif op in (OP_ERASE, OP_REPLACE):
+                (rank,) = _RANK.unpack_from(payload)
+                ids = objects.ids()
+                if rank >= len(ids):
+                    print(f"Journal {self.path} does not match its annotation at {seq}")
+                    break
+                if op == OP_ERASE:
+                    objects.remove(int(ids[rank]))
+                else:
+                    objects.replace(int(ids[rank]), _unpack_rings(payload, _RANK.size))
+            else:
+                continue
+            applied += 1
+        return applied
+
+    def replay_painted(
+        self, labels: np.ndarray | None, shape: tuple[int, int]
+    ) -> np.ndarray | None:
+        """Apply brush edits newer than the saved annotation to a painted map.
+
+        Parameters
+        ----------
+        labels : np.ndarray | None
+            Saved painted label map, a new one of ``shape`` is created if None.
+        shape : tuple[int, int]
+            ``(height, width)`` of the image.
+
+        Returns
+        -------
+        np.ndarray | None
+            The edited label map, None if no brush edit was journaled.
+        """
+        edited = None
+        for seq, op, payload in self._pending_records():
+            if op != OP_PAINT:
+                continue
+            x0, y0, x1, y1 = _RECT.unpack_from(payload)
+            if x1 > shape[1] or y1 > shape[0]:
+                print(f"Journal {self.path} does not match its image at {seq}")
+                break
+            if edited is None:
+                edited = np.zeros(shape, dtype=np.uint16) if labels is None else labels
+            region = np.frombuffer(zlib.decompress(payload[_RECT.size :]), "<u2")
+            edited[y0:y1, x0:x1] = region.reshape(y1 - y0, x1 - x0)
+        return edited
+
+    def compact(self):
+        """Drop edits already written to the annotation, after a save finished."""
+        self.saved_seq = load_journal_seq(self.image_path)
+        self.close()
+        kept = [
+            raw for seq, _, _, raw in _read_records(self.path) if seq > self.saved_seq
+        ]
+        try:
+            if not kept:
+                self.path.unlink(missing_ok=True)
+                self._valid_size = 0
+                return
+            with atomic_write(self.path) as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION))
+                f.write(b"".join(kept))
+            self._valid_size = _HEADER.size + sum(len(raw) for raw in kept)
+        except OSError as e:
+            print(f"Error compacting journal {self.path}: {e}")
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _pending_records(self) -> Iterator[tuple[int, int, bytes]]:
+        for seq, op, payload, _ in _read_records(self.path):
+            if seq > self.saved_seq:
+                yield seq, op, payload
+
+    def _append(self, op: int, payload: bytes):
+        self.seq += 1
+        body = _RECORD.pack(0, 0, self.seq, op)[8:] + payload
+        record = _RECORD.pack(len(payload), zlib.crc32(body), self.seq, op) + payload
+        try:
+            fd = self._open() if self._fd is None else self._fd
+            # one write per record, a crash can only cut off the last one
+            os.write(fd, record)
+            self._valid_size += len(record)
+        except OSError as e:
+            print(f"Error writing journal {self.path}: {e}")
+
+    def _open(self) -> int:
+        fd = self._fd = os.open(
+            self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+        )
+        if os.fstat(fd).st_size != self._valid_size:
+            os.ftruncate(fd, self._valid_size)
+        if self._valid_size == 0:
+            os.write(fd, _HEADER.pack(_MAGIC, _VERSION))
+            self._valid_size = _HEADER.size
+        return fd
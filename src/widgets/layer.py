@@ -0,0 +1,303 @@
+import math
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+
+from PySide6.QtCore import QObject, QPointF, QRectF, QSizeF, QTimer, Signal
+from PySide6.QtGui import QColor, QPainter, QPixmap, QRegion
+
+# edge of a layer tile in device pixels
+LAYER_TILE_SIZE = 256
+LAYER_CACHE_BYTES = 128 * 1024 * 1024
+# milliseconds without a new zoom before tiles are rendered in full quality
+IDLE_DELAY_MS = 60
+# milliseconds of tile rendering per event loop turn while idle
+IDLE_RENDER_BUDGET_MS = 8
+
+# draws the layer as seen from ``origin`` into a ``width`` x ``height``
+# logical area, in smooth or fast quality
+Renderer = Callable[[QPainter, QPointF, float, float, bool], None]
+
+
+class TiledLayer(QObject):
+    """Rendered view content cut into tiles cached for the current zoom.
+
+    The layer lives in zoomed image coordinates, so panning only moves where
+    cached tiles are blitted. Changing the zoom keeps the previous tiles as a
+    preview: missing tiles are first drawn by scaling what it has of them,
+    which is fast but coarse, and rendered properly once the zoom stops
+    changing. Without a preview, e.g. after an edit, missing tiles are
+    rendered right away.
+
+    Parameters
+    ----------
+    render : Renderer
+        Callback drawing the layer content.
+    background : QColor
+        Colour around the image.
+    cache_bytes : int
+        Memory of the tiles kept for the current zoom.
+    """
+
+    # tiles were rendered in the background, the widget should repaint
+    updated = Signal()
+
+    def __init__(
+        self,
+        render: Renderer,
+        background: QColor,
+        cache_bytes: int = LAYER_CACHE_BYTES,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self._render = render
+        self.background = background
+        self.max_tiles = max(1, cache_bytes // (LAYER_TILE_SIZE * LAYER_TILE_SIZE * 4))
+        self._tiles: OrderedDict[tuple[int, int], QPixmap] = OrderedDict()
+        # tiles still shown but due to be rendered again
+        self._stale: set[tuple[int, int]] = set()
+        self._key: tuple[float, float] | None = None
+        # zoom and tiles of an earlier zoom, scaled to fill in missing tiles
+        self._preview: tuple[float, dict[tuple[int, int], QPixmap]] | None = None
+        # whether every visible tile was up to date at the last paint
+        self._complete = False
+        self._queue: list[tuple[int, int]] = []
+        self._offset = QPointF()
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._render_queued)
+
+    @property
+    def pending(self) -> bool:
+        """Whether visible tiles are waiting to be rendered in full quality."""
+        return bool(self._queue)
+
+    def clear(self):
+        """Drop all tiles and the preview, e.g. for a new image."""
+        self._tiles.clear()
+        self._stale.clear()
+        self._preview = None
+        self._queue.clear()
+        self._timer.stop()
+
+    def invalidate(self, rect: QRectF | None = None):
+        """Render tiles again on the next paint, before they are shown.
+
+        Parameters
+        ----------
+        rect : QRectF | None
+            Changed area in image coordinates, everything if ``None``.
+        """
+        # the preview shows the old content and must not fill in for them
+        self._preview = None
+        if rect is None or self._key is None:
+            self._tiles.clear()
+            self._stale.clear()
+            return
+        for tile in self._tiles_in(self._layer_rect(rect)):
+            self._tiles.pop(tile, None)
+            self._stale.discard(tile)
+
+    def refresh(self, rect: QRectF | None = None):
+        """Render tiles again when idle, showing the current ones meanwhile.
+
+        Parameters
+        ----------
+        rect : QRectF | None
+            Changed area in image coordinates, everything if ``None``.
+        """
+        if rect is None or self._key is None:
+            self._stale.update(self._tiles)
+            return
+        self._stale.update(
+            tile
+            for tile in self._tiles_in(self._layer_rect(rect))
+            if tile in self._tiles
+        )
+
+    def paint(
+        self,
+        painter: QPainter,
+        rect: QRectF,
+        zoom: float,
+        offset: QPointF,
+        dpr: float,
+        extent: QSizeF,
+        fast: bool = False,
+    ):
+        """Draw the part of the layer under a widget rectangle.
+
+        Parameters
+        ----------
+        painter : QPainter
+            Painter of the widget.
+        rect : QRectF
+            Damaged widget area.
+        zoom, offset
+            View transform from image to widget coordinates.
+        dpr : float
+            Device pixel ratio of the widget.
+        extent : QSizeF
+            Size of the zoomed image, no tiles exist beyond it.
+        fast : bool
+            Render missing tiles in fast quality and again when idle.
+        """
+        key = (zoom, dpr)
+        if key != self._key:
+            self._switch(key)
+        self._offset = offset
+
+        area = rect.translated(-offset).intersected(QRectF(QPointF(0, 0), extent))
+        missing = []
+        self._queue = []
+        for tile in self._tiles_in(area):
+            if tile in self._tiles:
+                self._tiles.move_to_end(tile)
+                if tile in self._stale:
+                    self._queue.append(tile)
+            elif self._preview is not None:
+                missing.append(tile)
+                self._queue.append(tile)
+            else:
+                self._store(tile, self._render_tile(tile, fast))
+                if fast:
+                    self._stale.add(tile)
+                    self._queue.append(tile)
+        self._complete = not self._queue
+
+        if missing:
+            self._paint_preview(painter, missing, area)
+
+        size = self._tile_size
+        for tile in self._tiles_in(area):
+            pixmap = self._tiles.get(tile)
+            if pixmap is not None:
+                painter.drawPixmap(
+                    QPointF(offset.x() + tile[0] * size, offset.y() + tile[1] * size),
+                    pixmap,
+                )
+
+        if self._queue and not self._timer.isActive():
+            self._timer.start(IDLE_DELAY_MS if missing or fast else 0)
+
+    @property
+    def _tile_size(self) -> float:
+        """Edge of a tile in logical pixels."""
+        assert self._key is not None
+        return LAYER_TILE_SIZE / self._key[1]
+
+    def _switch(self, key: tuple[float, float]):
+        """Start a new tile set for another zoom or pixel ratio."""
+        if self._key is None or key[1] != self._key[1]:
+            self._preview = None
+        elif self._tiles and (self._complete or self._preview is None):
+            # zooming quickly keeps the last zoom that was fully rendered
+            self._preview = (self._key[0], dict(self._tiles))
+        self._key = key
+        self._tiles = OrderedDict()
+        self._stale.clear()
+        self._queue.clear()
+        self._complete = False
+        self._timer.stop()
+
+    def _layer_rect(self, image_rect: QRectF) -> QRectF:
+        assert self._key is not None
+        zoom = self._key[0]
+        # outlines are drawn with a pen a couple of pixels wide
+        return QRectF(
+            image_rect.x() * zoom,
+            image_rect.y() * zoom,
+            image_rect.width() * zoom,
+            image_rect.height() * zoom,
+        ).adjusted(-2, -2, 2, 2)
+
+    def _tiles_in(self, area: QRectF) -> list[tuple[int, int]]:
+        """Tiles intersecting a rectangle in layer coordinates."""
+        if area.isEmpty():
+            return []
+        size = self._tile_size
+        tx0 = max(0, math.floor(area.left() / size))
+        ty0 = max(0, math.floor(area.top() / size))
+        tx1 = math.ceil(area.right() / size)
+        ty1 = math.ceil(area.bottom() / size)
+        return [(tx, ty) for ty in range(ty0, ty1) for tx in range(tx0, tx1)]
+
+    def _tile_rect(self, tile: tuple[int, int]) -> QRectF:
+        size = self._tile_size
+        return QRectF(tile[0] * size, tile[1] * size, size, size)
+
+    def _preview_area(self, rect: QRectF) -> QRectF:
+        """Layer rectangle in the coordinates of the preview."""
+        assert self._key is not None and self._preview is not None
+        scale = self._preview[0] / self._key[0]
+        return QRectF(
+            rect.x() * scale,
+            rect.y() * scale,
+            rect.width() * scale,
+            rect.height() * scale,
+        )
+
+    def _paint_preview(
+        self, painter: QPainter, missing: list[tuple[int, int]], area: QRectF
+    ):
+        """Fill the visible part of missing tiles with the previous zoom, scaled."""
+        assert self._key is not None and self._preview is not None
+        preview_zoom, tiles = self._preview
+        region = QRegion()
+        needed = set()
+        for tile in missing:
+            rect = self._tile_rect(tile).intersected(area)
+            region += rect.translated(self._offset).toAlignedRect()
+            needed.update(
+                t for t in self._tiles_in(self._preview_area(rect)) if t in tiles
+            )
+
+        scale = self._key[0] / preview_zoom
+        size = self._tile_size
+        painter.save()
+        painter.setClipRegion(region)
+        painter.translate(self._offset)
+        painter.scale(scale, scale)
+        for tile in needed:
+            painter.drawPixmap(QPointF(tile[0] * size, tile[1] * size), tiles[tile])
+        painter.restore()
+
+    def _render_tile(self, tile: tuple[int, int], fast: bool) -> QPixmap:
+        assert self._key is not None
+        dpr = self._key[1]
+        pixmap = QPixmap(LAYER_TILE_SIZE, LAYER_TILE_SIZE)
+        pixmap.setDevicePixelRatio(dpr)
+        pixmap.fill(self.background)
+        size = self._tile_size
+        painter = QPainter(pixmap)
+        self._render(
+            painter, QPointF(tile[0] * size, tile[1] * size), size, size, not fast
+        )
+        painter.end()
+        return pixmap
+
+    def _store(self, tile: tuple[int, int], pixmap: QPixmap):
+        self._tiles[tile] = pixmap
+        self._tiles.move_to_end(tile)
+        while len(self._tiles) > self.max_tiles:
+            old, _ = self._tiles.popitem(last=False)
+            self._stale.discard(old)
+
+    def _render_queued(self):
+        """Render queued tiles in full quality for a slice of time."""
+        deadline = time.perf_counter() + IDLE_RENDER_BUDGET_MS / 1000
+        rendered = False
+        while self._queue and time.perf_counter() < deadline:
+            tile = self._queue.pop(0)
+            self._store(tile, self._render_tile(tile, fast=False))
+            self._stale.discard(tile)
+            rendered = True
+
+        if not self._queue:
+            # all visible tiles are in full quality, the preview is obsolete
+            self._preview = None
+        else:
+            self._timer.start(0)
+        if rendered:
+            self.updated.emit()
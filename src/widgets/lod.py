@@ -0,0 +1,311 @@
+import math
+
+import numpy as np
+from PySide6.QtGui import QImage, QPainterPath
+
+from .paths import array_to_path
+from .polygons import PolygonStore, concat_ranges
+
+# objects smaller than this many screen pixels are drawn as filled rectangles
+SMALL_OBJECT_PX = 4
+
+
+def lod_band(zoom: float) -> int:
+    """Detail band of a zoom level, 0 is full detail.
+
+    Band ``k`` covers zooms in ``[2**-k, 2**-(k - 1))`` and snaps outlines to
+    cells of ``2**k`` image pixels, one to two screen pixels wide.
+    """
+    if zoom >= 1.0:
+        return 0
+    return math.ceil(math.log2(1.0 / zoom))
+
+
+class _Band:
+    """Outlines of objects simplified for one detail band.
+
+    Vertices are snapped to the centres of a grid of ``cell`` image pixels,
+    runs in the same cell are merged and vertices on a straight line between
+    their neighbours are dropped. Rings left with fewer than three vertices
+    disappear and objects without rings are drawn as small objects.
+    """
+
+    def __init__(
+        self,
+        cell: float,
+        vertices: np.ndarray,
+        ring_lengths: np.ndarray,
+        vcount: np.ndarray,
+        rcount: np.ndarray,
+    ):
+        self.cell = cell
+        self.vertices = vertices
+        self.ring_lengths = ring_lengths
+        self.vcount = vcount
+        self.rcount = rcount
+        self.vstart = np.cumsum(vcount) - vcount
+        self.rstart = np.cumsum(rcount) - rcount
+
+    @classmethod
+    def build(cls, objects: PolygonStore, ids: np.ndarray, cell: float) -> "_Band":
+        vertices, ring_ends, vcount, rcount = objects.pack(ids)
+        object_starts = np.cumsum(vcount) - vcount
+        ring_lengths = np.diff(ring_ends + np.repeat(object_starts, rcount), prepend=0)
+        owner = np.repeat(np.arange(len(ids)), rcount)
+
+        cells = np.floor(vertices / cell).astype(np.int64)
+        rings = np.repeat(np.arange(len(ring_lengths)), ring_lengths)
+        # merge runs of vertices in the same cell
+        keep = np.ones(len(cells), dtype=bool)
+        keep[1:] = (cells[1:] != cells[:-1]).any(axis=1) | (rings[1:] != rings[:-1])
+        cells, rings = cells[keep], rings[keep]
+        ring_lengths = np.bincount(rings, minlength=len(ring_lengths))
+
+        # drop vertices where the outline goes straight on, neighbours wrap
+        # around within their ring
+        starts = np.cumsum(ring_lengths) - ring_lengths
+        position = np.arange(len(cells)) - starts[rings]
+        length = ring_lengths[rings]
+        before = cells - cells[starts[rings] + (position - 1) % length]
+        after = cells[starts[rings] + (position + 1) % length] - cells
+        cross = before[:, 0] * after[:, 1] - before[:, 1] * after[:, 0]
+        keep = (cross != 0) | ((before * after).sum(axis=1) < 0)
+        cells, rings = cells[keep], rings[keep]
+        ring_lengths = np.bincount(rings, minlength=len(ring_lengths))
+
+        ring_ok = ring_lengths >= 3
+        return cls(
+            cell,
+            ((cells[ring_ok[rings]] + 0.5) * cell).astype(np.float32),
+            ring_lengths[ring_ok],
+            np.bincount(
+                owner, weights=ring_lengths * ring_ok, minlength=len(ids)
+            ).astype(np.int64),
+            np.bincount(owner[ring_ok], minlength=len(ids)),
+        )
+
+    def select(self, mask: np.ndarray) -> "_Band":
+        """Band of the objects where ``mask`` is true."""
+        return _Band(
+            self.cell,
+            self.vertices[np.repeat(mask, self.vcount)],
+            self.ring_lengths[np.repeat(mask, self.rcount)],
+            self.vcount[mask],
+            self.rcount[mask],
+        )
+
+    def take(self, order: np.ndarray) -> "_Band":
+        """Band of the objects at the indices ``order``, in that order."""
+        return _Band(
+            self.cell,
+            self.vertices[concat_ranges(self.vstart[order], self.vcount[order])],
+            self.ring_lengths[concat_ranges(self.rstart[order], self.rcount[order])],
+            self.vcount[order],
+            self.rcount[order],
+        )
+
+    def extend(self, other: "_Band") -> "_Band":
+        """Band of these objects followed by those of ``other``."""
+        return _Band(
+            self.cell,
+            np.concatenate((self.vertices, other.vertices)),
+            np.concatenate((self.ring_lengths, other.ring_lengths)),
+            np.concatenate((self.vcount, other.vcount)),
+            np.concatenate((self.rcount, other.rcount)),
+        )
+
+    def path(self, selection: np.ndarray) -> QPainterPath:
+        """One path holding the outlines of the selected objects."""
+        points = self.vertices[
+            concat_ranges(self.vstart[selection], self.vcount[selection])
+        ]
+        rings = concat_ranges(self.rstart[selection], self.rcount[selection])
+        return array_to_path(points, np.cumsum(self.ring_lengths[rings]))
+
+
+class LevelOfDetail:
+    """Decides how every object is drawn at the current view.
+
+    Objects outside the view are culled and those only a few pixels wide are
+    drawn as rectangles into one image, both with array operations over all
+    bounding boxes. When zoomed out, outlines come from simplified vertex
+    sets built once per detail band and are drawn as one path per colour.
+    Bands are built lazily and follow edits incrementally, objects whose
+    vertices changed have to be reported with :meth:`changed`.
+    """
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self._bounds = np.empty((0, 4))
+        self._objects: PolygonStore | None = None
+        self._key = None
+        self._bands: dict[int, _Band] = {}
+        # objects reshaped since the last update
+        self._changed: set[int] = set()
+        self._small_buffer = np.empty((0, 0), dtype=np.uint32)
+        # band, selection and result of the last band_paths call
+        self._last_paths: (
+            tuple[int, np.ndarray, tuple[list[tuple[int, QPainterPath]], np.ndarray]]
+            | None
+        ) = None
+
+    def changed(self, oid: int):
+        """Rebuild the outlines of an object whose vertices changed on next update."""
+        self._changed.add(oid)
+
+    def update(self, objects: PolygonStore, revision: int):
+        key = (id(objects), revision)
+        if key == self._key:
+            return
+        self._key = key
+        ids = objects.ids()
+        if objects is self._objects and len(self.ids) and len(ids):
+            # ids only grow, so built bands keep the surviving objects and get
+            # the new ones appended; reshaped objects are built again in place
+            old = np.searchsorted(ids, self.ids[-1], side="right")
+            survivors = np.isin(self.ids, ids[:old], assume_unique=True)
+            added = ids[old:]
+            reshaped = np.empty(0, dtype=np.int64)
+            if self._changed:
+                changed = np.fromiter(self._changed, dtype=np.int64)
+                reshaped = np.flatnonzero(np.isin(ids[:old], changed))
+            for band, simplified in self._bands.items():
+                simplified = simplified.select(survivors).extend(
+                    _Band.build(objects, added, simplified.cell)
+                )
+                if len(reshaped):
+                    order = np.arange(len(ids))
+                    order[reshaped] = len(ids) + np.arange(len(reshaped))
+                    simplified = simplified.extend(
+                        _Band.build(objects, ids[reshaped], simplified.cell)
+                    ).take(order)
+                self._bands[band] = simplified
+        else:
+            self._bands.clear()
+        self._changed.clear()
+        self._objects = objects
+        self._last_paths = None
+        self.ids = ids
+        self._bounds = objects.bounds_array(ids).astype(np.float64)
+
+    def visible(self, view, zoom: float) -> tuple[np.ndarray, np.ndarray]:
+        """Indices into :attr:`ids` of visible objects, split into large and small.
+
+        Parameters
+        ----------
+        view : tuple
+            ``(xmin, ymin, xmax, ymax)`` of the view in image coordinates.
+        zoom : float
+            Screen pixels per image pixel.
+        """
+        xmin, ymin, xmax, ymax = view
+        b = self._bounds
+        inside = (
+            (b[:, 0] <= xmax)
+            & (b[:, 2] >= xmin)
+            & (b[:, 1] <= ymax)
+            & (b[:, 3] >= ymin)
+        )
+        size = np.maximum(b[:, 2] - b[:, 0], b[:, 3] - b[:, 1]) * zoom
+        small = inside & (size < SMALL_OBJECT_PX)
+        return np.flatnonzero(inside & ~small), np.flatnonzero(small)
+
+    def band_paths(
+        self, band: int, selection: np.ndarray, colors: int
+    ) -> tuple[list[tuple[int, QPainterPath]], np.ndarray]:
+        """Simplified outlines of the selected objects, one path per colour.
+
+        Returns
+        -------
+        tuple[list[tuple[int, QPainterPath]], np.ndarray]
+            ``(colour index, path)`` pairs and the selected objects that
+            collapsed entirely at this band, to be drawn as small objects.
+        """
+        if self._last_paths is not None:
+            cached_band, cached_selection, result = self._last_paths
+            if cached_band == band and np.array_equal(cached_selection, selection):
+                return result
+
+        simplified = self._bands.get(band)
+        if simplified is None:
+            assert self._objects is not None, "update() has not been called"
+            simplified = _Band.build(self._objects, self.ids, 2.0**band)
+            self._bands[band] = simplified
+
+        collapsed = simplified.rcount[selection] == 0
+        drawn = selection[~collapsed]
+        paths = []
+        drawn_colors = self.ids[drawn] % colors
+        for color in range(colors):
+            group = drawn[drawn_colors == color]
+            if len(group):
+                paths.append((color, simplified.path(group)))
+        result = paths, selection[collapsed]
+        # panning with everything in view selects the same objects again
+        self._last_paths = band, selection, result
+        return result
+
+    def small_image(
+        self,
+        selection: np.ndarray,
+        palette: np.ndarray,
+        zoom: float,
+        offset: tuple[float, float],
+        size: tuple[int, int],
+        dpr: float,
+    ) -> QImage:
+        """Transparent image with the selected objects as filled rectangles.
+
+        The image shares its memory with the next call and has to be drawn
+        before then.
+
+        Parameters
+        ----------
+        selection : np.ndarray
+            Indices into :attr:`ids`.
+        palette : np.ndarray
+            ``(C, 3)`` RGB colours, object id ``i`` gets ``palette[i % C]``.
+        zoom, offset
+            View transform from image to widget coordinates.
+        size : tuple[int, int]
+            ``(width, height)`` of the image in device pixels.
+        dpr : float
+            Device pixel ratio of the target.
+        """
+        width, height = size
+        if self._small_buffer.shape != (height, width):
+            self._small_buffer = np.zeros((height, width), dtype=np.uint32)
+        buffer = self._small_buffer
+        buffer.fill(0)
+        b = self._bounds[selection]
+        scale = zoom * dpr
+        x0 = np.floor(b[:, 0] * scale + offset[0] * dpr).astype(np.int64)
+        y0 = np.floor(b[:, 1] * scale + offset[1] * dpr).astype(np.int64)
+        x1 = np.maximum(
+            np.ceil(b[:, 2] * scale + offset[0] * dpr).astype(np.int64), x0 + 1
+        )
+        y1 = np.maximum(
+            np.ceil(b[:, 3] * scale + offset[1] * dpr).astype(np.int64), y0 + 1
+        )
+        x0, x1 = np.clip(x0, 0, width), np.clip(x1, 0, width)
+        y0, y1 = np.clip(y0, 0, height), np.clip(y1, 0, height)
+        w = x1 - x0
+        h = np.maximum(y1 - y0, 0) * (w > 0)
+
+        rgb = palette.astype(np.uint32)
+        argb = 0xFF000000 | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+        colors = argb[self.ids[selection] % len(palette)]
+
+        # every pixel of every rectangle, set in one scatter
+        area = w * h
+        rect = np.repeat(np.arange(len(area)), area)
+        row, column = np.divmod(concat_ranges(np.zeros_like(area), area), w[rect])
+        corner = y0 * width + x0
+        buffer.reshape(-1)[corner[rect] + row * width + column] = colors[rect]
+
+        # the image borrows the buffer, it is valid until the next call
+        image = QImage(
+            buffer.data, width, height, width * 4, QImage.Format.Format_ARGB32
+        )
+        image.setDevicePixelRatio(dpr)
+        return image
@@ -0,0 +1,104 @@
+import hashlib
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from PySide6.QtCore import QObject, Signal
+
+from .polygons import PolygonStore
+
+OBJECTS_BUDGET_BYTES = 256 * 1024 * 1024
+
+
+class ObjectsMap(QObject):
+    """Objects of edited images, bounded by a memory budget.
+
+    Images are kept in least-recently-used order. Once their total size
+    exceeds ``budget_bytes`` the oldest ones are written to a scratch folder
+    and read back transparently by :meth:`get`. The most recently used image
+    always stays in memory. The scratch folder is removed when the map is
+    garbage collected or the process exits.
+
+    Parameters
+    ----------
+    budget_bytes : int
+        Memory the objects may use before images are spilled to disk.
+    """
+
+    # bytes in memory, images spilled to disk
+    usage_changed = Signal(int, int)
+
+    def __init__(self, budget_bytes: int = OBJECTS_BUDGET_BYTES, parent=None):
+        super().__init__(parent)
+        self.budget_bytes = budget_bytes
+        self._memory: OrderedDict[str, PolygonStore] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._spilled: dict[str, Path] = {}
+        self._scratch: Path | None = None
+        self.memory_bytes = 0
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._memory or path in self._spilled
+
+    def __len__(self) -> int:
+        return len(self._memory) + len(self._spilled)
+
+    @property
+    def spilled_count(self) -> int:
+        return len(self._spilled)
+
+    def get(self, path: str) -> PolygonStore | None:
+        """Objects of ``path``, read back from the scratch folder if spilled."""
+        objects = self._memory.get(path)
+        if objects is not None:
+            self._memory.move_to_end(path)
+            return objects
+
+        file = self._spilled.get(path)
+        if file is None:
+            return None
+        with np.load(file, allow_pickle=False) as data:
+            objects = PolygonStore.from_arrays(
+                data["vertices"], data["ring_ends"], data["ring_counts"]
+            )
+        self[path] = objects
+        return objects
+
+    def __setitem__(self, path: str, objects: PolygonStore):
+        spilled = self._spilled.pop(path, None)
+        if spilled is not None:
+            spilled.unlink(missing_ok=True)
+
+        self.memory_bytes -= self._sizes.get(path, 0)
+        self._memory[path] = objects
+        self._memory.move_to_end(path)
+        self._sizes[path] = objects.nbytes
+        self.memory_bytes += self._sizes[path]
+        self._evict()
+        self.usage_changed.emit(self.memory_bytes, len(self._spilled))
+
+    def set_budget(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._evict()
+        self.usage_changed.emit(self.memory_bytes, len(self._spilled))
+
+    def _evict(self):
+        while self.memory_bytes > self.budget_bytes and len(self._memory) > 1:
+            path, objects = self._memory.popitem(last=False)
+            self.memory_bytes -= self._sizes.pop(path)
+            self._spill(path, objects)
+
+    def _spill(self, path: str, objects: PolygonStore):
+        if self._scratch is None:
+            self._scratch = Path(tempfile.mkdtemp(prefix="marek-objects-"))
+            weakref.finalize(self, shutil.rmtree, self._scratch, ignore_errors=True)
+
+        name = hashlib.sha1(path.encode()).hexdigest()
+        file = self._scratch / f"{name}.npz"
+        vertices, ring_ends, ring_counts = objects.to_arrays()
+        # uncompressed, spilling has to be fast more than small
+        np.savez(file, vertices=vertices, ring_ends=ring_ends, ring_counts=ring_counts)
+        self._spilled[path] = file
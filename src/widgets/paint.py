@@ -0,0 +1,276 @@
+import math
+
+import numpy as np
+from PySide6.QtGui import QImage
+
+from .palette import COLORS, FILL_ALPHA
+from .raster import MAX_LABEL
+
+# edge of a cached overlay tile in image pixels
+OVERLAY_TILE_SIZE = 256
+# longest side of the area a fill may spread in, in image pixels
+FILL_MAX_SIDE = 2048
+
+
+def _argb(alpha: int) -> np.ndarray:
+    """Colour of every label, label 0 transparent."""
+    rgb = np.array(COLORS, dtype=np.uint32)
+    argb = (alpha << 24) | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    lut = argb[(np.arange(MAX_LABEL + 1) - 1) % len(COLORS)]
+    lut[0] = 0
+    return lut
+
+
+class LabelPaint:
+    """Objects painted straight into a uint16 label map.
+
+    Label 0 is background, every other label one painted object. Brush
+    strokes, fills and erasures write into :attr:`labels` with slice
+    operations on the pixels they cover and nothing is converted to
+    polygons. The colour overlay is cut into :data:`OVERLAY_TILE_SIZE`
+    tiles converted once and cached, an edit only converts the tiles it
+    touched again.
+
+    Parameters
+    ----------
+    shape : tuple[int, int]
+        ``(height, width)`` of the image.
+    labels : np.ndarray | None
+        Label map painted earlier, an empty one is created if None.
+    """
+
+    def __init__(self, shape: tuple[int, int], labels: np.ndarray | None = None):
+        from scipy.ndimage import find_objects
+
+        self.shape = shape
+        self.labels = np.zeros(shape, dtype=np.uint16) if labels is None else labels
+        # bounding boxes as (x0, y0, x1, y1), they may outgrow erased pixels
+        self._bounds: dict[int, tuple[int, int, int, int]] = {}
+        # overlay tiles that may hold labels
+        self._used: set[tuple[int, int]] = set()
+        self._overlays: dict[tuple[int, int], QImage | None] = {}
+        self._fill = _argb(FILL_ALPHA)
+        self._outline = _argb(255)
+        self.next_label = 1
+        if labels is not None:
+            for index, slices in enumerate(find_objects(labels)):
+                if slices is not None:
+                    rows, cols = slices
+                    rect = (cols.start, rows.start, cols.stop, rows.stop)
+                    self._changed(index + 1, rect)
+            self.next_label = max(self._bounds, default=0) + 1
+            self._overlays.clear()
+
+    def __bool__(self) -> bool:
+        return bool(self._bounds)
+
+    def new_label(self) -> int | None:
+        """Label for a new object, None once uint16 labels run out."""
+        if self.next_label > MAX_LABEL:
+            return None
+        self.next_label += 1
+        return self.next_label - 1
+
+    def label_at(self, x: float, y: float) -> int:
+        height, width = self.shape
+        if not (0 <= x < width and 0 <= y < height):
+            return 0
+        return int(self.labels[int(y), int(x)])
+
+    def stroke(self, start, end, radius: float, label: int):
+        """Paint ``label`` under a round brush moved from ``start`` to ``end``.
+
+        Label 0 erases. Returns the changed ``(x0, y0, x1, y1)`` pixels, None
+        if the stroke is outside the image.
+        """
+        (xa, ya), (xb, yb) = start, end
+        rect = self._clip(
+            math.floor(min(xa, xb) - radius),
+            math.floor(min(ya, yb) - radius),
+            math.ceil(max(xa, xb) + radius) + 1,
+            math.ceil(max(ya, yb) + radius) + 1,
+        )
+        if rect is None:
+            return None
+        x0, y0, x1, y1 = rect
+
+        # distance of the pixel centres to the segment
+        rows, cols = np.ogrid[y0:y1, x0:x1]
+        px, py = cols + 0.5 - xa, rows + 0.5 - ya
+        dx, dy = xb - xa, yb - ya
+        length = dx * dx + dy * dy
+        t = np.clip((px * dx + py * dy) / length, 0, 1) if length else 0.0
+        inside = (px - t * dx) ** 2 + (py - t * dy) ** 2 <= radius * radius
+
+        self.labels[y0:y1, x0:x1][inside] = label
+        self._changed(label, rect)
+        return rect
+
+    def fill(self, x: float, y: float, label: int):
+        """Paint ``label`` over the connected area of equal labels at a point.
+
+        Background has to be enclosed by labels within :data:`FILL_MAX_SIDE`
+        pixels, so a click on open background does not flood the image; a
+        painted object may also reach the image edge. Returns the changed
+        ``(x0, y0, x1, y1)`` pixels or None.
+        """
+        from scipy.ndimage import label as connected
+
+        height, width = self.shape
+        if not (0 <= x < width and 0 <= y < height):
+            return None
+        half = FILL_MAX_SIDE // 2
+        rect = self._clip(int(x) - half, int(y) - half, int(x) + half, int(y) + half)
+        # never empty, it holds the clicked pixel
+        assert rect is not None
+        x0, y0, x1, y1 = rect
+        crop = self.labels[y0:y1, x0:x1]
+        row, col = int(y) - y0, int(x) - x0
+        value = crop[row, col]
+        if value == label:
+            return None
+
+        parts = np.empty(crop.shape, dtype=np.int32)
+        connected(crop == value, output=parts)
+        area = parts == parts[row, col]
+        background = value == 0
+        edges = (
+            (area[0], background or y0 > 0),
+            (area[-1], background or y1 < height),
+            (area[:, 0], background or x0 > 0),
+            (area[:, -1], background or x1 < width),
+        )
+        if any(leaks and line.any() for line, leaks in edges):
+            return None
+
+        rows, cols = np.nonzero(area)
+        crop[area] = label
+        rect = (
+            x0 + int(cols.min()),
+            y0 + int(rows.min()),
+            x0 + int(cols.max()) + 1,
+            y0 + int(rows.max()) + 1,
+        )
+        self._changed(label, rect)
+        return rect
+
+    def erase(self, label: int):
+        """Remove a painted object, returns the pixels it may have covered."""
+        rect = self._bounds.pop(label, None)
+        if rect is None:
+            return None
+        x0, y0, x1, y1 = rect
+        crop = self.labels[y0:y1, x0:x1]
+        crop[crop == label] = 0
+        self._changed(0, rect)
+        return rect
+
+    def export(self) -> np.ndarray:
+        """Copy of the label map, for saving while painting goes on."""
+        return self.labels.copy()
+
+    def tiles_in(self, x0: float, y0: float, x1: float, y1: float):
+        """Overlay tiles holding labels that intersect an image rectangle."""
+        size = OVERLAY_TILE_SIZE
+        tx0, ty0 = math.floor(x0 / size), math.floor(y0 / size)
+        tx1, ty1 = math.ceil(x1 / size), math.ceil(y1 / size)
+        return [
+            (tx, ty) for tx, ty in self._used if tx0 <= tx < tx1 and ty0 <= ty < ty1
+        ]
+
+    def overlay(self, tile: tuple[int, int]) -> QImage | None:
+        """Colours of an overlay tile, None if it holds no labels.
+
+        Labels are filled translucent and outlined opaque where they border
+        another label, so touching objects stay apart.
+        """
+        if tile in self._overlays:
+            return self._overlays[tile]
+
+        size = OVERLAY_TILE_SIZE
+        height, width = self.shape
+        x0, y0 = tile[0] * size, tile[1] * size
+        x1, y1 = min(width, x0 + size), min(height, y0 + size)
+        crop = self.labels[y0:y1, x0:x1]
+        image = None
+        if crop.any():
+            # a pixel of the neighbouring tiles, outlines continue across them
+            top, left = int(y0 == 0), int(x0 == 0)
+            bottom, right = int(y1 == height), int(x1 == width)
+            padded = np.pad(
+                self.labels[
+                    y0 - 1 + top : y1 + 1 - bottom, x0 - 1 + left : x1 + 1 - right
+                ],
+                ((top, bottom), (left, right)),
+                mode="edge",
+            )
+            border = (
+                (padded[:-2, 1:-1] != crop)
+                | (padded[2:, 1:-1] != crop)
+                | (padded[1:-1, :-2] != crop)
+                | (padded[1:-1, 2:] != crop)
+            )
+            argb = np.where(border, self._outline[crop], self._fill[crop])
+            h, w = argb.shape
+            image = QImage(argb.data, w, h, 4 * w, QImage.Format.Format_ARGB32).copy()
+        self._overlays[tile] = image
+        if image is None:
+            self._used.discard(tile)
+        return image
+
+    def _clip(self, x0: int, y0: int, x1: int, y1: int):
+        height, width = self.shape
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(width, x1), min(height, y1)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    def _changed(self, label: int, rect: tuple[int, int, int, int]):
+        """Drop the overlay tiles under changed pixels and their outlines."""
+        x0, y0, x1, y1 = rect
+        if label:
+            bounds = self._bounds.get(label)
+            if bounds is not None:
+                rect = (
+                    min(x0, bounds[0]),
+                    min(y0, bounds[1]),
+                    max(x1, bounds[2]),
+                    max(y1, bounds[3]),
+                )
+            self._bounds[label] = rect
+
+        size = OVERLAY_TILE_SIZE
+        tiles = [
+            (tx, ty)
+            for ty in range((y0 - 1) // size, y1 // size + 1)
+            for tx in range((x0 - 1) // size, x1 // size + 1)
+            if tx >= 0 and ty >= 0
+        ]
+        for tile in tiles:
+            self._overlays.pop(tile, None)
+        if label:
+            self._used.update(tiles)
+
+
+def merge_painted(labels: np.ndarray, painted: np.ndarray, count: int) -> int:
+    """Write painted labels over the label map of ``count`` polygon objects.
+
+    Painted label ``n`` becomes ``count + n`` and covers the polygons below.
+
+    Returns
+    -------
+    int
+        Highest painted label, 0 if nothing is painted.
+
+    Raises
+    ------
+    ValueError
+        If the labels do not fit into uint16.
+    """
+    top = int(painted.max())
+    if top and count + top > MAX_LABEL:
+        raise ValueError(f"{count + top} labels do not fit into uint16")
+    if top:
+        np.add(painted, count, out=labels, where=painted > 0)
+    return top
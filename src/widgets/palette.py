@@ -0,0 +1,13 @@
+"""Object colours shared by the canvas and the headless renderers."""
+
+# object id i is drawn in COLORS[i % len(COLORS)]; ids are numbered from 0 in
+# saved order when an annotation is loaded, so label n gets COLORS[(n - 1) % 5]
+COLORS = [
+    (255, 0, 0),
+    (0, 255, 0),
+    (0, 0, 255),
+    (255, 255, 0),
+    (255, 0, 255),
+]
+# opacity of the object fill, 0-255
+FILL_ALPHA = 100
@@ -0,0 +1,66 @@
+import numpy as np
+from PySide6.QtCore import QByteArray, QDataStream, QIODevice
+from PySide6.QtGui import QPainterPath
+
+# element layout of a serialized QPainterPath: type, x, y (big endian)
+_ELEMENT = np.dtype([("type", ">i4"), ("x", ">f8"), ("y", ">f8")])
+_MOVE_TO = 0
+_LINE_TO = 1
+_ODD_EVEN_FILL = 0
+
+
+def array_to_path(
+    points: np.ndarray, ring_ends: np.ndarray | None = None, closed: bool = True
+) -> QPainterPath:
+    """Build a QPainterPath from vertex arrays without a per-vertex Python loop.
+
+    The elements are laid out in QPainterPath's QDataStream format with
+    NumPy and deserialized by Qt in one call.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        ``(N, 2)`` array of ``(x, y)`` vertices, rings concatenated.
+    ring_ends : np.ndarray | None
+        End offset of every ring in ``points``, a single ring if None.
+    closed : bool
+        Close every ring back to its first vertex.
+
+    Returns
+    -------
+    QPainterPath
+        Path with one subpath per ring and the odd-even fill rule.
+    """
+    path = QPainterPath()
+    if len(points) < 2:
+        return path
+
+    if ring_ends is None:
+        ring_ends = np.array([len(points)])
+    ring_ends = np.asarray(ring_ends, dtype=np.int64)
+    ring_starts = np.concatenate(([0], ring_ends[:-1]))
+    lengths = ring_ends - ring_starts
+
+    # a closed ring gets one extra element leading back to its first vertex
+    element_counts = lengths + 1 if closed else lengths
+    element_starts = np.concatenate(([0], np.cumsum(element_counts)[:-1]))
+    total = int(element_counts.sum())
+
+    position = np.arange(total) - np.repeat(element_starts, element_counts)
+    if closed:
+        position[position == np.repeat(lengths, element_counts)] = 0
+    index = position + np.repeat(ring_starts, element_counts)
+
+    elements = np.empty(total, dtype=_ELEMENT)
+    elements["type"] = _LINE_TO
+    elements["type"][element_starts] = _MOVE_TO
+    elements["x"] = points[index, 0]
+    elements["y"] = points[index, 1]
+
+    header = np.array([total], dtype=">i4")
+    footer = np.array([element_starts[-1], _ODD_EVEN_FILL], dtype=">i4")
+    data = QByteArray(header.tobytes() + elements.tobytes() + footer.tobytes())
+
+    stream = QDataStream(data, QIODevice.OpenModeFlag.ReadOnly)
+    _ = stream >> path
+    return path
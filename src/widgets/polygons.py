@@ -0,0 +1,331 @@
+from collections.abc import Iterable, Iterator, Sequence
+
+import numpy as np
+
+VERTEX_DTYPE = np.float32
+
+
+class PointBuffer:
+    """Growable ``(N, 2)`` float32 array with amortized O(1) appends."""
+
+    def __init__(self, capacity: int = 256):
+        self._data = np.empty((max(1, capacity), 2), dtype=VERTEX_DTYPE)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def array(self) -> np.ndarray:
+        """View of the used part of the buffer."""
+        return self._data[: self._size]
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def append(self, x: float, y: float):
+        self._reserve(self._size + 1)
+        self._data[self._size] = (x, y)
+        self._size += 1
+
+    def extend(self, points: np.ndarray):
+        end = self._size + len(points)
+        self._reserve(end)
+        self._data[self._size : end] = points
+        self._size = end
+
+    def clear(self):
+        self._size = 0
+
+    def _reserve(self, size: int):
+        if size <= len(self._data):
+            return
+        capacity = len(self._data)
+        while capacity < size:
+            capacity *= 2
+        data = np.empty((capacity, 2), dtype=VERTEX_DTYPE)
+        data[: self._size] = self._data[: self._size]
+        self._data = data
+
+
+class PolygonStore:
+    """Polygon objects packed into one contiguous vertex buffer.
+
+    Every object is made of one or more rings (outline, holes, extra parts)
+    whose vertices are stored back to back. Objects are addressed by an
+    integer id that stays valid until the object is removed; ids of removed
+    objects are never reused. Removal only marks the object dead, the vertex
+    and ring buffers are compacted once dead entries make up half of either.
+    """
+
+    def __init__(self):
+        self._vertices = PointBuffer(1024)
+        self._dead_vertices = 0
+        # per ring: end offset relative to the first vertex of its object
+        self._ring_ends = np.empty(256, dtype=np.int32)
+        self._ring_count = 0
+        self._dead_rings = 0
+        # per object: first vertex, vertex count, first ring, ring count
+        self._table = np.empty((256, 4), dtype=np.int64)
+        self._bounds = np.empty((256, 4), dtype=VERTEX_DTYPE)
+        self._alive = np.zeros(256, dtype=bool)
+        self._count = 0
+        self._alive_count = 0
+
+    @classmethod
+    def from_rings(cls, objects: Iterable[Sequence[np.ndarray]]) -> "PolygonStore":
+        store = cls()
+        for rings in objects:
+            store.append(rings)
+        return store
+
+    def __len__(self) -> int:
+        return self._alive_count
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.ids().tolist())
+
+    def __contains__(self, oid: int) -> bool:
+        return 0 <= oid < self._count and bool(self._alive[oid])
+
+    def ids(self) -> np.ndarray:
+        """Ids of live objects in insertion order."""
+        return np.flatnonzero(self._alive[: self._count])
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self._vertices.nbytes
+            + self._ring_ends.nbytes
+            + self._table.nbytes
+            + self._bounds.nbytes
+            + self._alive.nbytes
+        )
+
+    @property
+    def next_id(self) -> int:
+        """Id the next appended object gets."""
+        return self._count
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self._vertices) - self._dead_vertices
+
+    def append(self, rings: Sequence[np.ndarray]) -> int:
+        """Add an object and return its id. Rings with fewer than 3 points are dropped."""
+        rings = [
+            np.asarray(ring, dtype=VERTEX_DTYPE) for ring in rings if len(ring) >= 3
+        ]
+        if not rings:
+            raise ValueError("object needs at least one ring with 3 or more points")
+
+        oid = self._count
+        self._grow_objects(oid + 1)
+        self._grow_rings(self._ring_count + len(rings))
+
+        vstart = len(self._vertices)
+        end = 0
+        for i, ring in enumerate(rings):
+            self._vertices.extend(ring)
+            end += len(ring)
+            self._ring_ends[self._ring_count + i] = end
+
+        self._table[oid] = (vstart, end, self._ring_count, len(rings))
+        points = self._vertices.array[vstart:]
+        self._bounds[oid, :2] = points.min(axis=0)
+        self._bounds[oid, 2:] = points.max(axis=0)
+        self._alive[oid] = True
+        self._ring_count += len(rings)
+        self._count += 1
+        self._alive_count += 1
+        return oid
+
+    def remove(self, oid: int):
+        if oid not in self:
+            raise KeyError(oid)
+
+        self._alive[oid] = False
+        self._alive_count -= 1
+        self._dead_vertices += int(self._table[oid, 1])
+        self._dead_rings += int(self._table[oid, 3])
+        self._compact_if_sparse()
+
+    def replace(self, oid: int, rings: Sequence[np.ndarray]):
+        """Give an object new rings, keeping its id and position among the others.
+
+        Rings of the same lengths are overwritten in place, otherwise the new
+        vertices are appended and the old ones count as dead.
+        """
+        if oid not in self:
+            raise KeyError(oid)
+        rings = [
+            np.asarray(ring, dtype=VERTEX_DTYPE) for ring in rings if len(ring) >= 3
+        ]
+        if not rings:
+            raise ValueError("object needs at least one ring with 3 or more points")
+
+        points = np.concatenate(rings)
+        ends = np.cumsum([len(ring) for ring in rings])
+        vstart, vcount, rstart, rcount = self._table[oid].tolist()
+        if np.array_equal(ends, self._ring_ends[rstart : rstart + rcount]):
+            self._vertices.array[vstart : vstart + vcount] = points
+        else:
+            self._grow_rings(self._ring_count + len(rings))
+            self._ring_ends[self._ring_count : self._ring_count + len(rings)] = ends
+            self._table[oid] = (
+                len(self._vertices),
+                len(points),
+                self._ring_count,
+                len(rings),
+            )
+            self._vertices.extend(points)
+            self._ring_count += len(rings)
+            self._dead_vertices += vcount
+            self._dead_rings += rcount
+        self._bounds[oid, :2] = points.min(axis=0)
+        self._bounds[oid, 2:] = points.max(axis=0)
+        self._compact_if_sparse()
+
+    def vertices(self, oid: int) -> np.ndarray:
+        """View of all vertices of an object, rings concatenated."""
+        vstart, vcount, _, _ = self._table[oid]
+        return self._vertices.array[vstart : vstart + vcount]
+
+    def ring_ends(self, oid: int) -> np.ndarray:
+        """End offsets of the rings of an object within :meth:`vertices`."""
+        _, _, rstart, rcount = self._table[oid]
+        return self._ring_ends[rstart : rstart + rcount]
+
+    def rings(self, oid: int) -> list[np.ndarray]:
+        """Views of the rings of an object."""
+        points = self.vertices(oid)
+        rings = []
+        start = 0
+        for end in self.ring_ends(oid).tolist():
+            rings.append(points[start:end])
+            start = end
+        return rings
+
+    def bounds(self, oid: int) -> np.ndarray:
+        """``(xmin, ymin, xmax, ymax)`` of an object."""
+        return self._bounds[oid]
+
+    def bounds_array(self, ids: np.ndarray) -> np.ndarray:
+        """``(N, 4)`` bounding boxes of the given objects."""
+        return self._bounds[np.asarray(ids, dtype=np.int64)]
+
+    @classmethod
+    def from_arrays(
+        cls, vertices: np.ndarray, ring_ends: np.ndarray, ring_counts: np.ndarray
+    ) -> "PolygonStore":
+        """Rebuild a store from the output of :meth:`to_arrays` without a per-object loop."""
+        store = cls()
+        ring_counts = np.asarray(ring_counts, dtype=np.int64)
+        count = len(ring_counts)
+        if count == 0:
+            return store
+
+        ring_ends = np.asarray(ring_ends, dtype=np.int32)
+        rstart = np.concatenate(([0], np.cumsum(ring_counts)[:-1]))
+        vcount = ring_ends[rstart + ring_counts - 1].astype(np.int64)
+        vstart = np.concatenate(([0], np.cumsum(vcount)[:-1]))
+
+        store._vertices.extend(np.asarray(vertices, dtype=VERTEX_DTYPE))
+        store._grow_rings(len(ring_ends))
+        store._ring_ends[: len(ring_ends)] = ring_ends
+        store._ring_count = len(ring_ends)
+
+        store._grow_objects(count)
+        store._table[:count] = np.column_stack((vstart, vcount, rstart, ring_counts))
+        points = store._vertices.array
+        store._bounds[:count, :2] = np.minimum.reduceat(points, vstart, axis=0)
+        store._bounds[:count, 2:] = np.maximum.reduceat(points, vstart, axis=0)
+        store._alive[:count] = True
+        store._count = count
+        store._alive_count = count
+        return store
+
+    def to_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Pack live objects into flat arrays.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray, np.ndarray]
+            Vertices of all objects, ring end offsets relative to their object
+            and the number of rings of every object.
+        """
+        vertices, ring_ends, _, ring_counts = self.pack(self.ids())
+        return vertices, ring_ends, ring_counts.astype(np.int32)
+
+    def pack(
+        self, ids: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Gather the given objects into flat arrays.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+            Concatenated vertices, ring end offsets relative to their object,
+            vertex count and ring count of every object.
+        """
+        vstart, vcount, rstart, rcount = self._table[np.asarray(ids, dtype=np.int64)].T
+        vertices = self._vertices.array[concat_ranges(vstart, vcount)]
+        ring_ends = self._ring_ends[concat_ranges(rstart, rcount)]
+        return vertices, ring_ends, vcount, rcount
+
+    def copy(self) -> "PolygonStore":
+        """Compact copy holding only live objects; ids are renumbered from 0."""
+        return PolygonStore.from_arrays(*self.to_arrays())
+
+    def _compact_if_sparse(self):
+        if self._dead_vertices > max(4096, len(self._vertices) // 2) or (
+            self._dead_rings > max(1024, self._ring_count // 2)
+        ):
+            self._compact()
+
+    def _compact(self):
+        ids = self.ids()
+        points, ring_ends, vcount, rcount = self.pack(ids)
+        vertices = PointBuffer(max(1024, len(points)))
+        vertices.extend(points)
+        self._vertices = vertices
+        self._dead_vertices = 0
+
+        self._ring_ends = np.empty(max(256, len(ring_ends)), dtype=np.int32)
+        self._ring_ends[: len(ring_ends)] = ring_ends
+        self._ring_count = len(ring_ends)
+        self._dead_rings = 0
+
+        self._table[ids, 0] = np.cumsum(vcount) - vcount
+        self._table[ids, 2] = np.cumsum(rcount) - rcount
+
+    def _grow_objects(self, size: int):
+        if size <= len(self._alive):
+            return
+        capacity = len(self._alive)
+        while capacity < size:
+            capacity *= 2
+        self._table = np.resize(self._table, (capacity, 4))
+        self._bounds = np.resize(self._bounds, (capacity, 4))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: self._count] = self._alive[: self._count]
+        self._alive = alive
+
+    def _grow_rings(self, size: int):
+        if size <= len(self._ring_ends):
+            return
+        capacity = len(self._ring_ends)
+        while capacity < size:
+            capacity *= 2
+        self._ring_ends = np.resize(self._ring_ends, capacity)
+
+
+def concat_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Concatenation of ``arange(start, start + count)`` for every pair."""
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return np.arange(total) - np.repeat(offsets - starts, counts)
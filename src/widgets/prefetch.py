@@ -0,0 +1,135 @@
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from .annotations import labels_path, load_objects
+from .image_source import ImageSource, open_image_source
+from .polygons import PolygonStore
+
+PREFETCH_DEPTH = 2
+PREFETCH_BUDGET_BYTES = 512 * 1024 * 1024
+
+
+def _annotation_mtime(path: str) -> int | None:
+    try:
+        return os.stat(labels_path(path)).st_mtime_ns
+    except OSError:
+        return None
+
+
+@dataclass
+class PrefetchedImage:
+    """Opened image and its annotations, ready to be shown by the canvas."""
+
+    source: ImageSource
+    objects: PolygonStore | None
+    annotation_mtime: int | None
+
+    @property
+    def nbytes(self) -> int:
+        objects = self.objects.nbytes if self.objects is not None else 0
+        return self.source.nbytes + objects
+
+
+class _Signals(QObject):
+    loaded = Signal(str, object)
+
+
+class _PrefetchJob(QRunnable):
+    def __init__(self, path: str, signals: _Signals):
+        super().__init__()
+        self.path = path
+        self.signals = signals
+
+    def run(self):
+        entry = None
+        try:
+            mtime = _annotation_mtime(self.path)
+            source = open_image_source(self.path)
+            objects = load_objects(self.path)
+            entry = PrefetchedImage(source, objects, mtime)
+        except (OSError, ValueError, MemoryError) as e:
+            print(f"Error prefetching {self.path}: {e}")
+        finally:
+            # None releases the path, it is loaded again when shown
+            self.signals.loaded.emit(self.path, entry)
+
+
+class Prefetcher(QObject):
+    """Decode images around the current one ahead of time.
+
+    Neighbouring images and their annotations are loaded on a worker pool
+    and kept in an LRU cache bounded by ``budget_bytes``. Entries whose
+    ``.npy`` changed on disk since they were loaded are treated as misses.
+
+    Parameters
+    ----------
+    depth : int
+        How many images before and after the current one to prefetch.
+    budget_bytes : int
+        Maximum size of decoded data kept in the cache.
+    """
+
+    def __init__(
+        self,
+        depth: int = PREFETCH_DEPTH,
+        budget_bytes: int = PREFETCH_BUDGET_BYTES,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.depth = depth
+        self.budget_bytes = budget_bytes
+        self._cache: OrderedDict[str, PrefetchedImage] = OrderedDict()
+        self._cache_bytes = 0
+        self._in_flight: set[str] = set()
+
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max(1, min(2 * depth, os.cpu_count() or 1)))
+
+        self._signals = _Signals(self)
+        self._signals.loaded.connect(self._on_loaded)
+
+    def get(self, path: str) -> PrefetchedImage | None:
+        """Return the cached entry for ``path`` if it is still up to date."""
+        entry = self._cache.get(path)
+        if entry is None:
+            return None
+
+        if entry.annotation_mtime != _annotation_mtime(path):
+            self.invalidate(path)
+            return None
+
+        self._cache.move_to_end(path)
+        return entry
+
+    def invalidate(self, path: str):
+        entry = self._cache.pop(path, None)
+        if entry is not None:
+            self._cache_bytes -= entry.nbytes
+
+    def prefetch(self, paths: list[str], index: int):
+        """Schedule loading of the neighbours of ``paths[index]``, nearest first."""
+        if not paths or self.depth <= 0:
+            return
+
+        for distance in range(1, self.depth + 1):
+            for neighbour in (index + distance, index - distance):
+                path = paths[neighbour % len(paths)]
+                if path in self._cache or path in self._in_flight:
+                    continue
+                self._in_flight.add(path)
+                self._pool.start(_PrefetchJob(path, self._signals))
+
+    def _on_loaded(self, path: str, entry: PrefetchedImage | None):
+        self._in_flight.discard(path)
+        if entry is None or not entry.source:
+            return
+
+        self.invalidate(path)
+        self._cache[path] = entry
+        self._cache_bytes += entry.nbytes
+        while self._cache_bytes > self.budget_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= evicted.nbytes
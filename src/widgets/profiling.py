@@ -0,0 +1,202 @@
+"""Opt-in profiling of the hot paths of the editor.
+
+Setting ``MAREK_PROFILE=1`` times painting (split into image and object
+drawing), mouse event handling, image loading, contour tracing and saving.
+The canvas shows the frame rate and frame times in a corner, histograms of
+every section are appended to a log file (``MAREK_PROFILE_LOG``, by default
+``marek-profile.log`` in the temporary directory) every few seconds, and
+:data:`CAPTURE_SHORTCUT` records a cProfile of the next seconds of the GUI
+thread. Without the variable the :func:`profiled` decorator returns
+functions unchanged, so profiling costs nothing.
+"""
+
+import atexit
+import bisect
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+ENV_VAR = "MAREK_PROFILE"
+LOG_ENV_VAR = "MAREK_PROFILE_LOG"
+CAPTURE_SHORTCUT = "F12"
+CAPTURE_SECONDS = 5
+# seconds between histograms written to the log
+LOG_INTERVAL_S = 10
+# upper bucket edges of the histograms in milliseconds
+HISTOGRAM_MS = (1, 2, 4, 8, 16, 33, 66, 133, 266, 533)
+# durations per section kept for the overlay
+RECENT_SAMPLES = 240
+# functions listed in the log after a capture
+CAPTURE_REPORT_FUNCTIONS = 30
+
+log = logging.getLogger("marek.profile")
+
+
+class _Section:
+    def __init__(self):
+        self.recent: deque[float] = deque(maxlen=RECENT_SAMPLES)
+        # durations since the last histogram was written
+        self.window: list[float] = []
+
+
+class Profiler:
+    """Collects the durations of named sections and reports them.
+
+    Sections may be recorded from any thread. Frames are the calls of the
+    ``"frame"`` section.
+
+    Parameters
+    ----------
+    log_path : Path
+        File the histograms and captured profiles are written to.
+    """
+
+    def __init__(self, log_path: Path):
+        self.log_path = log_path
+        self._sections: dict[str, _Section] = {}
+        self._frames: deque[float] = deque(maxlen=RECENT_SAMPLES)
+        self._lock = threading.Lock()
+        self._next_log = time.perf_counter() + LOG_INTERVAL_S
+        self._capture: cProfile.Profile | None = None
+
+        handler = logging.FileHandler(log_path)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+        log.propagate = False
+        atexit.register(self.write_histograms)
+
+    def record(self, section: str, seconds: float):
+        now = time.perf_counter()
+        with self._lock:
+            entry = self._sections.get(section)
+            if entry is None:
+                entry = self._sections[section] = _Section()
+            entry.recent.append(seconds)
+            entry.window.append(seconds)
+            if section == "frame":
+                self._frames.append(now)
+            due = now >= self._next_log
+            if due:
+                self._next_log = now + LOG_INTERVAL_S
+        if due:
+            self.write_histograms()
+
+    def fps(self) -> float:
+        """Frames painted during the last second."""
+        now = time.perf_counter()
+        with self._lock:
+            return float(sum(1 for t in self._frames if now - t <= 1.0))
+
+    def summary(self) -> list[str]:
+        """Lines of the overlay: frame rate, then recent times of every section."""
+        lines = [f"{self.fps():5.0f} fps"]
+        with self._lock:
+            recent = {name: sorted(s.recent) for name, s in self._sections.items()}
+        for name in sorted(recent):
+            times = recent[name]
+            if not times:
+                continue
+            median = times[len(times) // 2] * 1000
+            p95 = times[min(len(times) - 1, int(len(times) * 0.95))] * 1000
+            lines.append(f"{name:<14} {median:6.1f} {p95:6.1f} ms")
+        return lines
+
+    def write_histograms(self):
+        """Append the histograms since the last call to the log."""
+        with self._lock:
+            windows = {name: s.window for name, s in self._sections.items()}
+            for section in self._sections.values():
+                section.window = []
+        for name in sorted(windows):
+            times = sorted(windows[name])
+            if not times:
+                continue
+            counts = [0] * (len(HISTOGRAM_MS) + 1)
+            for seconds in times:
+                counts[bisect.bisect_left(HISTOGRAM_MS, seconds * 1000)] += 1
+            buckets = " ".join(
+                f"<{edge}:{count}" for edge, count in zip(HISTOGRAM_MS, counts)
+            )
+            log.info(
+                "%s n=%d mean=%.1fms p50=%.1fms p95=%.1fms max=%.1fms | %s >=%d:%d",
+                name,
+                len(times),
+                sum(times) / len(times) * 1000,
+                times[len(times) // 2] * 1000,
+                times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+                times[-1] * 1000,
+                buckets,
+                HISTOGRAM_MS[-1],
+                counts[-1],
+            )
+
+    @property
+    def capturing(self) -> bool:
+        return self._capture is not None
+
+    def capture(self, seconds: float = CAPTURE_SECONDS):
+        """Profile the calling thread for ``seconds``, then log the result."""
+        from PySide6.QtCore import QTimer
+
+        if self._capture is not None:
+            return
+        self._capture = cProfile.Profile()
+        self._capture.enable()
+        print(f"Profiling the next {seconds} s")
+        QTimer.singleShot(int(seconds * 1000), self._finish_capture)
+
+    def _finish_capture(self):
+        profile, self._capture = self._capture, None
+        if profile is None:
+            return
+        profile.disable()
+        path = self.log_path.with_name(f"marek-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        profile.dump_stats(path)
+        report = io.StringIO()
+        stats = pstats.Stats(profile, stream=report)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(
+            CAPTURE_REPORT_FUNCTIONS
+        )
+        log.info("profile saved to %s\n%s", path, report.getvalue())
+        print(f"Profile saved to {path}")
+
+
+def profiled(section: str):
+    """Decorator timing every call under ``section`` when profiling is on."""
+
+    def decorate(func):
+        # bound once, the module level name is typed as optional
+        recorder = profiler
+        if recorder is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder.record(section, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorate
+
+
+profiler: Profiler | None = None
+if os.environ.get(ENV_VAR):
+    profiler = Profiler(
+        Path(
+            os.environ.get(LOG_ENV_VAR)
+            or Path(tempfile.gettempdir()) / "marek-profile.log"
+        )
+    )
@@ -0,0 +1,293 @@
+import math
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import QObject, QRect, QRectF, QRunnable, Qt, QThreadPool, Signal
+from PySide6.QtGui import QImage, QPainter
+
+from .image_source import ImageSource
+
+TILE_SIZE = 512
+TILE_CACHE_BYTES = 256 * 1024 * 1024
+
+
+class _LevelBuilder(QRunnable):
+    def __init__(self, pyramid: "ImagePyramid", level: int):
+        super().__init__()
+        self.pyramid = pyramid
+        self.level = level
+
+    def run(self):
+        self.pyramid._build_level(self.level)
+
+
+class _TiledPyramid(QObject):
+    """Level and tile geometry shared by the pyramids, with their tile cache.
+
+    Level 0 is the original image, every following level halves both
+    dimensions until the whole image fits in one tile.
+    """
+
+    level_ready = Signal(int)
+    # a tile read in the background arrived, with its rectangle in the image
+    tile_ready = Signal(float, float, float, float)
+
+    def __init__(self, width: int, height: int, cache_bytes: int):
+        super().__init__()
+        self.width = width
+        self.height = height
+        self.cache_bytes = cache_bytes
+        self._tiles: OrderedDict[tuple[int, int, int], QImage] = OrderedDict()
+        self._tiles_bytes = 0
+
+        self._level_count = 1
+        size = max(width, height)
+        while size > TILE_SIZE:
+            size = (size + 1) // 2
+            self._level_count += 1
+
+    @property
+    def level_count(self) -> int:
+        return self._level_count
+
+    def level_for_zoom(self, zoom: float) -> int:
+        """Pick the coarsest level that still has at least one pixel per screen pixel."""
+        if zoom >= 1.0:
+            return 0
+        level = math.floor(math.log2(1.0 / zoom))
+        return min(level, self.level_count - 1)
+
+    def level_size(self, level: int) -> tuple[int, int]:
+        width, height = self.width, self.height
+        for _ in range(level):
+            width, height = max(1, width // 2), max(1, height // 2)
+        return width, height
+
+    def tile_rect(
+        self, level: int, tx: int, ty: int
+    ) -> tuple[float, float, float, float]:
+        """Rectangle covered by a tile, in level 0 (image) coordinates."""
+        width, height = self.level_size(level)
+        sx = self.width / width
+        sy = self.height / height
+        x0 = tx * TILE_SIZE
+        y0 = ty * TILE_SIZE
+        x1 = min(x0 + TILE_SIZE, width)
+        y1 = min(y0 + TILE_SIZE, height)
+        return x0 * sx, y0 * sy, x1 * sx, y1 * sy
+
+    def tiles_in(
+        self, level: int, x0: float, y0: float, x1: float, y1: float
+    ) -> list[tuple[int, int]]:
+        """Tiles of ``level`` intersecting an image-space rectangle."""
+        width, height = self.level_size(level)
+        sx = width / self.width
+        sy = height / self.height
+        tx0 = max(0, int(x0 * sx) // TILE_SIZE)
+        ty0 = max(0, int(y0 * sy) // TILE_SIZE)
+        tx1 = min((width - 1) // TILE_SIZE, math.ceil(x1 * sx) // TILE_SIZE)
+        ty1 = min((height - 1) // TILE_SIZE, math.ceil(y1 * sy) // TILE_SIZE)
+        return [(tx, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+
+    def _store_tile(self, key: tuple[int, int, int], tile: QImage):
+        self._tiles[key] = tile
+        self._tiles_bytes += tile.sizeInBytes()
+        while self._tiles_bytes > self.cache_bytes and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self._tiles_bytes -= evicted.sizeInBytes()
+
+
+class ImagePyramid(_TiledPyramid):
+    """Mip-map pyramid of an image, served as fixed-size tiles.
+
+    Levels are built lazily in the global thread pool the first time they
+    are requested, tiles are cut on demand and kept in a bounded LRU cache.
+    """
+
+    def __init__(self, image: QImage, cache_bytes: int = TILE_CACHE_BYTES):
+        super().__init__(image.width(), image.height(), cache_bytes)
+        self.image = image
+        self._levels: list[QImage | None] = [image] + [None] * (self.level_count - 1)
+        self._pending: set[int] = set()
+        self._lock = threading.Lock()
+        self.level_ready.connect(self._drop_level)
+
+    def tile(self, level: int, tx: int, ty: int) -> QImage:
+        """Return tile ``(tx, ty)`` of ``level``, cutting it if not cached.
+
+        Missing levels are scheduled for a background build, meanwhile an
+        uncached placeholder is sampled from the nearest finer level that is
+        available, reading only one source pixel per tile pixel.
+        """
+        key = (level, tx, ty)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+
+        width, height = self.level_size(level)
+        rect = QRect(tx * TILE_SIZE, ty * TILE_SIZE, TILE_SIZE, TILE_SIZE).intersected(
+            QRect(0, 0, width, height)
+        )
+
+        source_level = self._nearest_built(level)
+        source = self._levels[source_level]
+        assert source is not None
+        if source_level != level:
+            self.request_level(level)
+            return self._placeholder(source, rect, width, height)
+
+        tile = source.copy(rect)
+        self._store_tile(key, tile)
+        return tile
+
+    def request_level(self, level: int):
+        with self._lock:
+            if self._levels[level] is not None or level in self._pending:
+                return
+            self._pending.add(level)
+        QThreadPool.globalInstance().start(_LevelBuilder(self, level))
+
+    def _placeholder(
+        self, source: QImage, rect: QRect, width: int, height: int
+    ) -> QImage:
+        sx = source.width() / width
+        sy = source.height() / height
+        tile = QImage(rect.size(), QImage.Format.Format_ARGB32_Premultiplied)
+        # without smooth transforms the painter samples nearest pixels, a full
+        # resolution level would be megabytes to copy and filter per tile
+        painter = QPainter(tile)
+        painter.drawImage(
+            QRectF(0, 0, rect.width(), rect.height()),
+            source,
+            QRectF(rect.x() * sx, rect.y() * sy, rect.width() * sx, rect.height() * sy),
+        )
+        painter.end()
+        return tile
+
+    def _drop_level(self, level: int):
+        """Forget tiles of a level that was just built, so they are cut again."""
+        for key in [key for key in self._tiles if key[0] == level]:
+            self._tiles_bytes -= self._tiles.pop(key).sizeInBytes()
+
+    def _nearest_built(self, level: int) -> int:
+        while self._levels[level] is None:
+            level -= 1
+        return level
+
+    def _build_level(self, level: int):
+        with self._lock:
+            start = self._nearest_built(level)
+            source = self._levels[start]
+        assert source is not None
+
+        for current in range(start + 1, level + 1):
+            width, height = self.level_size(current)
+            source = source.scaled(
+                width,
+                height,
+                Qt.AspectRatioMode.IgnoreAspectRatio,
+                Qt.TransformationMode.SmoothTransformation,
+            )
+            with self._lock:
+                if self._levels[current] is None:
+                    self._levels[current] = source
+                self._pending.discard(current)
+
+        self.level_ready.emit(level)
+
+
+class _TileReader(QRunnable):
+    def __init__(self, pyramid: "SourcePyramid", level: int, tx: int, ty: int):
+        super().__init__()
+        self.pyramid = pyramid
+        self.level = level
+        self.tx = tx
+        self.ty = ty
+
+    def run(self):
+        try:
+            tile = self.pyramid._read(self.level, self.tx, self.ty)
+        except (OSError, ValueError) as e:
+            print(f"Error reading tile {self.level, self.tx, self.ty}: {e}")
+            tile = QImage()
+        self.pyramid._tile_read.emit(self.level, self.tx, self.ty, tile)
+
+
+class SourcePyramid(_TiledPyramid):
+    """Pyramid whose tiles are read from an image source when first shown.
+
+    Each tile is a region of the source subsampled to its level, read in
+    the global thread pool, so memory follows what is on screen and not
+    the size of the file. Until a tile arrives it is cut from the nearest
+    coarser cached tile. The top level, a single tile, is read up front and
+    kept, so there always is one.
+
+    Parameters
+    ----------
+    source : ImageSource
+        Image to show.
+    """
+
+    # level, tx, ty and the tile, emitted from the reading thread
+    _tile_read = Signal(int, int, int, QImage)
+
+    def __init__(self, source: ImageSource, cache_bytes: int = TILE_CACHE_BYTES):
+        super().__init__(source.width, source.height, cache_bytes)
+        self.source = source
+        self._pending: set[tuple[int, int, int]] = set()
+        self._top = self._read(self.level_count - 1, 0, 0)
+        self._tile_read.connect(self._on_tile_read)
+
+    def tile(self, level: int, tx: int, ty: int) -> QImage | None:
+        """Return tile ``(tx, ty)`` of ``level``, reading it if not cached.
+
+        Meanwhile the tile is scaled up from a coarser one, ``None`` means
+        there is nothing to show yet.
+        """
+        key = (level, tx, ty)
+        if level == self.level_count - 1:
+            return self._top
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+
+        if key not in self._pending:
+            self._pending.add(key)
+            QThreadPool.globalInstance().start(_TileReader(self, level, tx, ty))
+
+        for coarser in range(level + 1, self.level_count):
+            scale = 2 ** (coarser - level)
+            if coarser == self.level_count - 1:
+                parent = self._top
+            else:
+                parent = self._tiles.get((coarser, tx // scale, ty // scale))
+            if parent is None or parent.isNull():
+                continue
+            part = TILE_SIZE / scale
+            rect = QRect(
+                int((tx % scale) * part),
+                int((ty % scale) * part),
+                max(1, math.ceil(part)),
+                max(1, math.ceil(part)),
+            ).intersected(parent.rect())
+            if rect.isEmpty():
+                return None
+            return parent.copy(rect).scaled(rect.width() * scale, rect.height() * scale)
+        return None
+
+    def _read(self, level: int, tx: int, ty: int) -> QImage:
+        step = 2**level
+        x0 = tx * TILE_SIZE * step
+        y0 = ty * TILE_SIZE * step
+        x1 = min(x0 + TILE_SIZE * step, self.width)
+        y1 = min(y0 + TILE_SIZE * step, self.height)
+        return self.source.region(x0, y0, x1, y1, step)
+
+    def _on_tile_read(self, level: int, tx: int, ty: int, tile: QImage):
+        self._pending.discard((level, tx, ty))
+        if tile.isNull():
+            return
+        self._store_tile((level, tx, ty), tile)
+        self.tile_ready.emit(*self.tile_rect(level, tx, ty))
@@ -0,0 +1,176 @@
+import numpy as np
+
+from .polygons import PolygonStore, concat_ranges
+
+# spans at least this long are filled with a slice instead of per-pixel indices
+LONG_SPAN = 64
+MAX_LABEL = np.iinfo(np.uint16).max
+
+
+def rasterize_into(
+    out: np.ndarray,
+    objects: PolygonStore,
+    ids,
+    labels,
+    origin: tuple[int, int] = (0, 0),
+):
+    """Fill objects into a label array in one batched scanline pass.
+
+    Every edge of every ring is intersected with the pixel rows it spans at
+    once, crossings are sorted per object and row and paired with the
+    even-odd rule. Where objects overlap the highest label wins, so the
+    result does not depend on processing order.
+
+    Parameters
+    ----------
+    out : np.ndarray
+        2D label array, updated in place. May be a view into a larger map.
+    objects : PolygonStore
+        Store holding the objects.
+    ids : array-like
+        Ids of the objects to fill.
+    labels : array-like
+        Label written for each id.
+    origin : tuple[int, int]
+        Image ``(x, y)`` coordinates of ``out[0, 0]``.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) == 0:
+        return
+    labels = np.asarray(labels, dtype=out.dtype)
+    height, width = out.shape
+
+    vertices, ring_ends, vcount, rcount = objects.pack(ids)
+    vertices = vertices.astype(np.float64) - origin
+    owner = np.repeat(labels, vcount)
+
+    # index of the vertex following each vertex within its ring
+    object_offsets = np.repeat(np.cumsum(vcount) - vcount, rcount)
+    ends = ring_ends + object_offsets
+    starts = np.concatenate(([0], ends[:-1]))
+    following = np.arange(len(vertices)) + 1
+    following[ends - 1] = starts
+
+    x0, y0 = vertices[:, 0], vertices[:, 1]
+    x1, y1 = vertices[following, 0], vertices[following, 1]
+
+    # an edge crosses the centers of rows ceil(min y) .. ceil(max y) - 1
+    row_start = np.clip(np.ceil(np.minimum(y0, y1)), 0, height).astype(np.int64)
+    row_stop = np.clip(np.ceil(np.maximum(y0, y1)), 0, height).astype(np.int64)
+    counts = np.maximum(row_stop - row_start, 0)
+    edges = np.repeat(np.arange(len(vertices)), counts)
+    rows = concat_ranges(row_start, counts)
+    if len(rows) == 0:
+        return
+
+    dy = y1[edges] - y0[edges]
+    xs = x0[edges] + (rows - y0[edges]) * (x1[edges] - x0[edges]) / dy
+    owners = owner[edges]
+
+    order = np.lexsort((xs, rows, owners))
+    xs, rows, owners = xs[order], rows[order], owners[order]
+
+    # every (object, row) group has an even number of crossings
+    span_rows = rows[0::2]
+    span_labels = owners[0::2]
+    span_start = np.clip(np.ceil(xs[0::2]), 0, width).astype(np.int64)
+    span_stop = np.clip(np.ceil(xs[1::2]), 0, width).astype(np.int64)
+    lengths = span_stop - span_start
+
+    short = (lengths > 0) & (lengths < LONG_SPAN)
+    if short.any():
+        n = lengths[short]
+        # out may be a view into a larger map, index it in 2D
+        pixels = (np.repeat(span_rows[short], n), concat_ranges(span_start[short], n))
+        np.maximum.at(out, pixels, np.repeat(span_labels[short], n))
+
+    for row, start, stop, label in zip(
+        span_rows[lengths >= LONG_SPAN].tolist(),
+        span_start[lengths >= LONG_SPAN].tolist(),
+        span_stop[lengths >= LONG_SPAN].tolist(),
+        span_labels[lengths >= LONG_SPAN].tolist(),
+    ):
+        np.maximum(out[row, start:stop], label, out=out[row, start:stop])
+
+
+def rasterize(objects: PolygonStore, shape: tuple[int, int]) -> np.ndarray:
+    """Label map with the n-th live object painted as label n."""
+    out = np.zeros(shape, dtype=np.uint16)
+    ids = objects.ids()
+    rasterize_into(out, objects, ids, np.arange(1, len(ids) + 1))
+    return out
+
+
+class LabelRaster:
+    """Label map kept in sync with a PolygonStore one object at a time.
+
+    Object ``oid`` is stored as label ``oid + 1`` so labels stay valid while
+    objects are added and removed; :meth:`export` renumbers them to
+    ``1..N`` in object order, the layout written to disk. Adding or removing
+    an object only touches the pixels inside its bounding box.
+    """
+
+    def __init__(self, objects: PolygonStore, shape: tuple[int, int]):
+        self.objects = objects
+        self.shape = shape
+        self.labels = np.zeros(shape, dtype=np.uint16)
+        ids = objects.ids()
+        rasterize_into(self.labels, objects, ids, ids + 1)
+
+    @staticmethod
+    def supports(objects: PolygonStore) -> bool:
+        """Whether all object ids fit into uint16 labels."""
+        ids = objects.ids()
+        return len(ids) == 0 or int(ids[-1]) < MAX_LABEL
+
+    def add(self, oid: int):
+        region = self._region(self.objects.bounds(oid))
+        if region is None:
+            return
+        x0, y0, x1, y1 = region
+        rasterize_into(
+            self.labels[y0:y1, x0:x1], self.objects, [oid], [oid + 1], (x0, y0)
+        )
+
+    def remove(self, oid: int, bounds, overlapping):
+        """Clear an object that was already removed from the store.
+
+        Parameters
+        ----------
+        oid : int
+            Id of the removed object.
+        bounds : array-like
+            Bounding box the object had.
+        overlapping : array-like
+            Ids of live objects whose bounding boxes intersect ``bounds``,
+            they are redrawn inside the cleared region.
+        """
+        region = self._region(bounds)
+        if region is None:
+            return
+        x0, y0, x1, y1 = region
+        crop = self.labels[y0:y1, x0:x1]
+        crop[crop == oid + 1] = 0
+        ids = np.asarray(overlapping, dtype=np.int64)
+        rasterize_into(crop, self.objects, ids, ids + 1, (x0, y0))
+
+    def export(self) -> np.ndarray:
+        """Copy of the label map with labels renumbered to ``1..N``."""
+        ids = self.objects.ids()
+        if len(ids) == 0 or int(ids[-1]) == len(ids) - 1:
+            return self.labels.copy()
+
+        lut = np.zeros(MAX_LABEL + 1, dtype=np.uint16)
+        lut[ids + 1] = np.arange(1, len(ids) + 1)
+        return lut[self.labels]
+
+    def _region(self, bounds) -> tuple[int, int, int, int] | None:
+        height, width = self.shape
+        xmin, ymin, xmax, ymax = (float(v) for v in bounds)
+        x0 = max(0, int(np.floor(xmin)))
+        y0 = max(0, int(np.floor(ymin)))
+        x1 = min(width, int(np.ceil(xmax)) + 1)
+        y1 = min(height, int(np.ceil(ymax)) + 1)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
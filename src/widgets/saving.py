@@ -0,0 +1,178 @@
+import os
+
+import numpy as np
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from .annotations import labels_path, save_annotation
+from .image_source import image_size
+from .paint import merge_painted
+from .polygons import PolygonStore
+from .profiling import profiled
+from .raster import rasterize
+
+
+class _Signals(QObject):
+    finished = Signal(str, str)
+
+
+class _SaveJob(QRunnable):
+    def __init__(
+        self,
+        image_path: str,
+        objects: PolygonStore,
+        shape: tuple[int, int] | None,
+        labels: np.ndarray | None,
+        journal_seq: int,
+        painted: np.ndarray | None,
+        signals: _Signals,
+    ):
+        super().__init__()
+        self.image_path = image_path
+        self.objects = objects
+        self.shape = shape
+        self.labels = labels
+        self.journal_seq = journal_seq
+        self.painted = painted
+        self.signals = signals
+
+    @profiled("save")
+    def run(self):
+        # kept if the job fails on a bug, whose traceback goes to the log
+        error = "internal error, see the log"
+        try:
+            labels = self.labels
+            if labels is None:
+                shape = self.shape
+                if shape is None:
+                    size = image_size(self.image_path)
+                    if size is None:
+                        raise OSError(f"cannot read size of {self.image_path}")
+                    shape = (size[1], size[0])
+                labels = rasterize(self.objects, shape)
+
+            painted = 0
+            if self.painted is not None:
+                painted = merge_painted(labels, self.painted, len(self.objects))
+            save_annotation(
+                self.image_path, labels, self.objects, self.journal_seq, painted
+            )
+            error = ""
+        except (OSError, ValueError, MemoryError) as e:
+            error = str(e)
+        finally:
+            # the saver waits for every job to finish, failed or not
+            self.signals.finished.emit(self.image_path, error)
+
+
+class Saver(QObject):
+    """Rasterize and write annotations on a thread pool.
+
+    Painted label maps are written over the polygons as they are.
+
+    Jobs work on a snapshot of the objects, so editing can continue while a
+    save is running. Saves of the same image are serialized and only the
+    newest pending snapshot is written.
+    """
+
+    progress = Signal(int, int)
+    saved = Signal(str)
+    failed = Signal(str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(os.cpu_count() or 1)
+        self._signals = _Signals(self)
+        self._signals.finished.connect(self._on_finished)
+        self._running: set[str] = set()
+        self._queued: dict[str, tuple] = {}
+        self._done = 0
+        self._total = 0
+
+    @property
+    def busy(self) -> bool:
+        return bool(self._running)
+
+    def save(
+        self,
+        image_path: str,
+        objects: PolygonStore,
+        shape: tuple[int, int] | None = None,
+        labels: np.ndarray | None = None,
+        journal_seq: int = 0,
+        painted: np.ndarray | None = None,
+    ) -> bool:
+        """Schedule a save of ``objects`` for ``image_path``.
+
+        Parameters
+        ----------
+        image_path : str
+            Path to the image the annotation belongs to.
+        objects : PolygonStore
+            Objects to save, a copy is taken immediately.
+        shape : tuple[int, int] | None
+            Label map shape, read from the image header if None.
+        labels : np.ndarray | None
+            Label map of ``objects`` if already available, rasterized by the
+            job otherwise. It must not be modified afterwards.
+        journal_seq : int
+            Last edit journal record included in ``objects``.
+        painted : np.ndarray | None
+            Painted label map, see :class:`~widgets.paint.LabelPaint`. It
+            must not be modified afterwards.
+
+        Returns
+        -------
+        bool
+            False if there was nothing to write.
+        """
+        if not objects and painted is None and not labels_path(image_path).exists():
+            return False
+
+        snapshot = objects.copy()
+        job = (snapshot, shape, labels, journal_seq, painted)
+        if image_path in self._running or image_path in self._queued:
+            self._total += image_path not in self._queued
+            self._queued[image_path] = job
+        else:
+            self._total += 1
+            self._start(image_path, *job)
+
+        self.progress.emit(self._done, self._total)
+        return True
+
+    def wait(self):
+        self._pool.waitForDone()
+
+    def _start(
+        self,
+        image_path: str,
+        objects: PolygonStore,
+        shape,
+        labels,
+        journal_seq,
+        painted,
+    ):
+        self._running.add(image_path)
+        self._pool.start(
+            _SaveJob(
+                image_path, objects, shape, labels, journal_seq, painted, self._signals
+            )
+        )
+
+    def _on_finished(self, image_path: str, error: str):
+        self._running.discard(image_path)
+        self._done += 1
+
+        if error:
+            self.failed.emit(image_path, error)
+        else:
+            self.saved.emit(image_path)
+
+        queued = self._queued.pop(image_path, None)
+        if queued is not None:
+            self._start(image_path, *queued)
+
+        self.progress.emit(self._done, self._total)
+        if not self._running:
+            self._done = self._total = 0
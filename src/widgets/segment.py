@@ -0,0 +1,346 @@
+import importlib
+import math
+
+import numpy as np
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from .image_source import ImageSource
+from .simplify import simplify
+
+# longest side of the subsampled crop the first pass segments
+WORK_SIZE = 192
+# screen pixels around a click that are searched for the object first
+CLICK_ROI_PX = 160
+# times the area around a click is doubled while no object boundary is found in it
+CLICK_ROI_GROWTH = 3
+# stretched intensity difference across an outline for it to count as an edge
+MIN_EDGE_CONTRAST = 0.2
+# share of a box added on every side as background
+BOX_MARGIN = 0.25
+# pixels the boundary band is refined in, larger crops are refined subsampled
+REFINE_MAX_PIXELS = 1024 * 1024
+# image pixels, times the sampling step, the outline may be simplified by
+OUTLINE_TOLERANCE = 0.5
+
+
+def _step_for(side: float, size: int) -> int:
+    """Power of two subsampling bringing ``side`` pixels down to at most ``size``."""
+    return 2 ** max(0, math.ceil(math.log2(max(side, 1) / size)))
+
+
+def _gray(pixels: np.ndarray) -> np.ndarray:
+    """Float intensities of raw pixels, stretched between robust extremes."""
+    gray = pixels.astype(np.float32)
+    if gray.ndim == 3:
+        gray = gray[..., :3].mean(axis=2)
+    low, high = np.percentile(gray, (1, 99))
+    return np.clip((gray - low) / max(high - low, 1e-6), 0, 1)
+
+
+def _watershed(
+    gray: np.ndarray, markers: np.ndarray, mask: np.ndarray | None = None
+) -> np.ndarray:
+    """Flood the smoothed gradient from markers, 1 is background and 2 the object.
+
+    Only pixels in ``mask`` are flooded, if given.
+    """
+    from skimage.filters import gaussian, sobel
+    from skimage.segmentation import watershed
+
+    return watershed(sobel(gaussian(gray, sigma=1)), markers, mask=mask) == 2
+
+
+def _keep_seeded(mask: np.ndarray, seeds: np.ndarray) -> np.ndarray:
+    """The connected parts of ``mask`` touching ``seeds``, with holes filled."""
+    from scipy.ndimage import binary_fill_holes, label
+
+    parts = np.empty(mask.shape, dtype=np.int32)
+    label(mask, output=parts)
+    ids = np.unique(parts[seeds & mask])
+    filled = np.empty(mask.shape, dtype=bool)
+    binary_fill_holes(np.isin(parts, ids[ids > 0]), output=filled)
+    return filled
+
+
+class _Crop:
+    """Region of the image sampled every ``step`` pixels, ``x0``/``y0`` aligned to it."""
+
+    def __init__(self, source: ImageSource, rect, step: int):
+        x0, y0, x1, y1 = rect
+        self.step = step
+        self.x0 = max(0, int(x0) // step * step)
+        self.y0 = max(0, int(y0) // step * step)
+        self.x1 = min(source.width, math.ceil(x1))
+        self.y1 = min(source.height, math.ceil(y1))
+        self.gray = _gray(source.read(self.x0, self.y0, self.x1, self.y1, step))
+
+    def to_pixel(self, x: float, y: float) -> tuple[int, int]:
+        """``(row, column)`` of an image point in the crop."""
+        rows, columns = self.gray.shape
+        row = min(max(int((y - self.y0) / self.step), 0), rows - 1)
+        column = min(max(int((x - self.x0) / self.step), 0), columns - 1)
+        return row, column
+
+    def image_coords(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        """``(x, y)`` of crop positions, at the centre of the sampled blocks."""
+        offset = (self.step - 1) / 2
+        return np.column_stack(
+            (
+                self.x0 + columns * self.step + offset,
+                self.y0 + rows * self.step + offset,
+            )
+        )
+
+
+def segment_coarse(source: ImageSource, seed=None, box=None, zoom: float = 1.0):
+    """First pass on a subsampled crop around a click or a box.
+
+    A click seeds the object with a small disk and the crop border with
+    background, and the crop is enlarged while the object reaches that
+    border or its outline is no edge, i.e. the crop lies within the object;
+    a box seeds its centre and everything outside it.
+
+    Returns
+    -------
+    tuple[_Crop, np.ndarray] | None
+        The crop and the object mask on it, None if nothing was found or no
+        crop up to the largest one bounds the object.
+    """
+    if box is not None:
+        x0, y0, x1, y1 = box
+        mx, my = (x1 - x0) * BOX_MARGIN, (y1 - y0) * BOX_MARGIN
+        return _segment_crop(
+            source,
+            (x0 - mx, y0 - my, x1 + mx, y1 + my),
+            ((x0 + x1) / 2, (y0 + y1) / 2),
+            box,
+        )
+
+    if seed is None:
+        raise ValueError("segmentation needs a seed or a box")
+    half = CLICK_ROI_PX / zoom / 2
+    for _ in range(CLICK_ROI_GROWTH + 1):
+        rect = (seed[0] - half, seed[1] - half, seed[0] + half, seed[1] + half)
+        result = _segment_crop(source, rect, seed)
+        if result is None or _found(*result, source):
+            return result
+        half *= 2
+    # a mask cut off by the crop would be a wrong outline
+    return None
+
+
+def _found(crop: _Crop, mask: np.ndarray, source: ImageSource) -> bool:
+    """Whether a mask is bounded by an edge and not by the crop border."""
+    from scipy.ndimage import binary_dilation, binary_erosion
+
+    edges = (
+        (mask[1], crop.y0 > 0),
+        (mask[-2], crop.y1 < source.height),
+        (mask[:, 1], crop.x0 > 0),
+        (mask[:, -2], crop.x1 < source.width),
+    )
+    if any(inside and line.any() for line, inside in edges):
+        return False
+    # the erosion lies within the mask and the dilation around it
+    inner = mask ^ binary_erosion(mask, iterations=2)
+    outer = binary_dilation(mask, iterations=2) ^ mask
+    if not inner.any() or not outer.any():
+        return False
+    contrast = np.median(crop.gray[inner]) - np.median(crop.gray[outer])
+    return abs(contrast) >= MIN_EDGE_CONTRAST
+
+
+def _segment_crop(source: ImageSource, rect, centre, box=None):
+    """Watershed on a crop of ``rect`` seeded at ``centre`` and by the border or box."""
+    step = _step_for(max(rect[2] - rect[0], rect[3] - rect[1]), WORK_SIZE)
+    crop = _Crop(source, rect, step)
+    rows, columns = crop.gray.shape
+    if rows < 3 or columns < 3:
+        return None
+
+    markers = np.zeros(crop.gray.shape, dtype=np.int32)
+    if box is not None:
+        top, left = crop.to_pixel(box[0], box[1])
+        bottom, right = crop.to_pixel(box[2], box[3])
+        markers[:] = 1
+        markers[top : bottom + 1, left : right + 1] = 0
+        radius = max(1, min(bottom - top, right - left) // 6)
+    else:
+        markers[[0, -1], :] = 1
+        markers[:, [0, -1]] = 1
+        radius = max(1, min(rows, columns) // 40)
+    row, column = crop.to_pixel(*centre)
+    yy, xx = np.ogrid[:rows, :columns]
+    seeds = (yy - row) ** 2 + (xx - column) ** 2 <= radius**2
+    markers[seeds] = 2
+
+    mask = _keep_seeded(_watershed(crop.gray, markers), seeds)
+    return (crop, mask) if mask.any() else None
+
+
+def refine(source: ImageSource, crop: _Crop, mask: np.ndarray):
+    """Decide the pixels along the boundary of a coarse mask at a finer step.
+
+    The interior and the exterior of the coarse mask, shrunk by a couple of
+    coarse pixels, become markers; only the band between them is flooded
+    again on a crop of the object's bounding box.
+
+    Returns
+    -------
+    tuple[_Crop, np.ndarray]
+        The finer crop and mask, the input if it is already at full resolution.
+    """
+    from scipy.ndimage import binary_dilation, binary_erosion
+
+    if crop.step == 1:
+        return crop, mask
+    rows, columns = np.nonzero(mask)
+    margin = 2 * crop.step
+    (x0, y0), (x1, y1) = crop.image_coords(
+        np.array([rows.min(), rows.max()]), np.array([columns.min(), columns.max()])
+    )
+    rect = (x0 - margin, y0 - margin, x1 + margin, y1 + margin)
+    area = (rect[2] - rect[0]) * (rect[3] - rect[1])
+    step = min(
+        crop.step // 2, _step_for(math.sqrt(area), math.isqrt(REFINE_MAX_PIXELS))
+    )
+    fine = _Crop(source, rect, step)
+
+    # the coarse mask sampled on the fine grid
+    fine_rows = (fine.y0 + np.arange(fine.gray.shape[0]) * step - crop.y0) // crop.step
+    fine_columns = (
+        fine.x0 + np.arange(fine.gray.shape[1]) * step - crop.x0
+    ) // crop.step
+    inside_rows = (fine_rows >= 0) & (fine_rows < mask.shape[0])
+    inside_columns = (fine_columns >= 0) & (fine_columns < mask.shape[1])
+    coarse = np.zeros(fine.gray.shape, dtype=bool)
+    coarse[np.ix_(inside_rows, inside_columns)] = mask[
+        np.ix_(fine_rows[inside_rows], fine_columns[inside_columns])
+    ]
+
+    band = crop.step // step + 1
+    inner = np.zeros_like(coarse)
+    binary_erosion(coarse, iterations=band, output=inner)
+    if not inner.any():
+        return crop, mask
+    markers = np.zeros(fine.gray.shape, dtype=np.int32)
+    markers[np.logical_not(binary_dilation(coarse, iterations=band))] = 1
+    markers[inner] = 2
+    # the band and the markers next to it, the rest is decided already
+    region = binary_dilation(markers == 0)
+    flooded = _watershed(fine.gray, markers, region)
+    return fine, _keep_seeded(inner | flooded, inner)
+
+
+def outline(crop: _Crop, mask: np.ndarray) -> np.ndarray | None:
+    """Outer ring of the largest part of a mask in image coordinates."""
+    from skimage.measure import find_contours
+
+    contours = find_contours(np.pad(mask, 1).astype(np.float32), 0.5)
+    if not contours:
+        return None
+    contour = max(contours, key=len) - 1
+    ring = crop.image_coords(contour[:, 0], contour[:, 1])
+    ring = simplify(ring, OUTLINE_TOLERANCE * crop.step, closed=True)
+    return ring.astype(np.float32) if len(ring) >= 3 else None
+
+
+class _Signals(QObject):
+    # request, outline or None, whether it is the final one
+    result = Signal(int, object, bool)
+
+
+class _SegmentJob(QRunnable):
+    def __init__(self, request: int, source: ImageSource, seed, box, zoom, signals):
+        super().__init__()
+        self.request = request
+        self.source = source
+        self.seed = seed
+        self.box = box
+        self.zoom = zoom
+        self.signals = signals
+
+    def run(self):
+        ring = None
+        try:
+            coarse = segment_coarse(self.source, self.seed, self.box, self.zoom)
+            if coarse is not None:
+                self.signals.result.emit(self.request, outline(*coarse), False)
+                ring = outline(*refine(self.source, *coarse))
+        except (OSError, ValueError, MemoryError) as e:
+            print(f"Error segmenting: {e}")
+        self.signals.result.emit(self.request, ring, True)
+
+
+class _WarmUp(QRunnable):
+    def run(self):
+        # the first segmentation would otherwise wait for these imports
+        for module in (
+            "scipy.ndimage",
+            "skimage.filters",
+            "skimage.measure",
+            "skimage.segmentation",
+        ):
+            importlib.import_module(module)
+
+
+class Segmenter(QObject):
+    """Segments the object under a click or inside a box in the background.
+
+    The object is first segmented by watershed on a crop around the seed,
+    subsampled to :data:`WORK_SIZE` pixels, and shown as :attr:`preview`.
+    Only the band along its boundary is then flooded again at a finer step,
+    down to full resolution for objects that fit :data:`REFINE_MAX_PIXELS`,
+    and the outline is emitted as :attr:`finished`. A new request supersedes
+    the running one.
+    """
+
+    # outline of the coarse pass, (N, 2) image coordinates
+    preview = Signal(object)
+    # final outline, None if nothing was segmented
+    finished = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._signals = _Signals(self)
+        self._signals.result.connect(self._on_result)
+        self._request = 0
+        self._warm = False
+
+    def warm_up(self):
+        """Import the segmentation modules before the first request."""
+        if not self._warm:
+            self._warm = True
+            self._pool.start(_WarmUp())
+
+    def start(
+        self,
+        source: ImageSource,
+        seed: tuple[float, float] | None = None,
+        box: tuple[float, float, float, float] | None = None,
+        zoom: float = 1.0,
+    ):
+        """Segment around a ``seed`` point or inside a ``box``, in image coordinates.
+
+        ``zoom`` sizes the area searched around a seed, which is a fixed
+        number of screen pixels.
+        """
+        self.cancel()
+        self._pool.start(
+            _SegmentJob(self._request, source, seed, box, zoom, self._signals)
+        )
+
+    def cancel(self):
+        """Drop the results of pending requests."""
+        self._request += 1
+        self._pool.clear()
+
+    def _on_result(self, request: int, ring, final: bool):
+        if request != self._request:
+            return
+        if final:
+            self.finished.emit(ring)
+        elif ring is not None:
+            self.preview.emit(ring)
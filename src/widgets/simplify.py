@@ -0,0 +1,127 @@
+import numpy as np
+
+from .polygons import PointBuffer
+
+
+def segment_distances(points: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Distance of every point to the segment ``a``-``b``."""
+    ab = b - a
+    length2 = float(ab @ ab)
+    if length2 == 0.0:
+        return np.hypot(*(points - a).T)
+    t = np.clip((points - a) @ ab / length2, 0.0, 1.0)
+    closest = a + t[:, None] * ab
+    return np.hypot(*(points - closest).T)
+
+
+def simplify(points: np.ndarray, tolerance: float, closed: bool = False) -> np.ndarray:
+    """Douglas-Peucker simplification of a polyline or ring.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        ``(N, 2)`` vertices.
+    tolerance : float
+        Maximum distance of a removed vertex from the simplified shape.
+    closed : bool
+        Treat ``points`` as a ring, the closing edge is simplified too.
+
+    Returns
+    -------
+    np.ndarray
+        The kept vertices, in order.
+    """
+    n = len(points)
+    if n < 3:
+        return points.copy()
+
+    points64 = points.astype(np.float64)
+    keep = np.zeros(n, dtype=bool)
+    if closed:
+        # split the ring at the vertex farthest from the first one
+        far = int(np.argmax(np.hypot(*(points64 - points64[0]).T)))
+        keep[[0, far]] = True
+        stack = [(0, far), (far, n)]
+    else:
+        keep[[0, n - 1]] = True
+        stack = [(0, n - 1)]
+
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a = points64[start]
+        b = points64[end % n]
+        distances = segment_distances(points64[start + 1 : end], a, b)
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+
+    return points[keep]
+
+
+class StrokeSimplifier:
+    """Polyline simplified while it is being drawn.
+
+    Raw points extend the last edge as long as every point since its start
+    stays within half the tolerance of it; otherwise the edge is fixed and a
+    new one begins. :meth:`finish` spends the other half on a final
+    Douglas-Peucker pass. Only the corners of a stroke are kept while it is
+    drawn, at a cost proportional to the length of the current edge.
+
+    It has the ``array``/``len``/``clear`` interface of
+    :class:`PointBuffer`, the last vertex follows the pointer.
+
+    Parameters
+    ----------
+    tolerance : float
+        Maximum distance of a raw point from the simplified stroke.
+    """
+
+    def __init__(self, tolerance: float = 1.0):
+        self.tolerance = tolerance
+        self._vertices = PointBuffer()
+        # raw points since the last fixed vertex
+        self._run = PointBuffer()
+        self.raw_count = 0
+
+    def __len__(self) -> int:
+        return len(self._vertices)
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._vertices.array
+
+    def clear(self):
+        self._vertices.clear()
+        self._run.clear()
+        self.raw_count = 0
+
+    def append(self, x: float, y: float):
+        self.raw_count += 1
+        if len(self._vertices) < 2:
+            self._vertices.append(x, y)
+            self._run.append(x, y)
+            return
+
+        vertices = self._vertices.array
+        anchor = vertices[-2].astype(np.float64)
+        point = np.array((x, y))
+        run = self._run.array
+        if segment_distances(run, anchor, point).max() <= self.tolerance / 2:
+            # the edge can stretch to the new point
+            vertices[-1] = point
+        else:
+            # fix the current end as a corner and start a new edge from it
+            end = vertices[-1].copy()
+            self._run.clear()
+            self._run.append(*end.tolist())
+            self._vertices.append(x, y)
+        self._run.append(x, y)
+
+    def finish(self, closed: bool = True) -> np.ndarray:
+        """Simplified vertices of the whole stroke, also across its closing edge."""
+        return simplify(self.array, self.tolerance / 2, closed)
@@ -0,0 +1,282 @@
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+
+from .polygons import PolygonStore, concat_ranges
+
+CELL_SIZE = 128
+# objects covering more cells than this are kept in a separate list
+MAX_CELLS_PER_OBJECT = 256
+# edge of an outline index cell in image pixels
+OUTLINE_CELL_SIZE = 64
+
+
+class GridIndex:
+    """Uniform grid over object bounding boxes.
+
+    Objects are registered in every cell their bounding box touches, so
+    point and rectangle queries only look at the objects near the query
+    instead of all of them. Very large objects are kept aside and always
+    tested by their bounding box.
+
+    Parameters
+    ----------
+    cell_size : float
+        Edge length of a grid cell in image pixels.
+    """
+
+    def __init__(self, cell_size: float = CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells: defaultdict[tuple[int, int], set[int]] = defaultdict(set)
+        self._bounds: dict[int, tuple[float, float, float, float]] = {}
+        self._large: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._bounds)
+
+    def __contains__(self, oid: int) -> bool:
+        return oid in self._bounds
+
+    def clear(self):
+        self._cells.clear()
+        self._bounds.clear()
+        self._large.clear()
+
+    def insert(self, oid: int, bounds):
+        """Register ``oid`` with bounding box ``(xmin, ymin, xmax, ymax)``."""
+        if oid in self._bounds:
+            self.remove(oid)
+
+        xmin, ymin, xmax, ymax = (float(v) for v in bounds)
+        self._bounds[oid] = (xmin, ymin, xmax, ymax)
+
+        cells = self._cell_range(xmin, ymin, xmax, ymax)
+        if _cell_count(cells) > MAX_CELLS_PER_OBJECT:
+            self._large.add(oid)
+            return
+
+        for cell in _iter_cells(cells):
+            self._cells[cell].add(oid)
+
+    def remove(self, oid: int):
+        bounds = self._bounds.pop(oid, None)
+        if bounds is None:
+            return
+
+        if oid in self._large:
+            self._large.discard(oid)
+            return
+
+        for cell in _iter_cells(self._cell_range(*bounds)):
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.discard(oid)
+                if not bucket:
+                    del self._cells[cell]
+
+    def bounds(self, oid: int) -> tuple[float, float, float, float]:
+        return self._bounds[oid]
+
+    def query_point(self, x: float, y: float) -> list[int]:
+        """Ids whose bounding box contains ``(x, y)``, in ascending order."""
+        cell = (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+        candidates = self._cells.get(cell, set()) | self._large
+        return sorted(
+            oid for oid in candidates if _intersects(self._bounds[oid], x, y, x, y)
+        )
+
+    def query_rect(
+        self, xmin: float, ymin: float, xmax: float, ymax: float
+    ) -> list[int]:
+        """Ids whose bounding box intersects the rectangle, in ascending order."""
+        cells = self._cell_range(xmin, ymin, xmax, ymax)
+        if _cell_count(cells) > len(self._cells):
+            candidates = set(self._bounds)
+        else:
+            candidates = set(self._large)
+            for cell in _iter_cells(cells):
+                bucket = self._cells.get(cell)
+                if bucket:
+                    candidates |= bucket
+        return sorted(
+            oid
+            for oid in candidates
+            if _intersects(self._bounds[oid], xmin, ymin, xmax, ymax)
+        )
+
+    def _cell_range(
+        self, xmin: float, ymin: float, xmax: float, ymax: float
+    ) -> tuple[int, int, int, int]:
+        size = self.cell_size
+        return (
+            math.floor(xmin / size),
+            math.floor(ymin / size),
+            math.floor(xmax / size),
+            math.floor(ymax / size),
+        )
+
+
+@dataclass
+class OutlineHit:
+    """Vertex or edge of an object outline near a point."""
+
+    oid: int
+    # vertex index within the object, or first vertex of the edge
+    index: int
+    on_vertex: bool
+    # the vertex, or the closest point on the edge
+    x: float
+    y: float
+
+
+class OutlineIndex:
+    """Uniform grid over the outlines of objects.
+
+    Every object is registered in the cells its edges pass through, found
+    from points sampled along the edges every half cell, so only objects
+    whose outline runs close to a query are tested, unlike with bounding
+    boxes that also hold the inside of large objects. Objects are added,
+    removed and updated one at a time.
+
+    Parameters
+    ----------
+    cell_size : float
+        Edge length of a grid cell in image pixels.
+    """
+
+    def __init__(self, cell_size: float = OUTLINE_CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells: defaultdict[tuple[int, int], set[int]] = defaultdict(set)
+        self._objects: dict[int, list[tuple[int, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def insert(self, oid: int, vertices: np.ndarray, ring_ends: np.ndarray):
+        """Register ``oid``, or update it after its vertices changed."""
+        if oid in self._objects:
+            self.remove(oid)
+        cells, _ = self._edge_cells(vertices, _following(ring_ends))
+        keys = [(cx, cy) for cx, cy in _unique_rows(cells).tolist()]
+        for key in keys:
+            self._cells[key].add(oid)
+        self._objects[oid] = keys
+
+    def build(self, objects: PolygonStore):
+        """Register every object of a store, sampling all edges at once."""
+        self._cells.clear()
+        self._objects.clear()
+        ids = objects.ids()
+        if not len(ids):
+            return
+        vertices, ring_ends, vcount, rcount = objects.pack(ids)
+        offsets = np.repeat(np.cumsum(vcount) - vcount, rcount)
+        cells, edges = self._edge_cells(vertices, _following(ring_ends + offsets))
+        owners = np.repeat(ids, vcount)[edges]
+        for oid, cx, cy in _unique_rows(np.c_[owners, cells]).tolist():
+            key = (cx, cy)
+            self._cells[key].add(oid)
+            self._objects.setdefault(oid, []).append(key)
+
+    def _edge_cells(
+        self, vertices: np.ndarray, following: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Cells of points sampled along edges every half cell, and their edges."""
+        delta = vertices[following] - vertices
+        steps = np.maximum(
+            np.ceil(np.hypot(delta[:, 0], delta[:, 1]) / (self.cell_size / 2)), 1
+        ).astype(np.int64)
+        edges = np.repeat(np.arange(len(vertices)), steps)
+        t = concat_ranges(np.zeros(len(steps), dtype=np.int64), steps) / steps[edges]
+        samples = vertices[edges] + t[:, None] * delta[edges]
+        return np.floor(samples / self.cell_size).astype(np.int64), edges
+
+    def remove(self, oid: int):
+        for key in self._objects.pop(oid, ()):
+            bucket = self._cells.get(key)
+            if bucket is not None:
+                bucket.discard(oid)
+                if not bucket:
+                    del self._cells[key]
+
+    def query(self, x: float, y: float, radius: float) -> list[int]:
+        """Ids of objects whose outline may pass within ``radius`` of a point."""
+        # every point of an edge is within a quarter cell of a sample
+        reach = radius + self.cell_size / 4
+        size = self.cell_size
+        candidates = set()
+        for cell in _iter_cells(
+            (
+                math.floor((x - reach) / size),
+                math.floor((y - reach) / size),
+                math.floor((x + reach) / size),
+                math.floor((y + reach) / size),
+            )
+        ):
+            bucket = self._cells.get(cell)
+            if bucket:
+                candidates |= bucket
+        return sorted(candidates)
+
+    def nearest(
+        self, objects: PolygonStore, x: float, y: float, radius: float
+    ) -> OutlineHit | None:
+        """Closest vertex within ``radius`` of a point, else the closest edge."""
+        vertex = edge = None
+        vertex_distance = edge_distance = radius
+        for oid in self.query(x, y, radius):
+            points = objects.vertices(oid).astype(np.float64)
+            delta = points[_following(objects.ring_ends(oid))] - points
+            offset = np.array([x, y]) - points
+
+            distances = np.hypot(offset[:, 0], offset[:, 1])
+            i = int(np.argmin(distances))
+            if distances[i] <= vertex_distance:
+                vertex_distance = distances[i]
+                vertex = OutlineHit(oid, i, True, *points[i].tolist())
+
+            length = (delta * delta).sum(axis=1)
+            t = np.clip((offset * delta).sum(axis=1) / np.maximum(length, 1e-12), 0, 1)
+            closest = points + t[:, None] * delta
+            distances = np.hypot(closest[:, 0] - x, closest[:, 1] - y)
+            i = int(np.argmin(distances))
+            if distances[i] <= edge_distance:
+                edge_distance = distances[i]
+                edge = OutlineHit(oid, i, False, *closest[i].tolist())
+        return vertex or edge
+
+
+def _following(ring_ends: np.ndarray) -> np.ndarray:
+    """Index of the vertex after each vertex, wrapping around within its ring."""
+    ring_ends = np.asarray(ring_ends, dtype=np.int64)
+    following = np.arange(1, int(ring_ends[-1]) + 1)
+    following[ring_ends - 1] = np.concatenate(([0], ring_ends[:-1]))
+    return following
+
+
+def _unique_rows(rows: np.ndarray) -> np.ndarray:
+    """Distinct rows of an integer array, cheaper than ``np.unique(axis=0)``."""
+    rows = rows[np.lexsort(rows.T[::-1])]
+    keep = np.ones(len(rows), dtype=bool)
+    keep[1:] = (rows[1:] != rows[:-1]).any(axis=1)
+    return rows[keep]
+
+
+def _cell_count(cells: tuple[int, int, int, int]) -> int:
+    cx0, cy0, cx1, cy1 = cells
+    return (cx1 - cx0 + 1) * (cy1 - cy0 + 1)
+
+
+def _iter_cells(cells: tuple[int, int, int, int]):
+    cx0, cy0, cx1, cy1 = cells
+    for cy in range(cy0, cy1 + 1):
+        for cx in range(cx0, cx1 + 1):
+            yield cx, cy
+
+
+def _intersects(bounds, xmin: float, ymin: float, xmax: float, ymax: float) -> bool:
+    """Whether ``bounds`` intersects the rectangle."""
+    bx0, by0, bx1, by1 = bounds
+    return bx0 <= xmax and xmin <= bx1 and by0 <= ymax and ymin <= by1
@@ -0,0 +1,102 @@
+"""Opt-in startup timing.
+
+Setting ``MAREK_STARTUP_TIMING=1`` reports time to the first shown window
+and the modules that were most expensive to import. Import this module
+before anything else so its import hook sees the other imports; it only
+uses the standard library.
+"""
+
+import importlib.abc
+import os
+import sys
+import time
+
+ENV_VAR = "MAREK_STARTUP_TIMING"
+# modules listed in the report
+REPORT_MODULES = 20
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, timer: "StartupTimer", name: str, loader):
+        self._timer = timer
+        self._name = name
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._timer._enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer._exit(self._name)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class StartupTimer(importlib.abc.MetaPathFinder):
+    """Meta path hook timing module execution, with nested imports subtracted.
+
+    Self times match what ``python -X importtime`` reports, but this also
+    works in frozen builds where interpreter flags cannot be passed.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks: list[tuple[str, float]] = []
+        self.imports: dict[str, float] = {}
+        self._stack: list[list[float]] = []
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(self, fullname, spec.loader)
+            return spec
+        return None
+
+    def _enter(self):
+        # [start, time spent in nested imports]
+        self._stack.append([time.perf_counter(), 0.0])
+
+    def _exit(self, name: str):
+        start, nested = self._stack.pop()
+        total = time.perf_counter() - start
+        self.imports[name] = total - nested
+        if self._stack:
+            self._stack[-1][1] += total
+
+    def mark(self, label: str):
+        """Record the time elapsed since startup under ``label``."""
+        self.marks.append((label, time.perf_counter() - self.start))
+
+    def report(self, file=None):
+        file = file if file is not None else sys.stderr
+        print("startup timing", file=file)
+        for label, elapsed in self.marks:
+            print(f"  {elapsed * 1000:8.1f} ms  {label}", file=file)
+
+        total = sum(self.imports.values())
+        print(f"imports: {len(self.imports)} modules, {total * 1000:.1f} ms", file=file)
+        slowest = sorted(self.imports.items(), key=lambda item: -item[1])
+        for name, elapsed in slowest[:REPORT_MODULES]:
+            print(f"  {elapsed * 1000:8.1f} ms  {name}", file=file)
+
+
+startup_timer: StartupTimer | None = None
+if os.environ.get(ENV_VAR):
+    startup_timer = StartupTimer()
+    startup_timer.install()
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+
+from PySide6.QtCore import QObject, QRunnable, QStandardPaths, Qt, QThreadPool, Signal
+from PySide6.QtGui import QImage, QImageReader, QPixmap
+
+from .image_source import TIFF_SUFFIXES, open_image_source
+
+THUMBNAIL_SIZE = 128
+# decoded thumbnails kept in memory
+MEMORY_CACHE_COUNT = 2048
+
+
+def default_cache_dir() -> Path:
+    location = QStandardPaths.writableLocation(
+        QStandardPaths.StandardLocation.CacheLocation
+    )
+    return Path(location or tempfile.gettempdir()) / "thumbnails"
+
+
+def cache_file(cache_dir: Path, path: str, size: int) -> Path | None:
+    """Cache entry of an image, keyed by its path, mtime and size on disk."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = f"{os.path.abspath(path)}\0{stat.st_mtime_ns}\0{stat.st_size}\0{size}"
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    return cache_dir / digest[:2] / f"{digest}.png"
+
+
+def decode_thumbnail(path: str, size: int) -> QImage:
+    """Decode an image at reduced size.
+
+    The reader is asked for the scaled size up front, so formats that
+    support it (JPEG) skip decoding the full resolution. TIFFs are read
+    subsampled from their smallest fitting resolution.
+    """
+    if path.lower().endswith(TIFF_SUFFIXES):
+        source = open_image_source(path)
+        try:
+            return source.overview(size)
+        finally:
+            source.close()
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)
+    full = reader.size()
+    if full.isValid() and max(full.width(), full.height()) > size:
+        reader.setScaledSize(
+            full.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio)
+        )
+    return reader.read()
+
+
+class _Signals(QObject):
+    ready = Signal(str, QImage)
+
+
+class _ThumbnailJob(QRunnable):
+    def __init__(self, path: str, cache_dir: Path, size: int, signals: _Signals):
+        super().__init__()
+        self.path = path
+        self.cache_dir = cache_dir
+        self.size = size
+        self.signals = signals
+
+    def run(self):
+        image = QImage()
+        try:
+            entry = cache_file(self.cache_dir, self.path, self.size)
+            if entry is not None and entry.exists():
+                image.load(str(entry))
+            if image.isNull():
+                image = decode_thumbnail(self.path, self.size)
+                if entry is not None and not image.isNull():
+                    self._store(entry, image)
+        # a corrupt TIFF raises from the reader, IndexError without any series
+        except (OSError, ValueError, IndexError, MemoryError) as e:
+            print(f"Error decoding thumbnail of {self.path}: {e}")
+            image = QImage()
+        finally:
+            # a null image marks the path as failed
+            self.signals.ready.emit(self.path, image)
+
+    def _store(self, entry: Path, image: QImage):
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=entry.parent, suffix=".png")
+            os.close(fd)
+            # the format follows from the suffix
+            if image.save(tmp):
+                os.replace(tmp, entry)
+            else:
+                os.unlink(tmp)
+        except OSError as e:
+            print(f"Error caching thumbnail of {self.path}: {e}")
+
+
+class ThumbnailCache(QObject):
+    """Thumbnails decoded on a worker pool and cached in memory and on disk.
+
+    :meth:`get` never blocks: a missing thumbnail is scheduled and
+    :attr:`thumbnail_ready` is emitted once it is available. The most
+    recently requested thumbnails are decoded first, so the ones currently
+    on screen win over those scrolled past.
+
+    Parameters
+    ----------
+    cache_dir : Path | None
+        Folder of the on-disk cache, the user cache location if None.
+    size : int
+        Maximum edge length of a thumbnail.
+    """
+
+    thumbnail_ready = Signal(str)
+
+    def __init__(
+        self, cache_dir: Path | None = None, size: int = THUMBNAIL_SIZE, parent=None
+    ):
+        super().__init__(parent)
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.size = size
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(os.cpu_count() or 1)
+        self._signals = _Signals(self)
+        self._signals.ready.connect(self._on_ready)
+        self._pixmaps: OrderedDict[str, QPixmap] = OrderedDict()
+        self._pending: set[str] = set()
+        self._failed: set[str] = set()
+        self._priority = 0
+
+    def get(self, path: str) -> QPixmap | None:
+        pixmap = self._pixmaps.get(path)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(path)
+            return pixmap
+        if path not in self._pending and path not in self._failed:
+            self._pending.add(path)
+            self._priority += 1
+            self._pool.start(
+                _ThumbnailJob(path, self.cache_dir, self.size, self._signals),
+                self._priority,
+            )
+        return None
+
+    def clear_pending(self):
+        """Drop scheduled thumbnails that have not started decoding."""
+        self._pool.clear()
+        self._pending.clear()
+
+    def _on_ready(self, path: str, image: QImage):
+        self._pending.discard(path)
+        if image.isNull():
+            self._failed.add(path)
+            return
+
+        self._pixmaps[path] = QPixmap.fromImage(image)
+        while len(self._pixmaps) > MEMORY_CACHE_COUNT:
+            self._pixmaps.popitem(last=False)
+        self.thumbnail_ready.emit(path)
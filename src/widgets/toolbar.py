@@ -1,7 +1,7 @@
-from PySide6.QtCore import QSize, Signal
+from PySide6.QtCore import QSize, Qt, Signal
 from PySide6.QtGui import QFont, QIcon
 from PySide6.QtWidgets import (
-    QMessageBox,
+    QApplication,
     QPushButton,
     QVBoxLayout,
     QWidget,
@@ -17,7 +17,11 @@ class ToolBar(QWidget):
     hand = Signal()
     pen = Signal()
     eraser = Signal()
+    segment = Signal()
+    brush = Signal()
+    vertex = Signal()
     save = Signal()
+    save_all = Signal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -40,14 +44,38 @@ class ToolBar(QWidget):
         self.eraseButton = QPushButton()
         self.eraseButton.setIcon(QIcon(str(get_asset_path("icons/clean.png"))))
         self.eraseButton.setIconSize(QSize(40, 40))
+        self.segmentButton = QPushButton("🪄")
+        self.segmentButton.setToolTip(
+            "Segment the object under a click\nDrag a box around it if a click misses"
+        )
+        self.brushButton = QPushButton("🖌️")
+        self.brushButton.setToolTip(
+            "Paint labels\nRight-drag erases, Shift+click fills an enclosed area"
+        )
+        self.vertexButton = QPushButton("📍")
+        self.vertexButton.setToolTip(
+            "Edit points\nDrag a point to move it or an edge to insert one, "
+            "right-click deletes a point"
+        )
         # self.saveButton = QPushButton("💾")
         self.saveButton = QPushButton()
         self.saveButton.setIcon(QIcon(str(get_asset_path("icons/save.png"))))
         self.saveButton.setIconSize(QSize(40, 40))
+        self.saveButton.setToolTip(
+            "Save (Ctrl+S)\nShift+click to save all edited images (Ctrl+Shift+S)"
+        )
 
         font = QFont()
         font.setPointSize(20)
-        for btn in [self.handButton, self.penButton, self.eraseButton, self.saveButton]:
+        for btn in [
+            self.handButton,
+            self.penButton,
+            self.eraseButton,
+            self.segmentButton,
+            self.brushButton,
+            self.vertexButton,
+            self.saveButton,
+        ]:
             btn.setMinimumWidth(70)
             btn.setMinimumHeight(70)
             btn.setMaximumWidth(70)
@@ -57,11 +85,17 @@ class ToolBar(QWidget):
         self.handButton.clicked.connect(self._on_hand_clicked)
         self.penButton.clicked.connect(self._on_pen_clicked)
         self.eraseButton.clicked.connect(self._on_eraser_clicked)
+        self.segmentButton.clicked.connect(self._on_segment_clicked)
+        self.brushButton.clicked.connect(self._on_brush_clicked)
+        self.vertexButton.clicked.connect(self._on_vertex_clicked)
         self.saveButton.clicked.connect(self._on_save_clicked)
 
         toolsLayout.addWidget(self.handButton)
         toolsLayout.addWidget(self.penButton)
         toolsLayout.addWidget(self.eraseButton)
+        toolsLayout.addWidget(self.segmentButton)
+        toolsLayout.addWidget(self.brushButton)
+        toolsLayout.addWidget(self.vertexButton)
         toolsLayout.addWidget(self.saveButton)
 
         self._highlight_style = "background-color: #4CAF50; font-weight: bold;"
@@ -94,6 +128,20 @@ class ToolBar(QWidget):
         self._set_button_highlight(self.eraseButton)
         self.eraser.emit()
 
+    def _on_segment_clicked(self):
+        self._set_button_highlight(self.segmentButton)
+        self.segment.emit()
+
+    def _on_brush_clicked(self):
+        self._set_button_highlight(self.brushButton)
+        self.brush.emit()
+
+    def _on_vertex_clicked(self):
+        self._set_button_highlight(self.vertexButton)
+        self.vertex.emit()
+
     def _on_save_clicked(self):
-        self.save.emit()
-        QMessageBox.information(self, "Success", "Saved successfully!")
+        if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier:
+            self.save_all.emit()
+        else:
+            self.save.emit()